@@ -0,0 +1,799 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai de l'outil de maillage interne.
+Génère des sites synthétiques en français (clusters thématiques, graphe de
+liens, facettes), les sert depuis un serveur HTTP local avec une latence
+configurable, écrit les exports Screaming Frog correspondants, puis chronomètre
+chaque étape de maillage_interne.py à plusieurs tailles. Les résultats sont
+ajoutés à un fichier JSONL avec le commit git, pour comparer les versions.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(RACINE, "maillage_interne.py")
+
+
+# ─── Vocabulaire synthétique ─────────────────────────────────────────────────
+
+THEMES = {
+    "jardin": "plante arrosage potager tomate semis graine compost engrais terreau tondeuse haie rosier "
+              "bouture taille paillage serre verger pelouse bulbe jardiniere arrosoir",
+    "cuisine": "recette gateau chocolat four farine sucre beurre pate sauce legume poisson viande "
+               "cuisson epice dessert tarte soupe marinade casserole gratin",
+    "velo": "pneu chambre frein derailleur chaine selle guidon roue cadre pedale casque "
+            "cassette plateau fourche rayon gonfleur antivol eclairage sacoche",
+    "maison": "peinture mur plafond parquet carrelage isolation fenetre porte chauffage toiture "
+              "enduit plinthe cloison volet charpente gouttiere facade humidite",
+    "informatique": "ordinateur clavier ecran processeur memoire disque logiciel reseau serveur code "
+                    "carte graphique souris imprimante sauvegarde routeur pilote batterie",
+    "voyage": "hotel plage valise billet train avion randonnee montagne musee itineraire "
+              "camping croisiere passeport excursion auberge sejour visite guide",
+    "sante": "sommeil nutrition vitamine sport etirement posture stress respiration hydratation "
+             "articulation muscle fatigue alimentation equilibre immunite digestion",
+    "animaux": "chien chat croquette litiere vaccin toilettage laisse niche aquarium oiseau "
+               "rongeur dressage veterinaire collier gamelle jouet panier",
+    "auto": "moteur vidange pneumatique batterie embrayage freinage carrosserie phare essuie "
+            "courroie bougie filtre amortisseur climatisation controle technique",
+    "mode": "robe chemise pantalon chaussure veste manteau accessoire sac ceinture tissu "
+            "coton laine couture taille coupe saison tendance",
+}
+COMMUNS = (
+    "guide conseil prix achat meilleur comment choisir entretien astuce qualite comparatif "
+    "avis solution methode etape erreur budget debutant expert pratique"
+).split()
+LIAISONS = "le la les des un une pour avec dans sur et ou que qui est sont bien plus tres aussi".split()
+MOTS_THEMES = {theme: mots.split() for theme, mots in THEMES.items()}
+NOMS_THEMES = sorted(THEMES)
+
+
+# ─── Génération d'un site ────────────────────────────────────────────────────
+
+class SiteSynthetique:
+    """Site déterministe de n_pages pages : le contenu de la page i ne dépend
+    que de (graine, i), ce qui permet de le générer à la demande côté serveur
+    sans rien stocker, même pour 200k pages.
+    Les pages sont réparties en n_themes thèmes (i % n_themes) ; chaque page a
+    liens_par_page liens, dont part_liens_theme vers son propre thème. Une part
+    `facettes` des pages est aussi servie sous une variante ?tri=prix au contenu
+    identique (quasi-doublons).
+    """
+
+    def __init__(self, n_pages, graine=1, n_themes=10, liens_par_page=10, part_liens_theme=0.8, facettes=0.0):
+        self.n_pages = n_pages
+        self.graine = graine
+        self.n_themes = min(n_themes, len(NOMS_THEMES))
+        self.liens_par_page = liens_par_page
+        self.part_liens_theme = part_liens_theme
+        self.facettes = facettes
+
+    def _rng(self, i):
+        return random.Random(self.graine * 1_000_003 + i)
+
+    def theme(self, i):
+        return NOMS_THEMES[i % self.n_themes]
+
+    def a_facette(self, i):
+        return self._rng(-i - 1).random() < self.facettes
+
+    def urls(self, base):
+        urls = []
+        for i in range(self.n_pages):
+            urls.append(f"{base}/p/{i}")
+            if self.a_facette(i):
+                urls.append(f"{base}/p/{i}?tri=prix")
+        return urls
+
+    def page(self, i, corps=True):
+        """Champs de la page i : title, h1, meta_description, body_text, liens (indices)."""
+        rng = self._rng(i)
+        theme = self.theme(i)
+        mots = MOTS_THEMES[theme]
+        voisin = MOTS_THEMES[NOMS_THEMES[rng.randrange(self.n_themes)]]
+        title = f"{rng.choice(COMMUNS).capitalize()} {rng.choice(mots)} {rng.choice(mots)} : {theme} {i}"
+        h1 = title if rng.random() < 0.4 else f"Tout savoir sur {rng.choice(mots)} et {rng.choice(mots)}"
+        meta = " ".join(rng.choice(mots + COMMUNS) for _ in range(18))
+        page = {"title": title, "h1": h1, "meta_description": meta, "body_text": "", "liens": []}
+        if not corps:
+            return page
+
+        paragraphes = []
+        for _ in range(rng.randint(3, 10)):
+            phrase = []
+            for _ in range(rng.randint(30, 80)):
+                tirage = rng.random()
+                if tirage < 0.55:
+                    phrase.append(rng.choice(mots))
+                elif tirage < 0.75:
+                    phrase.append(rng.choice(LIAISONS))
+                elif tirage < 0.92:
+                    phrase.append(rng.choice(COMMUNS))
+                else:
+                    phrase.append(rng.choice(voisin))
+            paragraphes.append(" ".join(phrase))
+        page["body_text"] = "\n".join(paragraphes)
+
+        par_theme = max(1, self.n_pages // self.n_themes)
+        for _ in range(self.liens_par_page):
+            if rng.random() < self.part_liens_theme:
+                j = (i % self.n_themes) + self.n_themes * rng.randrange(par_theme)
+            else:
+                j = rng.randrange(self.n_pages)
+            if j != i and j < self.n_pages:
+                page["liens"].append(j)
+        return page
+
+    def html(self, i):
+        page = self.page(i)
+        liens = "".join(f'<li><a href="/p/{j}">page {j}</a></li>' for j in page["liens"])
+        paragraphes = "".join(f"<p>{p}</p>" for p in page["body_text"].split("\n"))
+        return (
+            "<!DOCTYPE html><html lang=\"fr\"><head><meta charset=\"utf-8\">"
+            f"<title>{page['title']}</title>"
+            f"<meta name=\"description\" content=\"{page['meta_description']}\"></head><body>"
+            f"<header><nav><a href=\"/\">Accueil</a><a href=\"/p/0\">Rubrique</a></nav></header>"
+            f"<main><h1>{page['h1']}</h1>{paragraphes}<aside><ul>{liens}</ul></aside></main>"
+            f"<footer>Mentions legales - {self.theme(i)}</footer>"
+            "<script>var suivi = 1;</script></body></html>"
+        ).encode("utf-8")
+
+    def ecrire_exports(self, dossier, base):
+        """Écrit urls.txt, l'export Screaming Frog (internal_html.csv) et les inlinks (all_inlinks.csv)."""
+        os.makedirs(dossier, exist_ok=True)
+        chemins = {
+            "urls": os.path.join(dossier, "urls.txt"),
+            "sf": os.path.join(dossier, "internal_html.csv"),
+            "inlinks": os.path.join(dossier, "all_inlinks.csv"),
+        }
+        with open(chemins["urls"], "w", encoding="utf-8") as f:
+            f.write("\n".join(self.urls(base)) + "\n")
+        with open(chemins["sf"], "w", newline="", encoding="utf-8") as f_sf, \
+                open(chemins["inlinks"], "w", newline="", encoding="utf-8") as f_in:
+            sf = csv.writer(f_sf)
+            sf.writerow([
+                "Address", "Content Type", "Status Code", "Indexability",
+                "Title 1", "Title 1 Length", "Meta Description 1", "H1-1",
+            ])
+            inlinks = csv.writer(f_in)
+            inlinks.writerow(["Type", "Source", "Destination", "Anchor", "Status Code"])
+            for i in range(self.n_pages):
+                page = self.page(i)
+                adresses = [f"{base}/p/{i}"] + ([f"{base}/p/{i}?tri=prix"] if self.a_facette(i) else [])
+                for adresse in adresses:
+                    sf.writerow([
+                        adresse, "text/html; charset=utf-8", "200", "Indexable",
+                        page["title"], len(page["title"]), page["meta_description"], page["h1"],
+                    ])
+                for j in page["liens"]:
+                    inlinks.writerow(["Hyperlink", f"{base}/p/{i}", f"{base}/p/{j}", f"page {j}", "200"])
+        return chemins
+
+
+# ─── Serveur HTTP local ──────────────────────────────────────────────────────
+
+class ServeurSite:
+    """Sert un SiteSynthetique sur 127.0.0.1 (port libre) dans un thread.
+    latence_ms (+/- gigue_ms) est ajoutée avant chaque réponse.
+    Limitation simulée d'une origine fragile : au-delà de debit_max requêtes
+    par seconde (seau à jetons), réponse 429 ; au-delà de capacite requêtes
+    simultanées, réponse 503. Les deux portent Retry-After: retry_after.
+    """
+
+    def __init__(self, site, latence_ms=0, gigue_ms=0, debit_max=0, capacite=0, retry_after=1):
+        self.site = site
+        self.latence_ms = latence_ms
+        self.gigue_ms = gigue_ms
+        self.debit_max = debit_max
+        self.capacite = capacite
+        self.retry_after = retry_after
+        self.refus = {429: 0, 503: 0}
+        self._verrou = threading.Lock()
+        self._jetons = float(debit_max)
+        self._recharge = time.monotonic()
+        self._en_cours = 0
+        serveur = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                refus = serveur.admettre()
+                if refus:
+                    self.send_response(refus)
+                    self.send_header("Retry-After", str(serveur.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    serveur.attendre()
+                    self.repondre()
+                finally:
+                    serveur.terminer()
+
+            def repondre(self):
+                chemin = self.path.split("?", 1)[0]
+                try:
+                    i = int(chemin.rsplit("/", 1)[1]) if chemin.startswith("/p/") else -1
+                except ValueError:
+                    i = -1
+                if not 0 <= i < serveur.site.n_pages:
+                    self.send_error(404)
+                    return
+                corps = serveur.site.html(i)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Gestionnaire)
+        self.httpd.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def admettre(self):
+        """Statut de refus (429, 503) ou None si la requête est servie."""
+        with self._verrou:
+            if self.debit_max:
+                maintenant = time.monotonic()
+                self._jetons = min(float(self.debit_max), self._jetons + (maintenant - self._recharge) * self.debit_max)
+                self._recharge = maintenant
+                if self._jetons < 1:
+                    self.refus[429] += 1
+                    return 429
+                self._jetons -= 1
+            if self.capacite and self._en_cours >= self.capacite:
+                self.refus[503] += 1
+                return 503
+            self._en_cours += 1
+        return None
+
+    def terminer(self):
+        with self._verrou:
+            self._en_cours -= 1
+
+    def attendre(self):
+        if self.latence_ms or self.gigue_ms:
+            delai = self.latence_ms + random.uniform(-self.gigue_ms, self.gigue_ms)
+            time.sleep(max(0.0, delai) / 1000)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ─── Exécution et enregistrement ─────────────────────────────────────────────
+
+def version_git():
+    """Commit courant (court), suffixé de -modifie si maillage_interne.py a des changements non commités."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RACINE,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        modifie = subprocess.run(
+            ["git", "status", "--porcelain", "--", "maillage_interne.py"], cwd=RACINE,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        return commit + ("-modifie" if modifie else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def executer_pipeline(arguments, dossier, nom):
+    """Lance maillage_interne.py dans un sous-processus ; retourne le rapport --metrics-out."""
+    metriques = os.path.join(dossier, f"{nom}_metriques.json")
+    sortie = os.path.join(dossier, f"{nom}_recommandations.csv")
+    journal = os.path.join(dossier, f"{nom}.log")
+    commande = [sys.executable, SCRIPT, *arguments, "-o", sortie, "--metrics-out", metriques, "-q"]
+    debut = time.perf_counter()
+    with open(journal, "w", encoding="utf-8") as f:
+        retour = subprocess.run(commande, stdout=f, stderr=subprocess.STDOUT)
+    duree = time.perf_counter() - debut
+    if retour.returncode != 0:
+        print(f"  Erreur : {nom} a echoue (code {retour.returncode}), voir {journal}")
+        return None
+    with open(metriques, encoding="utf-8") as f:
+        rapport = json.load(f)
+    rapport["duree_processus_s"] = duree
+    return rapport
+
+
+def executer_shards(arguments, dossier, nombre):
+    """Lance le calcul réparti avec des processus locaux comme nœuds : préparation,
+    `nombre` shards en parallèle, puis fusion. Retourne un rapport au format de
+    --metrics-out où l'étape "shards" couvre la phase parallèle (durée murale,
+    CPU cumulé, RSS du plus gros shard), ou None en cas d'échec.
+    """
+    partage = os.path.join(dossier, "shards")
+    preparation = executer_pipeline(
+        arguments + ["--shard", "preparer", "--shard-dossier", partage], dossier, "shards_preparation"
+    )
+    if preparation is None:
+        return None
+
+    processus = []
+    debut = time.perf_counter()
+    for indice in range(1, nombre + 1):
+        metriques = os.path.join(dossier, f"shard_{indice}_metriques.json")
+        journal = open(os.path.join(dossier, f"shard_{indice}.log"), "w", encoding="utf-8")
+        commande = [
+            sys.executable, SCRIPT, "--shard", f"{indice}/{nombre}", "--shard-dossier", partage,
+            "--metrics-out", metriques, "-q",
+        ]
+        processus.append((subprocess.Popen(commande, stdout=journal, stderr=subprocess.STDOUT), journal, metriques))
+    rapports = []
+    for p, journal, metriques in processus:
+        retour = p.wait()
+        journal.close()
+        if retour != 0:
+            print(f"  Erreur : un shard a echoue (code {retour}), voir {journal.name}")
+            return None
+        with open(metriques, encoding="utf-8") as f:
+            rapports.append(json.load(f))
+    duree_shards = time.perf_counter() - debut
+
+    fusion = executer_pipeline(["--shard", "fusionner", "--shard-dossier", partage], dossier, "shards")
+    if fusion is None:
+        return None
+    rss_shards = max((r["rss_max_mo"] or 0 for r in rapports), default=0)
+    etape_shards = {
+        "etape": "shards",
+        "duree_s": duree_shards,
+        "cpu_s": sum(e["cpu_s"] for r in rapports for e in r["etapes"]),
+        "rss_max_mo": rss_shards,
+        "elements": nombre,
+    }
+    return {
+        "duree_processus_s": preparation["duree_processus_s"] + duree_shards + fusion["duree_processus_s"],
+        "duree_totale_s": preparation["duree_totale_s"] + duree_shards + fusion["duree_totale_s"],
+        "rss_max_mo": max(preparation["rss_max_mo"] or 0, rss_shards, fusion["rss_max_mo"] or 0),
+        "etapes": preparation["etapes"] + [etape_shards] + fusion["etapes"],
+        "hotes": preparation["hotes"],
+    }
+
+
+def temps_cpu_enfants():
+    """CPU (utilisateur + système) cumulé des sous-processus terminés (0 sous Windows)."""
+    temps = os.times()
+    return temps.children_user + temps.children_system
+
+
+def executer_batch(args, tailles, options, dossier):
+    """Un site par taille, chacun sur son serveur : crawl de chaque site par un
+    processus séparé (boucle habituelle), puis de tous les sites par un seul
+    --batch. Retourne un rapport au format de --metrics-out réduit (étapes
+    "sequentiel" et "batch", sans RSS : les processus de calcul du batch ne
+    sont pas mesurés), ou None en cas d'échec.
+    """
+    dossier_batch = os.path.join(dossier, "batch")
+    os.makedirs(dossier_batch, exist_ok=True)
+    communs = ["--delai", "0", "--concurrent", str(args.concurrent)]
+    with ExitStack() as pile:
+        sites = []
+        for numero, taille in enumerate(tailles, 1):
+            site = SiteSynthetique(taille, args.graine + numero, args.themes, facettes=args.facettes)
+            serveur = pile.enter_context(ServeurSite(site, args.latence, args.gigue, args.debit_max, args.capacite))
+            dossier_site = os.path.join(dossier_batch, f"site_{numero}_{taille}")
+            sites.append((numero, dossier_site, site.ecrire_exports(dossier_site, serveur.base)))
+        print(f"\n{len(sites)} sites generes ({sum(tailles)} pages), mode batch")
+
+        debut, cpu = time.perf_counter(), temps_cpu_enfants()
+        for numero, dossier_site, chemins in sites:
+            arguments = ["-i", chemins["urls"], "--inlinks", chemins["inlinks"], *communs, *options]
+            if executer_pipeline(arguments, dossier_site, "sequentiel") is None:
+                return None
+        sequentiel = {"duree_s": time.perf_counter() - debut, "cpu_s": temps_cpu_enfants() - cpu}
+
+        manifeste = os.path.join(dossier_batch, "sites.txt")
+        with open(manifeste, "w", encoding="utf-8") as f:
+            for numero, dossier_site, chemins in sites:
+                sortie = os.path.join(dossier_site, "batch_recommandations.csv")
+                f.write(" ".join(shlex.quote(a) for a in ["-i", chemins["urls"], "--inlinks", chemins["inlinks"], "-o", sortie]) + "\n")
+        metriques = os.path.join(dossier_batch, "batch_metriques.json")
+        commande = [sys.executable, SCRIPT, "--batch", manifeste, "--metrics-out", metriques, "-q", *communs, *options]
+        debut, cpu = time.perf_counter(), temps_cpu_enfants()
+        with open(os.path.join(dossier_batch, "batch.log"), "w", encoding="utf-8") as f:
+            retour = subprocess.run(commande, stdout=f, stderr=subprocess.STDOUT)
+        batch = {"duree_s": time.perf_counter() - debut, "cpu_s": temps_cpu_enfants() - cpu}
+    if retour.returncode != 0:
+        print(f"  Erreur : le batch a echoue (code {retour.returncode}), voir {f.name}")
+        return None
+
+    differents = [
+        dossier_site for _, dossier_site, _ in sites
+        if not fichiers_identiques(
+            os.path.join(dossier_site, "sequentiel_recommandations.csv"),
+            os.path.join(dossier_site, "batch_recommandations.csv"),
+        )
+    ]
+    print(
+        f"  batch : sorties {'identiques' if not differents else 'DIFFERENTES (' + ', '.join(differents) + ')'} "
+        f"a celles des processus separes, {sequentiel['duree_s'] / batch['duree_s']:.1f}x plus rapide"
+    )
+    with open(metriques, encoding="utf-8") as f:
+        rapport_batch = json.load(f)
+    return {
+        "duree_processus_s": batch["duree_s"],
+        "duree_totale_s": rapport_batch["duree_totale_s"],
+        "etapes": [
+            {"etape": "sequentiel", "elements": len(sites), **sequentiel},
+            {"etape": "batch", "elements": len(sites), **batch},
+        ],
+        "hotes": {},
+    }
+
+
+def fichiers_identiques(a, b):
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            bloc_a, bloc_b = fa.read(1 << 20), fb.read(1 << 20)
+            if bloc_a != bloc_b:
+                return False
+            if not bloc_a:
+                return True
+
+
+def resume_rapport(rapport):
+    """Réduit un rapport --metrics-out aux mesures comparées d'un commit à l'autre.
+    Les mesures de RSS absentes du rapport (mode batch) sont omises.
+    """
+    return {
+        "duree_processus_s": round(rapport["duree_processus_s"], 3),
+        "duree_totale_s": round(rapport["duree_totale_s"], 3),
+        **({"rss_max_mo": rapport["rss_max_mo"]} if "rss_max_mo" in rapport else {}),
+        "etapes": {
+            e["etape"]: {
+                "duree_s": round(e["duree_s"], 3),
+                "cpu_s": round(e["cpu_s"], 3),
+                **({"rss_max_mo": e["rss_max_mo"]} if "rss_max_mo" in e else {}),
+                **({"rss_hausse_mo": e["rss_hausse_mo"]} if "rss_hausse_mo" in e else {}),
+                "elements": e["elements"],
+                **({"erreurs": e["erreurs"]} if "erreurs" in e else {}),
+            }
+            for e in rapport["etapes"]
+        },
+        "hotes": {h: {k: v for k, v in s.items() if k != "histogramme"} for h, s in rapport["hotes"].items()},
+    }
+
+
+def afficher_resultat(resultat):
+    rss = resultat["mesures"].get("rss_max_mo")
+    print(
+        f"  {resultat['mode']:<7} {resultat['taille']:>7} pages : "
+        f"{resultat['mesures']['duree_processus_s']:.1f}s" + (f", RSS max {rss:.0f} Mo" if rss is not None else "")
+    )
+    for etape, m in resultat["mesures"]["etapes"].items():
+        erreurs = f", {m['erreurs']} pages en erreur" if m.get("erreurs") else ""
+        memoire = f", RSS +{m['rss_hausse_mo']:.0f} Mo" if (m.get("rss_hausse_mo") or 0) >= 1 else ""
+        print(f"      {etape:<16} {m['duree_s']:8.2f}s (CPU {m['cpu_s']:.2f}s){erreurs}{memoire}")
+
+
+def comparer(chemin_resultats):
+    """Compare, pour chaque (mode, taille, options), le dernier résultat des deux derniers commits."""
+    if not os.path.exists(chemin_resultats):
+        print(f"Erreur : aucun resultat dans {chemin_resultats}")
+        return
+    series = {}
+    with open(chemin_resultats, encoding="utf-8") as f:
+        for ligne in f:
+            if not ligne.strip():
+                continue
+            r = json.loads(ligne)
+            cle = (r["mode"], r["taille"], " ".join(r["options"]))
+            series.setdefault(cle, {})[r["commit"]] = r  # le dernier résultat d'un commit gagne
+
+    for (mode, taille, options), par_commit in sorted(series.items()):
+        commits = sorted(par_commit.values(), key=lambda r: r["date"])[-2:]
+        print(f"\n{mode} {taille} pages {options}".rstrip())
+        if len(commits) < 2:
+            print(f"  un seul commit ({commits[0]['commit']}), rien a comparer")
+            continue
+        avant, apres = commits
+        print(f"  {'etape':<16} {avant['commit']:>14} {apres['commit']:>14}   ecart")
+        etapes = list(dict.fromkeys([*avant["mesures"]["etapes"], *apres["mesures"]["etapes"]]))
+        lignes = [(e, avant["mesures"]["etapes"].get(e, {}).get("duree_s"),
+                   apres["mesures"]["etapes"].get(e, {}).get("duree_s")) for e in etapes]
+        lignes.append(("total", avant["mesures"]["duree_processus_s"], apres["mesures"]["duree_processus_s"]))
+        for etape, a, b in lignes:
+            ecart = f"{(b - a) / a:+.0%}" if a and b is not None else ""
+            a_txt = f"{a:.2f}s" if a is not None else "-"
+            b_txt = f"{b:.2f}s" if b is not None else "-"
+            print(f"  {etape:<16} {a_txt:>14} {b_txt:>14}   {ecart}")
+
+
+# ─── Démarrage de la CLI ─────────────────────────────────────────────────────
+
+MODULES_LOURDS = ("numpy", "pandas", "scipy", "sklearn", "requests", "bs4", "lxml", "multiprocessing")
+
+
+def modules_importes(commande):
+    """Modules de premier niveau importés par une commande (sortie de -X importtime)."""
+    retour = subprocess.run(
+        [sys.executable, "-X", "importtime", *commande], capture_output=True, text=True,
+    )
+    modules = set()
+    for ligne in retour.stderr.splitlines():
+        if ligne.startswith("import time:") and "|" in ligne:
+            modules.add(ligne.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+def mesurer_demarrage(budget_ms, repetitions=7):
+    """Vérifie que --help et une erreur d'entrée restent sous budget_ms (médiane
+    de repetitions lancements) sans importer de dépendance lourde.
+    Retourne True si le budget est tenu.
+    """
+    commandes = {
+        "--help": [SCRIPT, "--help"],
+        "fichier introuvable": [SCRIPT, "-i", os.path.join(RACINE, "absent_banc_demarrage.txt")],
+    }
+    reference = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], capture_output=True)
+        reference.append(time.perf_counter() - debut)
+    reference = sorted(reference)[repetitions // 2] * 1000
+    print(f"Demarrage de l'interpreteur seul : {reference:.0f} ms")
+
+    tenu = True
+    for nom, commande in commandes.items():
+        durees = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            subprocess.run([sys.executable, *commande], capture_output=True)
+            durees.append(time.perf_counter() - debut)
+        mediane = sorted(durees)[repetitions // 2] * 1000
+        lourds = sorted(modules_importes(commande) & set(MODULES_LOURDS))
+        ok = mediane <= budget_ms and not lourds
+        tenu = tenu and ok
+        print(
+            f"  {nom:<20} {mediane:6.0f} ms (budget {budget_ms:.0f} ms)"
+            f"{', importe ' + ', '.join(lourds) if lourds else ''} : {'OK' if ok else 'DEPASSE'}"
+        )
+    return tenu
+
+
+# ─── Extracteurs ─────────────────────────────────────────────────────────────
+
+FIXTURES_EXTRACTEURS = os.path.join(RACINE, "fixtures", "extracteurs")
+
+# Simule requests >= 2.32 sans chardet ni charset_normalizer installé.
+SANS_DETECTEUR = (
+    "import runpy, sys, requests; requests.compat.chardet = None; "
+    "sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name='__main__')"
+)
+
+
+def verifier_extracteurs():
+    """Compare les extracteurs bs4 et lxml sur les pages de FIXTURES_EXTRACTEURS
+    (avec puis sans détecteur d'encodage). Retourne True si les sorties sont identiques.
+    """
+    variantes = {
+        "detecteur d'encodage": [SCRIPT],
+        "sans detecteur": ["-c", SANS_DETECTEUR, SCRIPT],
+    }
+    identiques = True
+    for nom, commande in variantes.items():
+        retour = subprocess.run(
+            [sys.executable, *commande, "--comparer-extracteurs", FIXTURES_EXTRACTEURS],
+            capture_output=True, text=True,
+        )
+        ok = retour.returncode == 0
+        identiques = identiques and ok
+        print(f"  {nom:<22} {'OK' if ok else 'ECHEC'} : {(retour.stdout + retour.stderr).strip()}")
+    return identiques
+
+
+# ─── Pondération des champs ──────────────────────────────────────────────────
+
+def comparer_ponderations(tailles, graine, n_themes, repetitions=3):
+    """Chronomètre --ponderation champs (VectoriseurChamps) contre la répétition
+    des champs (TfidfVectorizer) sur les pages de sites synthétiques, avec et
+    sans contenu (export Screaming Frog) : durée médiane de repetitions
+    ajustements et pic mémoire (tracemalloc) d'un ajustement.
+    """
+    sys.path.insert(0, RACINE)
+    import maillage_interne
+
+    variantes = {
+        "repetition": (maillage_interne.creer_vectorizer, None),
+        "champs": (lambda: maillage_interne.VectoriseurChamps(maillage_interne.POIDS_CHAMPS), maillage_interne.POIDS_CHAMPS),
+    }
+    for taille, corps in ((t, c) for t in tailles for c in (True, False)):
+        site = SiteSynthetique(taille, graine, n_themes)
+        pages = {f"/p/{i}": site.page(i, corps) for i in range(taille)}
+        urls = list(pages)
+        print(f"\n{taille} pages {'avec contenu' if corps else 'sans contenu (export SF)'}")
+        mesures = {}
+        for nom, (creer, poids) in variantes.items():
+            corpus, _ = maillage_interne.construire_corpus(pages, urls, poids)
+            durees = []
+            for _ in range(repetitions):
+                debut = time.perf_counter()
+                creer().fit_transform(corpus)
+                durees.append(time.perf_counter() - debut)
+            tracemalloc.start()
+            matrice = creer().fit_transform(corpus)
+            pic = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            duree = sorted(durees)[repetitions // 2]
+            mesures[nom] = (duree, pic)
+            print(f"  {nom:<12} {duree:7.2f}s   pic memoire {pic:8.1f} Mo   {matrice.shape[1]} termes")
+        (duree_r, pic_r), (duree_c, pic_c) = mesures["repetition"], mesures["champs"]
+        print(f"  champs contre repetition : temps {duree_c / duree_r - 1:+.0%}, pic memoire {pic_c / pic_r - 1:+.0%}")
+
+
+# ─── Main ────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Banc d'essai de maillage_interne.py sur des sites synthetiques",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Exemples :
+  python benchmark_maillage.py --tailles 1000,10000
+  python benchmark_maillage.py --tailles 50000 --modes sf --options="--voisins ann"
+  python benchmark_maillage.py --tailles 2000 --latence 50 --gigue 20 --concurrent 20
+  python benchmark_maillage.py --tailles 1000 --modes scrape --debit-max 50 --capacite 4 --options="--adaptatif --tentatives 3"
+  python benchmark_maillage.py --tailles 20000 --modes sf,shards --shards 8
+  python benchmark_maillage.py --tailles 200,200,500,1000,3000 --modes batch --latence 20
+  python benchmark_maillage.py --comparer
+  python benchmark_maillage.py --demarrage --budget-demarrage 400
+  python benchmark_maillage.py --extracteurs
+  python benchmark_maillage.py --ponderation --tailles 2000,20000
+        """,
+    )
+    parser.add_argument("--tailles", default="1000,5000", help="Nombres de pages a tester, separes par des virgules (defaut: 1000,5000)")
+    parser.add_argument("--modes", default="scrape,sf", help="scrape (crawl du serveur local), sf (export Screaming Frog, --no-scrape) shards (sf en calcul reparti sur des processus locaux, sortie comparee a sf) et/ou batch (un site par taille, crawles par un processus chacun puis par un seul --batch) (defaut: scrape,sf)")
+    parser.add_argument("--shards", type=int, default=4, help="Nombre de shards (processus locaux) du mode shards (defaut: 4)")
+    parser.add_argument("--options", default="", help="Options supplementaires passees a maillage_interne.py")
+    parser.add_argument("--latence", type=float, default=0, help="Latence ajoutee par le serveur en ms (defaut: 0)")
+    parser.add_argument("--gigue", type=float, default=0, help="Variation aleatoire de la latence en ms (defaut: 0)")
+    parser.add_argument("--debit-max", type=float, default=0, help="Requetes par seconde acceptees par le serveur local, 429 au-dela (defaut: 0, illimite)")
+    parser.add_argument("--capacite", type=int, default=0, help="Requetes simultanees acceptees par le serveur local, 503 au-dela (defaut: 0, illimite)")
+    parser.add_argument("--concurrent", type=int, default=10, help="Requetes simultanees du crawl (defaut: 10)")
+    parser.add_argument("--themes", type=int, default=10, help="Nombre de clusters thematiques (defaut: 10)")
+    parser.add_argument("--facettes", type=float, default=0.0, help="Part des pages aussi servies en variante ?tri=prix (defaut: 0)")
+    parser.add_argument("--graine", type=int, default=1, help="Graine du generateur (defaut: 1)")
+    parser.add_argument("--dossier", default=None, help="Dossier de travail (sites, sorties, journaux) (defaut: dossier temporaire)")
+    parser.add_argument("--resultats", default=os.path.join(RACINE, "benchmarks", "resultats.jsonl"), help="Fichier JSONL ou ajouter les resultats, ignore par git (defaut: benchmarks/resultats.jsonl)")
+    parser.add_argument("--comparer", action="store_true", help="Compare les deux derniers commits enregistres dans --resultats, puis quitte")
+    parser.add_argument("--demarrage", action="store_true", help="Mesure le temps de demarrage de la CLI (--help, erreur d'entree) contre --budget-demarrage, puis quitte (code 1 si depasse)")
+    parser.add_argument("--budget-demarrage", type=float, default=400, help="Budget de demarrage de la CLI en ms (defaut: 400)")
+    parser.add_argument("--extracteurs", action="store_true", help="Verifie que les extracteurs bs4 et lxml donnent des sorties identiques sur fixtures/extracteurs/, puis quitte (code 1 sinon)")
+    parser.add_argument("--ponderation", action="store_true", help="Chronometre la vectorisation --ponderation champs contre la repetition des champs (temps median et pic memoire) sur un site synthetique par taille, puis quitte")
+    args = parser.parse_args()
+
+    if args.extracteurs:
+        sys.exit(0 if verifier_extracteurs() else 1)
+
+    if args.ponderation:
+        comparer_ponderations([int(t) for t in args.tailles.split(",") if t.strip()], args.graine, args.themes)
+        return
+
+    if args.comparer:
+        comparer(args.resultats)
+        return
+
+    if args.demarrage:
+        sys.exit(0 if mesurer_demarrage(args.budget_demarrage) else 1)
+
+    tailles = [int(t) for t in args.tailles.split(",") if t.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    options = shlex.split(args.options)
+    commit = version_git()
+    machine = {
+        "python": platform.python_version(),
+        "systeme": platform.platform(),
+        "processeurs": os.cpu_count(),
+    }
+    temporaire = None
+    dossier = args.dossier
+    if dossier is None:
+        temporaire = tempfile.TemporaryDirectory(prefix="bench_maillage_")
+        dossier = temporaire.name
+    os.makedirs(os.path.dirname(os.path.abspath(args.resultats)), exist_ok=True)
+    print(f"Banc d'essai du commit {commit} dans {dossier}")
+
+    try:
+        for taille in (tailles if any(m != "batch" for m in modes) else []):
+            site = SiteSynthetique(taille, args.graine, args.themes, facettes=args.facettes)
+            dossier_site = os.path.join(dossier, f"site_{taille}")
+            with ServeurSite(site, args.latence, args.gigue, args.debit_max, args.capacite) as serveur:
+                debut = time.perf_counter()
+                chemins = site.ecrire_exports(dossier_site, serveur.base)
+                print(f"\nSite de {taille} pages genere en {time.perf_counter() - debut:.1f}s ({serveur.base})")
+                for mode in modes:
+                    if mode == "batch":
+                        continue
+                    if mode == "scrape":
+                        arguments = [
+                            "-i", chemins["urls"], "--inlinks", chemins["inlinks"],
+                            "--delai", "0", "--concurrent", str(args.concurrent),
+                        ]
+                    elif mode in ("sf", "shards"):
+                        arguments = ["-i", chemins["sf"], "--no-scrape", "--inlinks", chemins["inlinks"]]
+                    else:
+                        print(f"Attention : mode inconnu ignore : {mode}")
+                        continue
+                    if mode == "shards":
+                        rapport = executer_shards(arguments + options, dossier_site, args.shards)
+                    else:
+                        rapport = executer_pipeline(arguments + options, dossier_site, mode)
+                    if rapport is None:
+                        continue
+                    reference = os.path.join(dossier_site, "sf_recommandations.csv")
+                    if mode == "shards" and os.path.exists(reference):
+                        identique = fichiers_identiques(reference, os.path.join(dossier_site, "shards_recommandations.csv"))
+                        print(f"  shards : sortie {'identique' if identique else 'DIFFERENTE'} de celle du mode sf")
+                    resultat = {
+                        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "commit": commit,
+                        "mode": mode,
+                        "taille": taille,
+                        "options": options,
+                        "latence_ms": args.latence,
+                        "gigue_ms": args.gigue,
+                        "concurrent": args.concurrent,
+                        "debit_max": args.debit_max,
+                        "capacite": args.capacite,
+                        "shards": args.shards if mode == "shards" else None,
+                        "machine": machine,
+                        "mesures": resume_rapport(rapport),
+                    }
+                    if mode == "scrape" and (args.debit_max or args.capacite):
+                        resultat["refus_serveur"] = dict(serveur.refus)
+                        print(f"  Refus du serveur : {serveur.refus[429]} x 429, {serveur.refus[503]} x 503")
+                        serveur.refus = {429: 0, 503: 0}
+                    afficher_resultat(resultat)
+                    with open(args.resultats, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(resultat, ensure_ascii=False) + "\n")
+        if "batch" in modes:
+            rapport = executer_batch(args, tailles, options, dossier)
+            if rapport is not None:
+                resultat = {
+                    "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "commit": commit,
+                    "mode": "batch",
+                    "taille": sum(tailles),
+                    "sites": tailles,
+                    "options": options,
+                    "latence_ms": args.latence,
+                    "gigue_ms": args.gigue,
+                    "concurrent": args.concurrent,
+                    "machine": machine,
+                    "mesures": resume_rapport(rapport),
+                }
+                afficher_resultat(resultat)
+                with open(args.resultats, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(resultat, ensure_ascii=False) + "\n")
+    finally:
+        if temporaire:
+            temporaire.cleanup()
+    print(f"\nResultats ajoutes a {args.resultats}")
+
+
+if __name__ == "__main__":
+    main()
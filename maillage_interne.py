@@ -6,23 +6,86 @@ des recommandations de liens internes sous forme de CSV.
 """
 
 import argparse
+import cProfile
 import csv
+import gzip
+import hashlib
+import heapq
+import importlib
 import io
+import json
 import math
 import os
+import pickle
+import random
 import re
+import shlex
+import sqlite3
 import sys
+import tempfile
+import threading
 import time
-from collections import Counter, defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urljoin, urlparse, urlunparse
+import traceback
+from array import array
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qs, urljoin, urlparse, urlunparse
 
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ImportDiffere:
+    """Module (ou attribut de module) importé à son premier usage.
+    --help, les erreurs d'arguments et les étapes qui n'en ont pas besoin ne
+    paient pas l'import de numpy, pandas, scipy, sklearn, requests, bs4,
+    lxml et multiprocessing (plus d'une seconde). Au premier accès, le proxy se remplace par
+    l'objet réel dans les globales du module : les accès suivants sont directs.
+    """
+
+    def __init__(self, nom, module, attribut=None):
+        self._nom = nom
+        self._module = module
+        self._attribut = attribut
+
+    def _charger(self):
+        objet = importlib.import_module(self._module)
+        if self._attribut:
+            objet = getattr(objet, self._attribut)
+        globals()[self._nom] = objet
+        return objet
+
+    def __getattr__(self, attribut):
+        if attribut.startswith("_"):
+            raise AttributeError(attribut)
+        return getattr(self._charger(), attribut)
+
+    def __call__(self, *args, **kwargs):
+        return self._charger()(*args, **kwargs)
+
+
+ProcessPoolExecutor = ImportDiffere("ProcessPoolExecutor", "concurrent.futures", "ProcessPoolExecutor")
+multiprocessing = ImportDiffere("multiprocessing", "multiprocessing")
+np = ImportDiffere("np", "numpy")
+pd = ImportDiffere("pd", "pandas")
+requests = ImportDiffere("requests", "requests")
+BeautifulSoup = ImportDiffere("BeautifulSoup", "bs4", "BeautifulSoup")
+etree = ImportDiffere("etree", "lxml.etree")
+sparse = ImportDiffere("sparse", "scipy.sparse")
+connected_components = ImportDiffere("connected_components", "scipy.sparse.csgraph", "connected_components")
+KMeans = ImportDiffere("KMeans", "sklearn.cluster", "KMeans")
+MiniBatchKMeans = ImportDiffere("MiniBatchKMeans", "sklearn.cluster", "MiniBatchKMeans")
+TruncatedSVD = ImportDiffere("TruncatedSVD", "sklearn.decomposition", "TruncatedSVD")
+CountVectorizer = ImportDiffere("CountVectorizer", "sklearn.feature_extraction.text", "CountVectorizer")
+HashingVectorizer = ImportDiffere("HashingVectorizer", "sklearn.feature_extraction.text", "HashingVectorizer")
+TfidfVectorizer = ImportDiffere("TfidfVectorizer", "sklearn.feature_extraction.text", "TfidfVectorizer")
+silhouette_score = ImportDiffere("silhouette_score", "sklearn.metrics", "silhouette_score")
+normalize = ImportDiffere("normalize", "sklearn.preprocessing", "normalize")
+murmurhash3_32 = ImportDiffere("murmurhash3_32", "sklearn.utils", "murmurhash3_32")
 
 # ─── Stop words français embarqués ───────────────────────────────────────────
 
@@ -98,12 +161,28 @@ def detecter_format_input(filepath):
     return "url_list", enc, None
 
 
-def charger_urls_screaming_frog(filepath, enc, sep):
-    """Charge les URLs depuis un export Screaming Frog, filtre Status 200."""
-    df = pd.read_csv(filepath, encoding=enc, sep=sep, on_bad_lines="skip", dtype=str)
-    df.columns = [c.strip() for c in df.columns]
+CHAMPS_SF = ("title", "h1", "meta_description")
+
+
+def normaliser_urls(serie, memo=None):
+    """Normalise une Series d'URLs en ne traitant qu'une fois chaque valeur distincte."""
+    memo = {} if memo is None else memo
+    for u in serie.dropna().unique():
+        if u not in memo:
+            memo[u] = normaliser_url(str(u))
+    return serie.map(memo)
+
+
+def charger_urls_screaming_frog(filepath, enc, sep, taille_chunk=200000):
+    """Charge les URLs depuis un export Screaming Frog, filtre Status 200.
+    Seules les colonnes utiles sont lues, par blocs de taille_chunk lignes.
+    Retourne (urls, sf_data) où sf_data est un DataFrame indexé par URL
+    normalisée (colonnes CHAMPS_SF), ou None si l'export n'a aucune de ces colonnes.
+    """
+    entete = pd.read_csv(filepath, encoding=enc, sep=sep, nrows=0, dtype=str)
+    colonnes = {c.strip(): c for c in entete.columns}
     col_address = None
-    for c in df.columns:
+    for c in colonnes:
         if c.lower() == "address":
             col_address = c
             break
@@ -112,20 +191,13 @@ def charger_urls_screaming_frog(filepath, enc, sep):
         sys.exit(1)
 
     col_status = None
-    for c in df.columns:
+    for c in colonnes:
         if c.lower() in ("status code", "status_code", "status"):
             col_status = c
             break
 
-    if col_status:
-        df[col_status] = pd.to_numeric(df[col_status], errors="coerce")
-        df = df[df[col_status] == 200]
-
-    urls = df[col_address].dropna().tolist()
-
-    sf_data = {}
     col_map = {}
-    for c in df.columns:
+    for c in colonnes:
         cl = c.lower().strip()
         if cl == "title 1" or cl == "title":
             col_map["title"] = c
@@ -134,37 +206,55 @@ def charger_urls_screaming_frog(filepath, enc, sep):
         elif cl in ("meta description 1", "meta description"):
             col_map["meta_description"] = c
 
-    if col_map:
-        for _, row in df.iterrows():
-            addr = row.get(col_address)
-            if pd.isna(addr):
-                continue
-            url_n = normaliser_url(str(addr))
-            data = {}
-            for key, col in col_map.items():
-                val = row.get(col)
-                data[key] = str(val) if pd.notna(val) else ""
-            sf_data[url_n] = data
+    utiles = {col_address, *col_map.values()} | ({col_status} if col_status else set())
+    lecteur = pd.read_csv(
+        filepath, encoding=enc, sep=sep, on_bad_lines="skip", dtype=str,
+        usecols=[colonnes[c] for c in utiles], chunksize=taille_chunk,
+    )
 
-    return [normaliser_url(u) for u in urls if isinstance(u, str) and u.strip()], sf_data
+    urls = []
+    blocs = []
+    memo = {}
+    for chunk in lecteur:
+        chunk.columns = [c.strip() for c in chunk.columns]
+        if col_status:
+            chunk = chunk[pd.to_numeric(chunk[col_status], errors="coerce") == 200]
+        adresses = chunk[col_address].dropna()
+        urls.extend(u for u in normaliser_urls(adresses[adresses.str.strip() != ""], memo))
+        if col_map:
+            bloc = pd.DataFrame(
+                {key: chunk.loc[adresses.index, col].fillna("").astype(str) for key, col in col_map.items()}
+            )
+            bloc.index = normaliser_urls(adresses, memo).values
+            blocs.append(bloc)
+
+    sf_data = None
+    if blocs:
+        sf_data = pd.concat(blocs).reindex(columns=list(CHAMPS_SF), fill_value="")
+        sf_data = sf_data[~sf_data.index.duplicated(keep="last")]
+    return urls, sf_data
 
 
 def charger_urls_liste(filepath, enc):
     """Charge les URLs depuis un fichier texte (une par ligne)."""
     with open(filepath, "r", encoding=enc) as f:
         urls = [normaliser_url(line.strip()) for line in f if line.strip()]
-    return [u for u in urls if u.startswith("http")], {}
+    return [u for u in urls if u.startswith("http")], None
 
 
-def charger_inlinks(filepath):
-    """Charge un export 'All Inlinks' de Screaming Frog."""
+def charger_inlinks(filepath, graphe=None, taille_chunk=500000):
+    """Charge un export 'All Inlinks' de Screaming Frog dans un GrapheLiens.
+    Seules les colonnes source/destination sont lues, par blocs ; chaque URL
+    brute distincte n'est normalisée et internée qu'une fois.
+    """
+    graphe = GrapheLiens() if graphe is None else graphe
     enc = detecter_encodage(filepath)
-    df = pd.read_csv(filepath, encoding=enc, on_bad_lines="skip", dtype=str)
-    df.columns = [c.strip() for c in df.columns]
+    entete = pd.read_csv(filepath, encoding=enc, nrows=0, dtype=str)
+    colonnes = {c.strip(): c for c in entete.columns}
 
     col_source = None
     col_dest = None
-    for c in df.columns:
+    for c in colonnes:
         cl = c.lower()
         if cl in ("source", "from"):
             col_source = c
@@ -172,59 +262,471 @@ def charger_inlinks(filepath):
             col_dest = c
 
     if not col_source or not col_dest:
-        cols_lower = [c.lower() for c in df.columns]
-        if len(df.columns) >= 2 and not col_source:
-            col_source = df.columns[0]
-            col_dest = df.columns[1]
+        if len(colonnes) >= 2 and not col_source:
+            col_source, col_dest = list(colonnes)[:2]
+    if not col_source or not col_dest:
+        return graphe
+
+    lecteur = pd.read_csv(
+        filepath, encoding=enc, on_bad_lines="skip", dtype=str,
+        usecols=[colonnes[col_source], colonnes[col_dest]], chunksize=taille_chunk,
+    )
+    ids_bruts = {}
+    for chunk in lecteur:
+        chunk.columns = [c.strip() for c in chunk.columns]
+        chunk = chunk.dropna(subset=[col_source, col_dest])
+        codes, uniques = pd.factorize(pd.concat([chunk[col_source], chunk[col_dest]]))
+        nouvelles = [u for u in uniques if u not in ids_bruts]
+        if nouvelles:
+            ids = graphe.interner(normaliser_url(str(u)) for u in nouvelles)
+            ids_bruts.update(zip(nouvelles, ids.tolist()))
+        table = np.fromiter((ids_bruts[u] for u in uniques), dtype=np.int64, count=len(uniques))
+        ids = table[codes]
+        graphe.ajouter(ids[:len(chunk)], ids[len(chunk):])
+    return graphe
+
+
+# ─── Métriques ───────────────────────────────────────────────────────────────
+
+BORNES_LATENCE = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+
+def rss_max_mo():
+    """Pic de mémoire résidente du processus en Mo (None si indisponible, ex. Windows)."""
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en Ko ailleurs.
+    return pic / (1024 * 1024) if sys.platform == "darwin" else pic / 1024
+
+
+class Metriques:
+    """Mesures par étape du pipeline et latences de téléchargement par hôte.
+    Chaque étape (context manager etape) enregistre durée, temps CPU, nombre
+    d'éléments et mémoire : rss_max_mo est le pic du processus à la fin de
+    l'étape (il inclut les étapes précédentes), rss_hausse_mo la hausse de ce
+    pic pendant l'étape (0 si elle reste sous un pic antérieur). Avec
+    dossier_profil, l'étape est aussi profilée par cProfile dans
+    <dossier_profil>/<etape>.prof.
+    """
+
+    def __init__(self, dossier_profil=None):
+        self.etapes = []
+        self.latences = defaultdict(list)
+        self.dossier_profil = dossier_profil
+        self._verrou = threading.Lock()
+        self._debut = time.perf_counter()
 
-    liens = set()
-    for _, row in df.iterrows():
-        src = row.get(col_source)
-        dst = row.get(col_dest)
-        if pd.notna(src) and pd.notna(dst):
-            liens.add((normaliser_url(str(src)), normaliser_url(str(dst))))
-    return liens
+    @contextmanager
+    def etape(self, nom):
+        """Mesure le bloc ; le dict produit accepte "elements" (nombre traité)."""
+        infos = {"etape": nom, "elements": None}
+        profil = None
+        if self.dossier_profil:
+            os.makedirs(self.dossier_profil, exist_ok=True)
+            profil = cProfile.Profile()
+            profil.enable()
+        debut, debut_cpu, pic_avant = time.perf_counter(), time.process_time(), rss_max_mo()
+        try:
+            yield infos
+        finally:
+            infos["duree_s"] = time.perf_counter() - debut
+            infos["cpu_s"] = time.process_time() - debut_cpu
+            infos["rss_max_mo"] = rss_max_mo()
+            infos["rss_hausse_mo"] = None if pic_avant is None else infos["rss_max_mo"] - pic_avant
+            if profil:
+                profil.disable()
+                infos["profil"] = os.path.join(self.dossier_profil, f"{nom}.prof")
+                profil.dump_stats(infos["profil"])
+            self.etapes.append(infos)
+
+    def latence(self, url, secondes):
+        """Enregistre la durée d'un téléchargement (appelable depuis plusieurs threads)."""
+        if secondes is None:
+            return
+        with self._verrou:
+            self.latences[urlparse(url).netloc].append(secondes)
+
+    def histogrammes(self):
+        """{hôte: {"requetes", "p50_s", "p95_s", "max_s", "histogramme"}} ;
+        histogramme = nombre de requêtes sous chaque borne de BORNES_LATENCE (puis au-delà).
+        """
+        resultat = {}
+        for hote, valeurs in sorted(self.latences.items()):
+            valeurs = np.asarray(valeurs)
+            comptes = np.bincount(np.searchsorted(BORNES_LATENCE, valeurs), minlength=len(BORNES_LATENCE) + 1)
+            resultat[hote] = {
+                "requetes": len(valeurs),
+                "p50_s": float(np.percentile(valeurs, 50)),
+                "p95_s": float(np.percentile(valeurs, 95)),
+                "max_s": float(valeurs.max()),
+                "histogramme": dict(zip([f"<{b}s" for b in BORNES_LATENCE] + ["plus"], comptes.tolist())),
+            }
+        return resultat
+
+    def rapport(self):
+        return {
+            "duree_totale_s": time.perf_counter() - self._debut,
+            "rss_max_mo": rss_max_mo(),
+            "etapes": self.etapes,
+            "hotes": self.histogrammes(),
+        }
+
+    def exporter(self, chemin):
+        """Écrit le rapport en JSON, ou en CSV long (section, nom, mesure, valeur) si chemin finit par .csv."""
+        rapport = self.rapport()
+        if not chemin.lower().endswith(".csv"):
+            with open(chemin, "w", encoding="utf-8") as f:
+                json.dump(rapport, f, ensure_ascii=False, indent=2)
+            return
+        with open(chemin, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["section", "nom", "mesure", "valeur"])
+            writer.writerow(["total", "", "duree_s", rapport["duree_totale_s"]])
+            writer.writerow(["total", "", "rss_max_mo", rapport["rss_max_mo"]])
+            for infos in rapport["etapes"]:
+                for mesure, valeur in infos.items():
+                    if mesure != "etape":
+                        writer.writerow(["etape", infos["etape"], mesure, valeur])
+            for hote, stats in rapport["hotes"].items():
+                for mesure, valeur in stats.items():
+                    if mesure == "histogramme":
+                        for borne, nombre in valeur.items():
+                            writer.writerow(["hote", hote, f"latence{borne}", nombre])
+                    else:
+                        writer.writerow(["hote", hote, mesure, valeur])
+
+    def afficher(self):
+        print("\n  Etapes :")
+        for infos in self.etapes:
+            elements = f", {infos['elements']} elements" if infos["elements"] is not None else ""
+            memoire = f", RSS +{infos['rss_hausse_mo']:.0f} Mo" if (infos["rss_hausse_mo"] or 0) >= 1 else ""
+            print(f"    {infos['etape']:<16} {infos['duree_s']:8.2f}s (CPU {infos['cpu_s']:.2f}s){elements}{memoire}")
+
+    def publier(self, chemin=None):
+        """Fin d'exécution : écrit et affiche le rapport si chemin est donné (--metrics-out)."""
+        if chemin:
+            self.exporter(chemin)
+            self.afficher()
+            print(f"\nMetriques ecrites dans {chemin}")
+        if self.dossier_profil:
+            print(f"Profils cProfile par etape dans {self.dossier_profil}/ (python -m pstats <fichier>)")
 
 
 # ─── Scraping ────────────────────────────────────────────────────────────────
 
 BOILERPLATE_TAGS = {"nav", "footer", "header", "aside", "script", "style", "noscript", "form"}
+# Balises dont BeautifulSoup type le texte à part (Script, TemplateString...) :
+# get_text() ignore ce texte, l'extracteur lxml fait de même.
+CONTENEURS_TEXTE_IGNORE = {"script", "style", "template", "rt", "rp"}
+TAILLE_MAX_TEXTE = 50000
+META_DESCRIPTION_RE = re.compile(r"^description$", re.I)
 
 
-def scraper_page(url, user_agent, timeout):
-    """Scrape une page et extrait title, h1, meta desc, body text, liens internes."""
-    headers = {"User-Agent": user_agent}
-    result = {
+_sessions = threading.local()
+
+
+def session_http(user_agent):
+    """Session requests propre au thread courant.
+    Les connexions keep-alive sont réutilisées d'une page à l'autre pour un
+    même hôte, au lieu d'un handshake TCP/TLS par requête.
+    """
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers["User-Agent"] = user_agent
+        _sessions.session = session
+    return session
+
+
+class PolitesseHotes:
+    """Espace d'au moins `delai` secondes les requêtes vers un même hôte.
+    reserver ne bloque jamais : l'ordonnanceur de scraper_pages ne soumet une
+    URL qu'une fois son hôte disponible, et aucun thread ne dort en gardant
+    une place de téléchargement. Les hôtes différents ne se gênent pas.
+    """
+
+    def __init__(self, delai):
+        self.delai = delai
+        self._verrou = threading.Lock()
+        self._prochain = {}
+
+    def reserver(self, url):
+        """Réserve une requête vers l'hôte de url si son créneau est arrivé.
+        Retourne 0 si la requête peut partir, sinon les secondes à attendre.
+        """
+        if self.delai <= 0:
+            return 0
+        hote = urlparse(url).netloc.lower()
+        with self._verrou:
+            maintenant = time.monotonic()
+            attente = self._prochain.get(hote, 0.0) - maintenant
+            if attente > 0:
+                return attente
+            self._prochain[hote] = maintenant + self.delai
+            return 0
+
+    def liberer(self, url, resultat):
+        """Fin d'une requête : sans effet à délai fixe (voir RegulateurHotes)."""
+
+
+class RegulateurHotes:
+    """Débit adaptatif par hôte (AIMD), interface de PolitesseHotes.
+    Chaque hôte a une limite de requêtes simultanées et un délai entre deux
+    requêtes. Une réponse saine (latence moyenne < facteur_latence x latence
+    de référence) relève la limite : +1 par réponse tant que l'hôte n'a jamais
+    saturé (démarrage rapide), puis +1 par fenêtre, et fait redescendre le
+    délai vers delai_min. Un 429, un 5xx réessayable, un timeout ou une erreur
+    de connexion divise la limite par deux, au plus une fois par fenêtre ; à
+    la limite 1, c'est le délai qui double. La fenêtre vaut la latence
+    moyenne de l'hôte, et au moins une seconde.
+    Un Retry-After suspend l'hôte jusqu'à son échéance.
+    """
+
+    def __init__(self, delai_min, concurrent_max, depart=2, facteur_latence=3.0, fenetre_debit=10.0):
+        self.delai_min = delai_min
+        self.concurrent_max = max(1, concurrent_max)
+        self.depart = min(depart, self.concurrent_max)
+        self.facteur_latence = facteur_latence
+        self.fenetre_debit = fenetre_debit
+        self.hotes = {}
+        self._fins = []
+        self._verrou = threading.Lock()
+
+    def _etat(self, hote):
+        etat = self.hotes.get(hote)
+        if etat is None:
+            etat = self.hotes[hote] = {
+                "limite": float(self.depart), "delai": self.delai_min, "en_cours": 0,
+                "prochain": 0.0, "pause": 0.0, "latence_ref": None, "latence_moy": None,
+                "derniere_baisse": -math.inf, "derniere_hausse": -math.inf, "baisses": 0, "retry_after": 0, "requetes": 0,
+            }
+        return etat
+
+    def reserver(self, url):
+        """Réserve une requête vers l'hôte de url sans bloquer.
+        Retourne 0 si elle peut partir, les secondes restantes si l'hôte est
+        en pause (Retry-After) ou entre deux requêtes, None s'il est à sa
+        limite de requêtes simultanées (attendre la fin de l'une d'elles).
+        """
+        hote = urlparse(url).netloc.lower()
+        with self._verrou:
+            etat = self._etat(hote)
+            maintenant = time.monotonic()
+            attente = max(etat["pause"], etat["prochain"]) - maintenant
+            if etat["en_cours"] >= int(etat["limite"]):
+                return None
+            if attente > 0:
+                return attente
+            etat["en_cours"] += 1
+            etat["requetes"] += 1
+            etat["prochain"] = maintenant + etat["delai"]
+            return 0
+
+    def liberer(self, url, resultat):
+        """Ajuste limite et délai de l'hôte d'après le résultat de la requête."""
+        hote = urlparse(url).netloc.lower()
+        with self._verrou:
+            etat = self._etat(hote)
+            etat["en_cours"] -= 1
+            maintenant = time.monotonic()
+            self._fins.append(maintenant)
+            if len(self._fins) > 4096:
+                self._fins = [t for t in self._fins if t > maintenant - self.fenetre_debit]
+            resultat = resultat or {}
+            if resultat.get("retry_after"):
+                etat["pause"] = max(etat["pause"], maintenant + resultat["retry_after"])
+                etat["retry_after"] += 1
+            latence = resultat.get("latence")
+            fenetre = max(etat["latence_moy"] or 0.0, 1.0)
+            if resultat.get("reessayable"):
+                if maintenant - etat["derniere_baisse"] >= fenetre:
+                    if etat["limite"] <= 1:
+                        etat["delai"] = min(max(etat["delai"] * 2, 0.25), 60.0)
+                    etat["limite"] = max(1.0, etat["limite"] / 2)
+                    etat["derniere_baisse"] = etat["derniere_hausse"] = maintenant
+                    etat["baisses"] += 1
+            elif latence is not None and not resultat.get("erreur"):
+                etat["latence_moy"] = latence if etat["latence_moy"] is None else 0.8 * etat["latence_moy"] + 0.2 * latence
+                # Référence : la plus basse latence vue, qui remonte d'au plus 1 % par réponse.
+                etat["latence_ref"] = latence if etat["latence_ref"] is None else min(etat["latence_ref"] * 1.01, latence)
+                sain = etat["latence_moy"] <= self.facteur_latence * max(etat["latence_ref"], 0.001)
+                if sain and (etat["baisses"] == 0 or maintenant - etat["derniere_hausse"] >= fenetre):
+                    etat["limite"] = min(float(self.concurrent_max), etat["limite"] + 1)
+                    etat["derniere_hausse"] = maintenant
+                if sain:
+                    etat["delai"] = max(self.delai_min, etat["delai"] * 0.9)
+
+    def debit(self):
+        """Pages terminées par seconde sur la dernière fenetre_debit secondes."""
+        with self._verrou:
+            maintenant = time.monotonic()
+            recentes = sum(1 for t in self._fins if t > maintenant - self.fenetre_debit)
+        return recentes / self.fenetre_debit
+
+    def resume(self, n=3):
+        """Limite et délai courants des n hôtes les plus sollicités."""
+        with self._verrou:
+            hotes = sorted(self.hotes.items(), key=lambda h: -h[1]["requetes"])[:n]
+            return ", ".join(f"{h} x{e['limite']:.1f} {e['delai']:.2f}s" for h, e in hotes)
+
+
+def files_par_hote(urls):
+    """{hôte: deque d'URLs}, dans l'ordre d'apparition des hôtes et des URLs."""
+    files = {}
+    for url in urls:
+        files.setdefault(urlparse(url).netloc.lower(), deque()).append(url)
+    return files
+
+
+def page_vide(url, erreur=None):
+    """Résultat de scraping sans contenu (erreur ou page non encore extraite)."""
+    return {
         "url": url,
         "title": "",
         "h1": "",
         "meta_description": "",
         "body_text": "",
         "liens_internes": set(),
-        "erreur": None,
+        "erreur": erreur,
+        "octets": 0,
+        "etag": None,
+        "last_modified": None,
+        "latence": None,
     }
+
+
+STATUTS_REESSAYABLES = {429, 500, 502, 503, 504}
+RETRY_AFTER_MAX = 600
+
+
+def lire_retry_after(valeur):
+    """Secondes d'attente d'un en-tête Retry-After (délai ou date HTTP), bornées à
+    RETRY_AFTER_MAX ; None si absent ou illisible.
+    """
+    if not valeur:
+        return None
+    try:
+        secondes = float(valeur)
+    except ValueError:
+        try:
+            secondes = parsedate_to_datetime(valeur).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError):
+            return None
+    return min(max(secondes, 0.0), RETRY_AFTER_MAX)
+
+
+def telecharger_page(url, user_agent, timeout, session=None, validateurs=None, taille_max=0):
+    """Télécharge une page (partie réseau du scraping, sans parsing).
+    Retourne (result, contenu, encodage) ; contenu vaut None quand il n'y a
+    rien à extraire (erreur, type non-HTML, réponse 304).
+    validateurs : (etag, last_modified) d'une version en cache ; si le serveur
+    répond 304, le résultat est marqué "non_modifie".
+    Une erreur passagère (connexion, timeout, STATUTS_REESSAYABLES) marque le
+    résultat "reessayable", avec "retry_after" (secondes) si le serveur l'indique.
+    taille_max : nombre maximal d'octets lus (0 = illimité) ; au-delà, la
+    réponse est tronquée et la connexion fermée.
+    """
+    headers = {"User-Agent": user_agent}
+    if validateurs:
+        etag, last_modified = validateurs
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    result = page_vide(url)
+    debut = time.perf_counter()
+    try:
+        http = session or requests
+        with http.get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=True) as resp:
+            if resp.status_code == 304 and validateurs:
+                result["non_modifie"] = True
+                result["latence"] = time.perf_counter() - debut
+                return result, None, None
+            resp.raise_for_status()
+            result["etag"] = resp.headers.get("ETag")
+            result["last_modified"] = resp.headers.get("Last-Modified")
+
+            content_type = resp.headers.get("Content-Type", "")
+            if "text/html" not in content_type and "application/xhtml" not in content_type:
+                result["erreur"] = f"Type non-HTML: {content_type}"
+                return result, None, None
+
+            morceaux = []
+            lus = 0
+            for morceau in resp.iter_content(chunk_size=65536):
+                morceaux.append(morceau)
+                lus += len(morceau)
+                if taille_max and lus >= taille_max:
+                    break
+            contenu = b"".join(morceaux)
+            if taille_max:
+                contenu = contenu[:taille_max]
+            result["octets"] = len(contenu)
+            result["latence"] = time.perf_counter() - debut
+            encodage = resp.encoding or deviner_encodage(contenu)
+            return result, contenu, encodage
+
+    except requests.RequestException as e:
+        result["erreur"] = str(e)
+        statut = e.response.status_code if e.response is not None else None
+        result["reessayable"] = (
+            isinstance(e, (requests.ConnectionError, requests.Timeout))
+            or statut in STATUTS_REESSAYABLES
+        )
+        if statut in STATUTS_REESSAYABLES:
+            result["retry_after"] = lire_retry_after(e.response.headers.get("Retry-After"))
+    except Exception as e:
+        result["erreur"] = str(e)
+
+    return result, None, None
+
+
+def deviner_encodage(contenu):
+    """Encodage probable d'un HTML sans charset HTTP, comme Response.apparent_encoding.
+    None (décodé en UTF-8) si ni chardet ni charset_normalizer n'est installé :
+    requests >= 2.32 laisse alors requests.compat.chardet à None.
+    """
+    detecteur = requests.compat.chardet
+    if detecteur is None:
+        return None
+    return detecteur.detect(contenu)["encoding"]
+
+
+def decoder_contenu(contenu, encodage):
+    """Décode le HTML brut comme requests.Response.text."""
     try:
-        resp = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-        resp.raise_for_status()
+        return str(contenu, encodage or "utf-8", errors="replace")
+    except (LookupError, TypeError):
+        return str(contenu, errors="replace")
 
-        content_type = resp.headers.get("Content-Type", "")
-        if "text/html" not in content_type and "application/xhtml" not in content_type:
-            result["erreur"] = f"Type non-HTML: {content_type}"
-            return result
 
-        soup = BeautifulSoup(resp.text, "lxml")
+def extraire_page(url, contenu, encodage):
+    """Extrait title, h1, meta desc, body text et liens internes d'un HTML brut.
+    Partie CPU du scraping, sans état : exécutable dans un ProcessPoolExecutor.
+    Retourne uniquement les champs extraits (et "erreur" en cas d'échec).
+    """
+    extrait = {
+        "title": "",
+        "h1": "",
+        "meta_description": "",
+        "body_text": "",
+        "liens_internes": set(),
+    }
+    try:
+        soup = BeautifulSoup(decoder_contenu(contenu, encodage), "lxml")
 
         tag_title = soup.find("title")
         if tag_title:
-            result["title"] = tag_title.get_text(strip=True)
+            extrait["title"] = tag_title.get_text(strip=True)
 
         tag_h1 = soup.find("h1")
         if tag_h1:
-            result["h1"] = tag_h1.get_text(strip=True)
+            extrait["h1"] = tag_h1.get_text(strip=True)
 
-        tag_meta = soup.find("meta", attrs={"name": re.compile(r"^description$", re.I)})
+        tag_meta = soup.find("meta", attrs={"name": META_DESCRIPTION_RE})
         if tag_meta and tag_meta.get("content"):
-            result["meta_description"] = tag_meta["content"].strip()
+            extrait["meta_description"] = tag_meta["content"].strip()
 
         parsed_base = urlparse(url)
         base_domain = parsed_base.netloc.lower()
@@ -234,7 +736,7 @@ def scraper_page(url, user_agent, timeout):
             abs_url = urljoin(url, href)
             parsed_link = urlparse(abs_url)
             if parsed_link.netloc.lower() == base_domain:
-                result["liens_internes"].add(normaliser_url(abs_url))
+                extrait["liens_internes"].add(normaliser_url(abs_url))
 
         for tag in soup.find_all(BOILERPLATE_TAGS):
             tag.decompose()
@@ -243,309 +745,2977 @@ def scraper_page(url, user_agent, timeout):
         if body:
             text = body.get_text(separator=" ", strip=True)
             text = re.sub(r"\s+", " ", text)
-            result["body_text"] = text[:50000]
+            extrait["body_text"] = text[:TAILLE_MAX_TEXTE]
 
-    except requests.RequestException as e:
-        result["erreur"] = str(e)
     except Exception as e:
-        result["erreur"] = str(e)
+        extrait["erreur"] = str(e)
 
-    return result
+    return extrait
 
 
-def scraper_pages(urls, user_agent, timeout, delai, concurrent_max):
-    """Scrape toutes les pages en parallèle avec ThreadPoolExecutor."""
-    resultats = {}
-    total = len(urls)
-    termine = 0
+def _texte_element(element, ignore=False):
+    """Équivalent de get_text(strip=True) sur un élément lxml.
+    ignore : l'élément est déjà dans un conteneur dont le texte est ignoré.
+    """
+    morceaux = []
+    pile = [(element, ignore)]
+    while pile:
+        noeud, ignore = pile.pop()
+        if isinstance(noeud, str):
+            if not ignore and noeud.strip():
+                morceaux.append(noeud.strip())
+            continue
+        if not isinstance(noeud.tag, str):
+            continue
+        ignore = ignore or noeud.tag in CONTENEURS_TEXTE_IGNORE
+        suite = [(noeud.text, ignore)] if noeud.text else []
+        for enfant in noeud:
+            suite.append((enfant, ignore))
+            if enfant.tail:
+                suite.append((enfant.tail, ignore))
+        pile.extend(reversed(suite))
+    return "".join(morceaux)
 
-    print(f"\nScraping de {total} pages ({concurrent_max} threads, delai {delai}s)...")
 
-    with ThreadPoolExecutor(max_workers=concurrent_max) as executor:
-        futures = {}
-        for i, url in enumerate(urls):
-            future = executor.submit(scraper_page, url, user_agent, timeout)
-            futures[future] = url
-            if delai > 0 and i < total - 1:
-                time.sleep(delai)
+def extraire_page_lxml(url, contenu, encodage):
+    """Extrait les mêmes champs que extraire_page en un seul parcours de l'arbre lxml.
+    Pas d'arbre BeautifulSoup ni de decompose() : les sous-arbres de
+    BOILERPLATE_TAGS sont simplement sautés pour le texte, et la collecte du
+    body s'arrête dès TAILLE_MAX_TEXTE caractères (les liens restent collectés).
+    """
+    extrait = {
+        "title": "",
+        "h1": "",
+        "meta_description": "",
+        "body_text": "",
+        "liens_internes": set(),
+    }
+    try:
+        parser = etree.HTMLParser(recover=True)
+        parser.feed(decoder_contenu(contenu, encodage))
+        racine = parser.close()
+        if racine is None:
+            return extrait
 
-        for future in as_completed(futures):
-            url = futures[future]
-            try:
-                res = future.result()
-                resultats[normaliser_url(url)] = res
-                termine += 1
-                if res["erreur"]:
-                    print(f"  [{termine}/{total}] ERREUR {url}: {res['erreur']}")
-                else:
-                    print(f"  [{termine}/{total}] OK {url}")
-            except Exception as e:
-                termine += 1
-                print(f"  [{termine}/{total}] ERREUR {url}: {e}")
-                resultats[normaliser_url(url)] = {
-                    "url": url, "title": "", "h1": "",
-                    "meta_description": "", "body_text": "",
-                    "liens_internes": set(), "erreur": str(e),
-                }
+        base_domain = urlparse(url).netloc.lower()
+        title = h1 = meta = None
+        body_vu = False
+        morceaux = []
+        longueur = -1
+        texte_complet = False
 
-    reussies = sum(1 for r in resultats.values() if not r["erreur"])
-    print(f"Scraping termine : {reussies}/{total} pages reussies.")
-    return resultats
+        # Pile de (noeud, dans_body, boilerplate, conteneur) ; les chaînes
+        # sont les text/tail, rattachées à l'élément parent.
+        pile = [(racine, False, False, False)]
+        while pile:
+            noeud, dans_body, boilerplate, conteneur = pile.pop()
+            if isinstance(noeud, str):
+                if dans_body and not boilerplate and not conteneur and not texte_complet:
+                    morceau = noeud.strip()
+                    if morceau:
+                        morceau = re.sub(r"\s+", " ", morceau)
+                        morceaux.append(morceau)
+                        longueur += len(morceau) + 1
+                        texte_complet = longueur >= TAILLE_MAX_TEXTE
+                continue
 
+            tag = noeud.tag
+            if not isinstance(tag, str):
+                continue  # commentaire, instruction de traitement
 
-# ─── Analyse TF-IDF + Similarité ─────────────────────────────────────────────
+            if tag == "title" and title is None:
+                title = (noeud, conteneur)
+            elif tag == "h1" and h1 is None:
+                h1 = (noeud, conteneur)
+            elif tag == "meta" and meta is None:
+                nom = noeud.get("name")
+                if nom is not None and META_DESCRIPTION_RE.search(nom):
+                    meta = noeud
+            elif tag == "a":
+                href = noeud.get("href")
+                if href is not None:
+                    abs_url = urljoin(url, href.strip())
+                    if urlparse(abs_url).netloc.lower() == base_domain:
+                        extrait["liens_internes"].add(normaliser_url(abs_url))
+            elif tag == "body" and not body_vu and not boilerplate:
+                body_vu = dans_body = True
 
-def construire_texte_pondere(page_data):
-    """Construit le texte pondéré SEO pour une page.
-    title x3, h1 x2, meta x2, body x1.
-    """
-    title = page_data.get("title", "") or ""
-    h1 = page_data.get("h1", "") or ""
-    meta = page_data.get("meta_description", "") or ""
-    body = page_data.get("body_text", "") or ""
-    parts = []
-    for _ in range(3):
-        parts.append(title)
-    for _ in range(2):
-        parts.append(h1)
-    for _ in range(2):
-        parts.append(meta)
-    parts.append(body)
-    return " ".join(parts)
+            boilerplate = boilerplate or tag in BOILERPLATE_TAGS
+            conteneur = conteneur or tag in CONTENEURS_TEXTE_IGNORE
+            etat = (dans_body, boilerplate, conteneur)
+            suite = [(noeud.text, *etat)] if noeud.text else []
+            for enfant in noeud:
+                suite.append((enfant, *etat))
+                if enfant.tail:
+                    suite.append((enfant.tail, *etat))
+            pile.extend(reversed(suite))
 
+        if title is not None:
+            extrait["title"] = _texte_element(*title)
+        if h1 is not None:
+            extrait["h1"] = _texte_element(*h1)
+        if meta is not None and meta.get("content"):
+            extrait["meta_description"] = meta.get("content").strip()
+        extrait["body_text"] = " ".join(morceaux)[:TAILLE_MAX_TEXTE]
 
-def calculer_similarite(pages_data, urls):
-    """Calcule la matrice TF-IDF + cosinus similarity entre toutes les pages."""
-    corpus = []
-    urls_valides = []
-    for url in urls:
-        data = pages_data.get(url, {})
-        texte = construire_texte_pondere(data)
-        if texte.strip():
-            corpus.append(texte)
-            urls_valides.append(url)
+    except Exception as e:
+        extrait["erreur"] = str(e)
 
-    if len(corpus) < 2:
-        print("Erreur : moins de 2 pages avec du contenu. Impossible de calculer la similarite.")
-        sys.exit(1)
+    return extrait
 
-    print(f"\nCalcul TF-IDF sur {len(corpus)} pages...")
 
-    vectorizer = TfidfVectorizer(
-        max_features=10000,
-        ngram_range=(1, 2),
-        sublinear_tf=True,
-        strip_accents="unicode",
-        stop_words=list(FRENCH_STOP_WORDS),
-        min_df=1,
-        max_df=0.95,
-    )
-    tfidf_matrix = vectorizer.fit_transform(corpus)
+EXTRACTEURS = {"bs4": extraire_page, "lxml": extraire_page_lxml}
 
-    print("Calcul de la matrice de similarite cosinus...")
-    sim_matrix = cosine_similarity(tfidf_matrix)
 
-    return sim_matrix, urls_valides, vectorizer, tfidf_matrix
+def scraper_page(url, user_agent, timeout, session=None, validateurs=None, extracteur="bs4", taille_max=0):
+    """Scrape une page et extrait title, h1, meta desc, body text, liens internes."""
+    result, contenu, encodage = telecharger_page(url, user_agent, timeout, session, validateurs, taille_max)
+    if contenu is not None:
+        result.update(EXTRACTEURS[extracteur](url, contenu, encodage))
+    return result
 
 
-# ─── Clustering ──────────────────────────────────────────────────────────────
+def comparer_extracteurs(dossier, url_base):
+    """Compare les extracteurs bs4 et lxml sur un corpus de fichiers HTML locaux.
+    Chaque fichier est extrait comme s'il était servi à url_base + nom du fichier.
+    Retourne la liste des (fichier, champ) dont les sorties diffèrent.
+    """
+    differences = []
+    fichiers = sorted(f for f in os.listdir(dossier) if os.path.isfile(os.path.join(dossier, f)))
+    for nom in fichiers:
+        with open(os.path.join(dossier, nom), "rb") as f:
+            contenu = f.read()
+        url = urljoin(url_base, nom)
+        encodage = deviner_encodage(contenu)
+        ref = extraire_page(url, contenu, encodage)
+        rapide = extraire_page_lxml(url, contenu, encodage)
+        for champ in ("title", "h1", "meta_description", "body_text", "liens_internes", "erreur"):
+            if ref.get(champ) != rapide.get(champ):
+                differences.append((nom, champ))
+    print(f"{len(fichiers)} pages comparees, {len(differences)} differences.")
+    for nom, champ in differences[:20]:
+        print(f"  {nom} : {champ}")
+    return differences
 
-def clustering_pages(tfidf_matrix, urls_valides, vectorizer, n_clusters=None):
-    """KMeans clustering des pages avec labels auto."""
-    n_pages = len(urls_valides)
-    if n_clusters is None:
-        n_clusters = max(2, int(math.sqrt(n_pages / 2)))
-    n_clusters = min(n_clusters, n_pages)
 
-    print(f"Clustering en {n_clusters} clusters...")
+class OptionsCrawl:
+    """Options d'un crawl au-delà du téléchargement lui-même (voir scraper_pages).
+    cache : CacheCrawl ; ses entrées de moins de cache_ttl secondes sont
+    réutilisées telles quelles, les autres revalidées par requête
+    conditionnelle ; cache_seul n'utilise jamais le réseau.
+    journal : JournalCrawl ; ses pages sont reprises sans téléchargement et
+    chaque nouvelle page réussie y est ajoutée.
+    tentatives : essais au plus d'une URL en erreur passagère, l'essai n étant
+    replanifié après backoff x 2^(n-2) s (± 50 %) ou le Retry-After s'il est plus long.
+    adaptatif : RegulateurHotes au lieu de PolitesseHotes (délai fixe).
+    pool_telechargement, pool_extraction : pools partagés du mode batch,
+    utilisés à la place de ceux du crawl et jamais fermés par lui.
+    arret : threading.Event ; une fois posé, le crawl s'interrompt comme sur Ctrl-C.
+    """
 
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    labels = kmeans.fit_predict(tfidf_matrix)
+    def __init__(
+        self, cache=None, cache_ttl=0, cache_seul=False, journal=None, tentatives=1, backoff=2.0,
+        adaptatif=False, pool_telechargement=None, pool_extraction=None, arret=None
+    ):
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.cache_seul = cache_seul
+        self.journal = journal
+        self.tentatives = tentatives
+        self.backoff = backoff
+        self.adaptatif = adaptatif
+        self.pool_telechargement = pool_telechargement
+        self.pool_extraction = pool_extraction
+        self.arret = arret
 
-    feature_names = vectorizer.get_feature_names_out()
-    cluster_labels = {}
-    for i in range(n_clusters):
-        center = kmeans.cluster_centers_[i]
-        top_indices = center.argsort()[-5:][::-1]
-        top_terms = [feature_names[idx] for idx in top_indices]
-        cluster_labels[i] = " / ".join(top_terms)
 
-    page_clusters = {}
-    for url, label in zip(urls_valides, labels):
-        page_clusters[url] = cluster_labels[label]
+def scraper_pages(
+    urls, user_agent, timeout, delai, concurrent_max, extracteurs=0, extracteur="bs4",
+    taille_max=0, sur_page=None, metriques=None, silencieux=False, options=None
+):
+    """Scrape toutes les pages en parallèle avec ThreadPoolExecutor.
+    concurrent_max borne les requêtes simultanées, tous hôtes confondus ; le
+    délai de politesse s'applique par hôte et une URL n'est soumise qu'une fois
+    son hôte disponible (voir reserver). Avec extracteurs > 0, le HTML brut est
+    parsé par un ProcessPoolExecutor de ce nombre de processus.
+    sur_page(url, page), si fourni, est appelé dans le thread principal pour
+    chaque page réussie ; silencieux : une ligne de progression tous les 5 %.
+    options : OptionsCrawl (cache, journal, tentatives, pools partagés, arrêt).
+    """
+    options = options or OptionsCrawl()
+    cache, journal, arret = options.cache, options.journal, options.arret
+    adaptatif = options.adaptatif
+    resultats = {}
+    total = len(urls)
+    politesse = RegulateurHotes(delai, concurrent_max) if adaptatif else PolitesseHotes(delai)
+    entrees = cache.charger(normaliser_url(u) for u in urls) if cache else {}
+    maintenant = time.time()
+    stats_cache = Counter()
 
-    return page_clusters, cluster_labels
+    deja = journal.pages if journal else {}
+    a_scraper = []
+    for url in urls:
+        cle = normaliser_url(url)
+        entree = entrees.get(cle)
+        if cle in deja:
+            resultats[cle] = deja[cle]
+            stats_cache["reprise"] += 1
+        elif entree and (options.cache_seul or maintenant - entree["date_fetch"] < options.cache_ttl):
+            resultats[cle] = page_depuis_cache(url, entree)
+            stats_cache["frais"] += 1
+        elif options.cache_seul:
+            resultats[cle] = page_vide(url, "absente du cache (mode cache seul)")
+            stats_cache["absent"] += 1
+        else:
+            a_scraper.append(url)
 
+    def telecharger(url):
+        entree = entrees.get(normaliser_url(url))
+        validateurs = (entree["etag"], entree["last_modified"]) if entree else None
+        session = session_http(user_agent)
+        if extracteurs > 0:
+            return telecharger_page(url, user_agent, timeout, session, validateurs, taille_max)
+        res = scraper_page(url, user_agent, timeout, session, validateurs, extracteur, taille_max)
+        return res, None, None
 
-# ─── Détection liens existants ───────────────────────────────────────────────
+    def tache(url):
+        # La place auprès de l'hôte a été réservée par soumettre().
+        try:
+            resultat = telecharger(url)
+        except BaseException:
+            politesse.liberer(url, None)
+            raise
+        politesse.liberer(url, resultat[0])
+        return resultat
 
-def detecter_liens_existants(pages_data, inlinks_externe=None):
-    """Détecte les liens internes existants depuis les données scrapées et/ou inlinks."""
-    liens = set()
-    for url, data in pages_data.items():
-        url_n = normaliser_url(url)
-        for lien in data.get("liens_internes", set()):
-            liens.add((url_n, normaliser_url(lien)))
-    if inlinks_externe:
-        liens.update(inlinks_externe)
-    return liens
+    termine = total - len(a_scraper)
 
+    pas_progression = max(1, len(a_scraper) // 20)
 
-# ─── Pages orphelines ────────────────────────────────────────────────────────
+    def terminer(url, res):
+        nonlocal termine
+        cle = normaliser_url(url)
+        if metriques:
+            metriques.latence(url, res.get("latence"))
+        statut = "OK"
+        if res.get("non_modifie"):
+            res = page_depuis_cache(url, entrees[cle])
+            cache.rafraichir(cle)
+            stats_cache["304"] += 1
+            statut = "OK (304)"
+        elif cache and not res["erreur"]:
+            cache.enregistrer(cle, res)
+        if journal and not res["erreur"]:
+            journal.ajouter(cle, res)
+        resultats[cle] = res
+        if sur_page and not res["erreur"]:
+            sur_page(cle, res)
+        termine += 1
+        regulation = ""
+        if adaptatif and (termine % pas_progression == 0 or termine == total):
+            regulation = f"{politesse.debit():.1f} p/s, {politesse.resume()}"
+        if silencieux:
+            if termine % pas_progression == 0 or termine == total:
+                print(
+                    f"  [{termine}/{total}] {termine / total:.0%} ({time.monotonic() - debut:.0f}s)"
+                    + (f" {regulation}" if regulation else "")
+                )
+        elif res["erreur"]:
+            print(f"  [{termine}/{total}] ERREUR {url}: {res['erreur']}")
+        else:
+            print(f"  [{termine}/{total}] {statut} {url}")
+        if regulation and not silencieux:
+            print(f"  Debit : {regulation}")
+        if cache and termine % 100 == 0:
+            cache.valider()
 
-def detecter_pages_orphelines(urls, liens_existants):
-    """Détecte les pages qui ne reçoivent aucun lien interne."""
-    pages_cibles = set()
-    for _, cible in liens_existants:
-        pages_cibles.add(cible)
-    return [u for u in urls if u not in pages_cibles]
+    if journal and deja:
+        print(f"\nReprise : {stats_cache['reprise']} pages deja extraites (checkpoint {journal.chemin}).")
+    if cache:
+        print(
+            f"\nCache : {stats_cache['frais']} pages reprises sans requete, "
+            f"{len(a_scraper)} a recuperer ou revalider."
+        )
+    mode = f", {extracteurs} processus d'extraction" if extracteurs > 0 else ""
+    regulation = f"debit adaptatif par hote, delai min {delai}s" if adaptatif else f"delai {delai}s par hote"
+    print(f"\nScraping de {len(a_scraper)} pages ({concurrent_max} threads{mode}, {regulation})...")
+    debut = time.monotonic()
 
+    pool_extraction = options.pool_extraction
+    pool_partage = pool_extraction is not None
+    if not pool_partage and extracteurs > 0:
+        pool_extraction = ProcessPoolExecutor(max_workers=extracteurs)
+    if options.pool_telechargement is None:
+        pool_telechargement = ThreadPoolExecutor(max_workers=concurrent_max)
+    else:
+        pool_telechargement = nullcontext(options.pool_telechargement)
+    try:
+        with pool_telechargement as executor:
+            # future -> (url, résultat partiel) ; résultat partiel None = téléchargement
+            en_cours = {}
+            a_soumettre = files_par_hote(a_scraper)
+            telechargements = 0
+            # File des nouvelles tentatives : tas de (échéance, url).
+            relances = []
+            essais = Counter()
 
-# ─── Mots-clés communs ──────────────────────────────────────────────────────
+            def soumettre():
+                """Soumet, hôte par hôte en tourniquet, les URLs des hôtes qui
+                acceptent une requête. Un hôte saturé ou en pause est sauté sans
+                occuper de place. Retourne l'attente avant qu'un hôte sauté ne
+                se libère avec le temps (None si aucun).
+                """
+                nonlocal telechargements
+                attente = None
+                soumis = True
+                while soumis and a_soumettre and telechargements < concurrent_max:
+                    soumis = False
+                    attente = None
+                    for hote in list(a_soumettre):
+                        if telechargements >= concurrent_max:
+                            break
+                        file = a_soumettre[hote]
+                        reste = politesse.reserver(file[0])
+                        if reste is None:
+                            continue
+                        if reste > 0:
+                            attente = reste if attente is None else min(attente, reste)
+                            continue
+                        url = file.popleft()
+                        en_cours[executor.submit(tache, url)] = (url, None)
+                        telechargements += 1
+                        soumis = True
+                        del a_soumettre[hote]
+                        if file:
+                            a_soumettre[hote] = file
+                return attente
 
-def extraire_mots_cles_page(page_data, n=20):
-    """Extrait les N mots-clés les plus importants d'une page."""
-    texte = construire_texte_pondere(page_data)
-    mots = re.findall(r"\b[a-zA-ZàâäéèêëïîôùûüÿçæœÀÂÄÉÈÊËÏÎÔÙÛÜŸÇÆŒ]{3,}\b", texte.lower())
-    mots = [m for m in mots if m not in FRENCH_STOP_WORDS]
-    compteur = Counter(mots)
-    return set(mot for mot, _ in compteur.most_common(n))
-
-
-def mots_cles_communs(pages_data, url1, url2, n=5):
-    """Trouve les mots-clés communs entre deux pages."""
-    kw1 = extraire_mots_cles_page(pages_data.get(url1, {}))
-    kw2 = extraire_mots_cles_page(pages_data.get(url2, {}))
-    communs = kw1 & kw2
-    return sorted(communs)[:n]
+            try:
+                while en_cours or relances or a_soumettre:
+                    if arret is not None and arret.is_set():
+                        raise KeyboardInterrupt
+                    while relances and relances[0][0] <= time.monotonic():
+                        _, url = heapq.heappop(relances)
+                        a_soumettre.setdefault(urlparse(url).netloc.lower(), deque()).appendleft(url)
+                    echeances = [soumettre()]
+                    if relances:
+                        echeances.append(relances[0][0] - time.monotonic())
+                    echeances = [e for e in echeances if e is not None]
+                    attente = max(0.0, min(echeances)) if echeances else None
+                    if arret is not None:
+                        attente = min(attente, 0.5) if attente is not None else 0.5
+                    if not en_cours:
+                        time.sleep(attente or 0.0)
+                        continue
+                    faits, _ = wait(en_cours, timeout=attente, return_when=FIRST_COMPLETED)
+                    for future in faits:
+                        url, partiel = en_cours.pop(future)
+                        try:
+                            if partiel is None:
+                                telechargements -= 1
+                                res, contenu, encodage = future.result()
+                                if contenu is not None:
+                                    suivant = pool_extraction.submit(EXTRACTEURS[extracteur], url, contenu, encodage)
+                                    en_cours[suivant] = (url, res)
+                                    continue
+                            else:
+                                res = partiel
+                                res.update(future.result())
+                            if res.get("reessayable") and essais[url] + 1 < options.tentatives:
+                                pause = max(
+                                    options.backoff * 2 ** essais[url] * random.uniform(0.5, 1.5),
+                                    res.get("retry_after") or 0.0,
+                                )
+                                essais[url] += 1
+                                heapq.heappush(relances, (time.monotonic() + pause, url))
+                                if not silencieux:
+                                    print(f"  Nouvelle tentative dans {pause:.1f}s : {url} ({res['erreur']})")
+                                continue
+                            terminer(url, res)
+                        except Exception as e:
+                            terminer(url, page_vide(url, str(e)))
+            except KeyboardInterrupt:
+                for future in en_cours:
+                    future.cancel()
+                if journal:
+                    journal.fermer()
+                    print(
+                        f"\nInterrompu : {journal.ecrites} pages dans le checkpoint {journal.chemin}, "
+                        f"relancer avec --resume pour reprendre."
+                    )
+                raise
+    finally:
+        if pool_extraction and not pool_partage:
+            pool_extraction.shutdown()
 
+    if essais:
+        print(f"Nouvelles tentatives : {sum(essais.values())} pour {len(essais)} URLs.")
+    if adaptatif:
+        for hote, etat in sorted(politesse.hotes.items()):
+            print(
+                f"Regulation {hote} : limite finale {etat['limite']:.1f}, delai {etat['delai']:.2f}s, "
+                f"{etat['baisses']} ralentissements, {etat['retry_after']} Retry-After."
+            )
+    if cache:
+        cache.valider()
+        print(
+            f"Cache : {stats_cache['frais']} frais, {stats_cache['304']} revalides (304), "
+            f"{stats_cache['absent']} absents."
+        )
+    duree = max(time.monotonic() - debut, 1e-9)
+    reussies = sum(1 for r in resultats.values() if not r["erreur"])
+    octets = sum(r.get("octets", 0) for r in resultats.values())
+    print(f"Scraping termine : {reussies}/{total} pages reussies.")
+    print(
+        f"Debit : {len(a_scraper) / duree:.1f} pages/s, {octets / duree / 1e6:.2f} Mo/s "
+        f"({duree:.1f}s, {octets / 1e6:.1f} Mo telecharges)"
+    )
+    return resultats
 
-# ─── Suggestion d'ancre ─────────────────────────────────────────────────────
 
-def suggerer_ancre(pages_data, url_source, url_cible):
-    """Suggère un texte d'ancre : H1 cible > titre cible > mots-clés communs."""
-    data_cible = pages_data.get(url_cible, {})
-    h1 = data_cible.get("h1", "")
-    title = data_cible.get("title", "")
-    if h1 and len(h1) < 100:
-        return h1
-    if title and len(title) < 100:
-        return title
-    communs = mots_cles_communs(pages_data, url_source, url_cible, n=3)
-    if communs:
-        return ", ".join(communs)
-    return ""
+# ─── Cache de crawl ──────────────────────────────────────────────────────────
 
+class CacheCrawl:
+    """Cache SQLite des champs extraits de chaque page et de ses validateurs HTTP.
+    Utilisé uniquement depuis le thread principal (connexion sqlite3 non partagée).
+    """
 
-# ─── Génération des recommandations ─────────────────────────────────────────
+    CHAMPS = ("title", "h1", "meta_description", "body_text")
 
-def generer_recommandations(
-    sim_matrix, urls_valides, pages_data, page_clusters,
-    liens_existants, max_reco, seuil
-):
-    """Génère les recommandations de maillage interne."""
-    recommandations = []
-    url_to_idx = {url: i for i, url in enumerate(urls_valides)}
+    def __init__(self, chemin):
+        self.conn = sqlite3.connect(chemin)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                title TEXT, h1 TEXT, meta_description TEXT, body_text TEXT,
+                liens_internes TEXT,
+                etag TEXT, last_modified TEXT,
+                date_fetch REAL
+            )"""
+        )
+        self.conn.commit()
 
-    print(f"\nGeneration des recommandations (max {max_reco} par page, seuil {seuil})...")
+    def charger(self, urls):
+        """Retourne {url: entrée} pour les URLs présentes dans le cache."""
+        entrees = {}
+        urls = list(urls)
+        for i in range(0, len(urls), 500):
+            lot = urls[i:i + 500]
+            requete = (
+                "SELECT url, title, h1, meta_description, body_text, liens_internes, "
+                "etag, last_modified, date_fetch FROM pages WHERE url IN "
+                f"({','.join('?' * len(lot))})"
+            )
+            for ligne in self.conn.execute(requete, lot):
+                url, title, h1, meta, body, liens, etag, last_modified, date_fetch = ligne
+                entrees[url] = {
+                    "title": title, "h1": h1, "meta_description": meta, "body_text": body,
+                    "liens_internes": set(json.loads(liens)),
+                    "etag": etag, "last_modified": last_modified, "date_fetch": date_fetch,
+                }
+        return entrees
 
-    for i, url_source in enumerate(urls_valides):
-        scores = []
-        for j, url_cible in enumerate(urls_valides):
-            if i == j:
-                continue
-            score = sim_matrix[i][j]
-            if score >= seuil:
-                scores.append((score, url_cible))
+    def enregistrer(self, url, page):
+        """Enregistre (ou remplace) une page extraite avec succès."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url, *(page.get(c, "") or "" for c in self.CHAMPS),
+                json.dumps(sorted(page.get("liens_internes", ()))),
+                page.get("etag"), page.get("last_modified"), time.time(),
+            ),
+        )
 
-        scores.sort(key=lambda x: x[0], reverse=True)
+    def rafraichir(self, url):
+        """Marque une entrée comme revalidée (réponse 304)."""
+        self.conn.execute("UPDATE pages SET date_fetch = ? WHERE url = ?", (time.time(), url))
 
-        for score, url_cible in scores[:max_reco]:
-            lien_existe = (url_source, url_cible) in liens_existants
-            communs = mots_cles_communs(pages_data, url_source, url_cible)
-            ancre = suggerer_ancre(pages_data, url_source, url_cible)
-            cluster_source = page_clusters.get(url_source, "")
-            cluster_cible = page_clusters.get(url_cible, "")
+    def purger(self, age_max):
+        """Supprime les entrées plus vieilles que age_max secondes. Retourne leur nombre."""
+        cur = self.conn.execute("DELETE FROM pages WHERE date_fetch < ?", (time.time() - age_max,))
+        self.conn.commit()
+        return cur.rowcount
 
-            recommandations.append({
-                "Page Source": url_source,
-                "Page Cible": url_cible,
-                "Score Similarite": round(score, 4),
-                "Ancre Suggeree": ancre,
-                "Mots-cles Communs": ", ".join(communs),
-                "Lien Existant": "oui" if lien_existe else "non",
-                "Cluster Source": cluster_source,
-                "Cluster Cible": cluster_cible,
-            })
+    def valider(self):
+        self.conn.commit()
 
-    recommandations.sort(key=lambda x: x["Score Similarite"], reverse=True)
-    return recommandations
+    def fermer(self):
+        self.conn.commit()
+        self.conn.close()
 
 
-# ─── Export CSV ──────────────────────────────────────────────────────────────
+def page_depuis_cache(url, entree):
+    """Reconstruit un résultat de scraping à partir d'une entrée du cache."""
+    page = {c: entree[c] or "" for c in CacheCrawl.CHAMPS}
+    page.update({
+        "url": url,
+        "liens_internes": set(entree["liens_internes"]),
+        "erreur": None,
+        "octets": 0,
+        "etag": entree["etag"],
+        "last_modified": entree["last_modified"],
+    })
+    return page
 
-def exporter_csv(recommandations, output_path):
-    """Exporte les recommandations en CSV."""
-    colonnes = [
-        "Page Source", "Page Cible", "Score Similarite", "Ancre Suggeree",
-        "Mots-cles Communs", "Lien Existant", "Cluster Source", "Cluster Cible",
-    ]
-    df = pd.DataFrame(recommandations, columns=colonnes)
-    df.to_csv(output_path, index=False, encoding="utf-8-sig")
-    print(f"\nCSV exporte : {output_path} ({len(recommandations)} recommandations)")
-    return df
 
+class JournalCrawl:
+    """Journal de reprise d'un crawl (checkpoint) : fichier JSONL en ajout seul,
+    une ligne par page extraite avec succès, écrite au fil du crawl et vidée
+    sur disque toutes les `vidage` pages. Une ligne tronquée par un arrêt
+    brutal est ignorée à la relecture.
+    Avec reprendre, les pages déjà journalisées sont chargées dans `pages`
+    et le journal est complété ; sinon il est recommencé à zéro (analyser_site
+    refuse d'écraser ainsi un journal non vide).
+    """
 
-# ─── Résumé console ─────────────────────────────────────────────────────────
+    CHAMPS = ("title", "h1", "meta_description", "body_text", "etag", "last_modified", "octets")
 
-def afficher_resume(
-    urls_valides, recommandations, page_clusters, cluster_labels,
-    pages_orphelines, liens_existants, sim_matrix
-):
-    """Affiche un résumé des résultats dans la console."""
-    total_reco = len(recommandations)
-    nouvelles = sum(1 for r in recommandations if r["Lien Existant"] == "non")
-    pct_nouvelles = (nouvelles / total_reco * 100) if total_reco > 0 else 0
+    def __init__(self, chemin, reprendre=False, vidage=50):
+        self.chemin = chemin
+        self.vidage = vidage
+        self.pages = self.charger() if reprendre else {}
+        self.ecrites = len(self.pages)
+        self._fichier = open(chemin, "a" if reprendre else "w", encoding="utf-8")
 
-    print("\n" + "=" * 60)
-    print("RESUME DES RESULTATS")
-    print("=" * 60)
-    print(f"  Pages analysees       : {len(urls_valides)}")
-    print(f"  Recommandations       : {total_reco}")
-    print(f"  Nouvelles opportunites: {nouvelles} ({pct_nouvelles:.1f}%)")
-    print(f"  Liens existants       : {total_reco - nouvelles}")
-    print(f"  Clusters thematiques  : {len(cluster_labels)}")
-    print(f"  Pages orphelines      : {len(pages_orphelines)}")
+    def charger(self):
+        """Lit le journal : {url normalisée: résultat de scraping}."""
+        pages = {}
+        if not os.path.exists(self.chemin):
+            return pages
+        fin_valide = 0
+        with open(self.chemin, "rb") as f:
+            for ligne in f:
+                if not ligne.endswith(b"\n"):
+                    break
+                try:
+                    entree = json.loads(ligne)
+                except ValueError:
+                    continue
+                finally:
+                    fin_valide += len(ligne)
+                page = page_vide(entree["url"])
+                page.update({c: entree.get(c, page[c]) for c in self.CHAMPS})
+                page["liens_internes"] = set(entree.get("liens_internes", ()))
+                pages[entree["cle"]] = page
+        # Retire une dernière ligne tronquée pour que les ajouts repartent propres.
+        if fin_valide < os.path.getsize(self.chemin):
+            os.truncate(self.chemin, fin_valide)
+        return pages
 
-    if pages_orphelines:
-        print("\n  Pages orphelines :")
-        for p in pages_orphelines[:10]:
-            print(f"    - {p}")
-        if len(pages_orphelines) > 10:
-            print(f"    ... et {len(pages_orphelines) - 10} autres")
+    def ajouter(self, cle, page):
+        entree = {"cle": cle, "url": page["url"], **{c: page.get(c) for c in self.CHAMPS}}
+        entree["liens_internes"] = sorted(page.get("liens_internes", ()))
+        self._fichier.write(json.dumps(entree, ensure_ascii=False) + "\n")
+        self.ecrites += 1
+        if self.ecrites % self.vidage == 0:
+            self._fichier.flush()
 
-    print(f"\n  Clusters :")
-    for cid, label in sorted(cluster_labels.items()):
-        count = sum(1 for v in page_clusters.values() if v == label)
-        print(f"    [{cid}] {label} ({count} pages)")
+    def fermer(self):
+        if not self._fichier.closed:
+            self._fichier.close()
 
-    print(f"\n  Top 5 paires les plus similaires :")
-    paires = []
-    n = len(urls_valides)
-    for i in range(n):
-        for j in range(i + 1, n):
-            paires.append((sim_matrix[i][j], urls_valides[i], urls_valides[j]))
-    paires.sort(key=lambda x: x[0], reverse=True)
-    for score, u1, u2 in paires[:5]:
-        print(f"    {score:.4f}  {u1}")
-        print(f"             {u2}")
 
-    print("=" * 60)
+# ─── Analyse TF-IDF + Similarité ─────────────────────────────────────────────
+
+CHAMPS_TEXTE = ("title", "h1", "meta_description", "body_text")
+POIDS_CHAMPS = {"title": 3, "h1": 2, "meta_description": 2, "body_text": 1}
+
+
+def construire_champs(page_data):
+    """Champs texte d'une page, dans l'ordre de CHAMPS_TEXTE, sans répétition."""
+    return tuple(page_data.get(champ, "") or "" for champ in CHAMPS_TEXTE)
+
+
+def construire_texte_pondere(page_data):
+    """Construit le texte pondéré SEO pour une page.
+    title x3, h1 x2, meta x2, body x1 (voir POIDS_CHAMPS).
+    """
+    parts = []
+    for champ, texte in zip(CHAMPS_TEXTE, construire_champs(page_data)):
+        parts.extend([texte] * POIDS_CHAMPS[champ])
+    return " ".join(parts)
+
+
+def taille_bloc_similarite(n_pages, taille_bloc, memoire_max_mo):
+    """Nombre de lignes par bloc pour tenir dans le budget mémoire.
+    Un bloc de b lignes coûte ~ b x N x 32 octets (produit creux, bloc dense
+    float64, index d'argpartition et masques de sélection).
+    """
+    octets_par_ligne = max(1, n_pages) * 32
+    max_lignes = int(memoire_max_mo * 1024 * 1024 // octets_par_ligne)
+    return max(1, min(taille_bloc, max_lignes))
+
+
+def selectionner_topk(sim, lignes_globales, k, seuil, colonnes_globales=None):
+    """Sélectionne les k meilleurs voisins >= seuil de chaque ligne d'un bloc dense.
+    lignes_globales : indice de page de chaque ligne du bloc, pour exclure la
+    page elle-même. À score égal, l'indice le plus petit passe en premier,
+    comme le tri stable de l'ancienne double boucle.
+    colonnes_globales : indices de page (croissants) des colonnes du bloc quand
+    il ne couvre qu'une partie des pages ; par défaut colonne j = page j.
+    Retourne (lignes, colonnes, scores) triés par ligne puis score décroissant.
+    """
+    b, n = sim.shape
+    rang = np.arange(b)
+    if colonnes_globales is None:
+        sim[rang, lignes_globales] = -np.inf
+    else:
+        sim[colonnes_globales[None, :] == lignes_globales[:, None]] = -np.inf
+    sim[sim < seuil] = -np.inf
+
+    if k < n:
+        part = np.argpartition(sim, n - k, axis=1)[:, n - k:]
+        kieme = sim[rang[:, None], part].min(axis=1)
+        masque = sim >= kieme[:, None]
+        masque &= np.isfinite(sim)
+    else:
+        masque = np.isfinite(sim)
+
+    lignes, colonnes = np.nonzero(masque)
+    scores = sim[lignes, colonnes]
+    ordre = np.lexsort((colonnes, -scores, lignes))
+    lignes, colonnes, scores = lignes[ordre], colonnes[ordre], scores[ordre]
+    rang_ligne = np.arange(len(lignes)) - np.searchsorted(lignes, lignes, side="left")
+    garde = rang_ligne < k
+    colonnes = colonnes[garde]
+    if colonnes_globales is not None:
+        colonnes = colonnes_globales[colonnes]
+    return lignes_globales[lignes[garde]], colonnes, scores[garde]
+
+
+def similarite_bloc(tfidf_matrix, lot, colonnes=None):
+    """Bloc dense des similarités cosinus entre les pages `lot` et toutes les pages
+    (ou seulement les pages `colonnes`).
+    Les lignes TF-IDF sont déjà L2-normalisées : le cosinus est le produit
+    scalaire X @ X[lot].T, sans la copie renormalisée de X que ferait
+    cosine_similarity à chaque bloc.
+    """
+    cibles = tfidf_matrix if colonnes is None else tfidf_matrix[colonnes]
+    return (cibles @ tfidf_matrix[lot].T).T.toarray()
+
+
+def voisins_lignes(tfidf_matrix, lignes, k, seuil, bloc):
+    """Top-k voisins d'un sous-ensemble de pages, par blocs de `bloc` lignes.
+    Retourne (lignes, colonnes, scores) concaténés.
+    """
+    lignes = np.asarray(lignes, dtype=np.int64)
+    res_lignes, res_colonnes, res_scores = [], [], []
+    for debut in range(0, len(lignes), bloc):
+        lot = lignes[debut:debut + bloc]
+        sim = similarite_bloc(tfidf_matrix, lot)
+        l, c, s = selectionner_topk(sim, lot, k, seuil)
+        res_lignes.append(l)
+        res_colonnes.append(c)
+        res_scores.append(s)
+        del sim
+    if not res_lignes:
+        vide = np.empty(0, dtype=np.int64)
+        return vide, vide, np.empty(0, dtype=np.float64)
+    return np.concatenate(res_lignes), np.concatenate(res_colonnes), np.concatenate(res_scores)
+
+
+def calculer_voisins_topk(
+    tfidf_matrix, top_k, seuil, taille_bloc=1024, memoire_max_mo=512
+):
+    """Calcule les top-k voisins cosinus de chaque page par blocs de lignes.
+    Seul un bloc dense (taille_bloc x N) existe à la fois : la mémoire crête
+    est O(N x k) pour le résultat au lieu de O(N²) pour la matrice complète.
+    Retourne une matrice CSR N x N des scores conservés.
+    """
+    n = tfidf_matrix.shape[0]
+    k = max(0, min(top_k, n - 1))
+    bloc = taille_bloc_similarite(n, taille_bloc, memoire_max_mo)
+    lignes = np.arange(n) if k > 0 else np.empty(0, dtype=np.int64)
+    lignes, colonnes, scores = voisins_lignes(tfidf_matrix, lignes, k, seuil, bloc)
+    return sparse.csr_matrix((scores, (lignes, colonnes)), shape=(n, n))
+
+
+class IndexANN:
+    """Recherche approchée des plus proches voisins : index IVF sur projection SVD.
+    Les vecteurs TF-IDF sont projetés par TruncatedSVD (composantes dimensions,
+    normalisées) puis répartis en `listes` cellules par MiniBatchKMeans ;
+    chaque page est rangée dans sa cellule la plus proche. Une page n'est
+    comparée qu'aux pages des nprobe cellules les plus proches de sa
+    projection, et ces candidats sont reclassés avec le cosinus TF-IDF exact :
+    les scores conservés sont ceux de la recherche exacte, seul le rappel
+    dépend de nprobe (plus grand = plus lent et plus complet).
+    Le rappel est mesuré contre la recherche exacte sur echantillon_rappel pages.
+    """
+
+    def __init__(
+        self, composantes=128, listes=None, nprobe=10,
+        echantillon_rappel=200, echantillon_apprentissage=50000
+    ):
+        self.composantes = composantes
+        self.listes = listes
+        self.nprobe = nprobe
+        self.echantillon_rappel = echantillon_rappel
+        self.echantillon_apprentissage = echantillon_apprentissage
+        self.rappel = None
+
+    def construire(self, tfidf_matrix, tranche=65536):
+        """Projette les pages, entraîne les cellules et calcule les cellules sondées."""
+        n = tfidf_matrix.shape[0]
+        rng = np.random.default_rng(42)
+        listes = min(n, self.listes or max(1, int(2 * math.sqrt(n))))
+        taille = min(n, max(self.echantillon_apprentissage, 20 * listes))
+        apprentissage = np.sort(rng.choice(n, taille, replace=False))
+
+        # La SVD ne voit que les colonnes non vides (utile avec un espace haché de 2^n colonnes).
+        utiles = np.flatnonzero(np.bincount(tfidf_matrix.indices, minlength=tfidf_matrix.shape[1]))
+        n_comp = max(1, min(self.composantes, len(utiles) - 1, taille - 1))
+        svd = TruncatedSVD(n_components=n_comp, random_state=42)
+        svd.fit(tfidf_matrix[apprentissage][:, utiles])
+        projection = np.empty((n, n_comp), dtype=np.float32)
+        for debut in range(0, n, tranche):
+            lot = tfidf_matrix[debut:debut + tranche][:, utiles]
+            projection[debut:debut + tranche] = normalize(svd.transform(lot))
+
+        kmeans = MiniBatchKMeans(n_clusters=listes, random_state=42, n_init=1, batch_size=4096)
+        kmeans.fit(projection[apprentissage])
+        centres = normalize(kmeans.cluster_centers_).astype(np.float32)
+
+        nprobe = min(self.nprobe, listes)
+        sondes = np.empty((n, nprobe), dtype=np.int64)
+        for debut in range(0, n, tranche):
+            proximite = projection[debut:debut + tranche] @ centres.T
+            if nprobe < listes:
+                meilleures = np.argpartition(-proximite, nprobe - 1, axis=1)[:, :nprobe]
+            else:
+                meilleures = np.broadcast_to(np.arange(listes), proximite.shape)
+            rang = np.argsort(-np.take_along_axis(proximite, meilleures, axis=1), axis=1, kind="stable")
+            sondes[debut:debut + tranche] = np.take_along_axis(meilleures, rang, axis=1)
+
+        affectation = sondes[:, 0]
+        self.n_listes = listes
+        self.sondes = sondes
+        self.membres = np.argsort(affectation, kind="stable")
+        self.debuts = np.concatenate([[0], np.cumsum(np.bincount(affectation, minlength=listes))])
+
+    def voisins(self, tfidf_matrix, top_k, seuil, taille_bloc=1024, memoire_max_mo=512):
+        """Équivalent approché de calculer_voisins_topk : matrice CSR N x N."""
+        n = tfidf_matrix.shape[0]
+        k = max(0, min(top_k, n - 1))
+        if k == 0:
+            return sparse.csr_matrix((n, n))
+        debut_total = time.perf_counter()
+        self.construire(tfidf_matrix)
+        duree_index = time.perf_counter() - debut_total
+
+        # Cellule par cellule : les pages qui la sondent contre ses membres.
+        # Les candidats (k par page et par cellule) sont réduits aux k meilleurs
+        # par page dès qu'ils dépassent 4 x N x k, pour rester en O(N x k).
+        nprobe = self.sondes.shape[1]
+        requetes = np.argsort(self.sondes.ravel(), kind="stable") // nprobe
+        debuts_requetes = np.concatenate(
+            [[0], np.cumsum(np.bincount(self.sondes.ravel(), minlength=self.n_listes))]
+        )
+        taille_max = max(1, int(np.diff(self.debuts).max()))
+        bloc = taille_bloc_similarite(taille_max, taille_bloc, memoire_max_mo)
+        candidats, nb_candidats, nb_comparaisons = [], 0, 0
+        for c in range(self.n_listes):
+            membres = self.membres[self.debuts[c]:self.debuts[c + 1]]
+            if not len(membres):
+                continue
+            for debut in range(debuts_requetes[c], debuts_requetes[c + 1], bloc):
+                lot = requetes[debut:min(debut + bloc, debuts_requetes[c + 1])]
+                sim = similarite_bloc(tfidf_matrix, lot, membres)
+                candidats.append(selectionner_topk(sim, lot, k, seuil, membres))
+                nb_candidats += len(candidats[-1][0])
+                nb_comparaisons += sim.size
+                del sim
+            if nb_candidats > 4 * n * k:
+                candidats = [garder_topk(*(np.concatenate(x) for x in zip(*candidats)), k)]
+                nb_candidats = len(candidats[0][0])
+        if candidats:
+            lignes, colonnes, scores = garder_topk(*(np.concatenate(x) for x in zip(*candidats)), k)
+        else:
+            lignes = colonnes = np.empty(0, dtype=np.int64)
+            scores = np.empty(0, dtype=np.float64)
+        voisins = sparse.csr_matrix((scores, (lignes, colonnes)), shape=(n, n))
+        duree = time.perf_counter() - debut_total
+        print(
+            f"  ANN : {self.n_listes} listes, nprobe {self.sondes.shape[1]}, "
+            f"{nb_comparaisons / n:.0f} candidats par page, {duree:.1f}s (index {duree_index:.1f}s)"
+        )
+
+        if self.echantillon_rappel > 0:
+            echantillon = np.sort(np.random.default_rng(0).choice(n, min(n, self.echantillon_rappel), replace=False))
+            debut = time.perf_counter()
+            l, c, _ = voisins_lignes(
+                tfidf_matrix, echantillon, k, seuil,
+                taille_bloc_similarite(n, taille_bloc, memoire_max_mo)
+            )
+            duree_exacte = (time.perf_counter() - debut) * n / len(echantillon)
+            approche = voisins[echantillon].tocoo()
+            trouves = np.isin(l * n + c, echantillon[approche.row] * n + approche.col)
+            self.rappel = float(trouves.mean()) if len(trouves) else 1.0
+            print(
+                f"  ANN : rappel@{k} {self.rappel:.3f} sur {len(echantillon)} pages "
+                f"(recherche exacte estimee a {duree_exacte:.1f}s)"
+            )
+        return voisins
+
+
+def filtrer_voisins(voisins, seuil):
+    """Retire les voisins de score < seuil."""
+    coo = voisins.tocoo()
+    garde = coo.data >= seuil
+    return sparse.csr_matrix(
+        (coo.data[garde], (coo.row[garde], coo.col[garde])), shape=voisins.shape
+    )
+
+
+def garder_topk(lignes, colonnes, scores, k):
+    """Garde les k meilleurs candidats (ligne, colonne, score) de chaque ligne.
+    Les doublons (ligne, colonne) doivent déjà être absents.
+    """
+    ordre = np.lexsort((colonnes, -scores, lignes))
+    lignes, colonnes, scores = lignes[ordre], colonnes[ordre], scores[ordre]
+    rang = np.arange(len(lignes)) - np.searchsorted(lignes, lignes, side="left")
+    garde = rang < k
+    return lignes[garde], colonnes[garde], scores[garde]
+
+
+def assembler_voisins(lignes, colonnes, scores, n, k):
+    """Construit la matrice CSR des k meilleurs candidats (ligne, colonne, score) par ligne."""
+    lignes, colonnes, scores = garder_topk(lignes, colonnes, scores, k)
+    return sparse.csr_matrix((scores, (lignes, colonnes)), shape=(n, n))
+
+
+def selectionner_recommandations(voisins, max_reco):
+    """Sélectionne en un seul passage les max_reco meilleurs voisins de chaque page.
+    Retourne (sources, cibles, scores) dans l'ordre de génération : page source
+    croissante, puis score décroissant, puis indice cible croissant.
+    """
+    coo = voisins.tocoo()
+    sources, cibles, scores = coo.row, coo.col, coo.data
+    ordre = np.lexsort((cibles, -scores, sources))
+    sources, cibles, scores = sources[ordre], cibles[ordre], scores[ordre]
+    rang = np.arange(len(sources)) - np.searchsorted(sources, sources, side="left")
+    garde = rang < max_reco
+    return sources[garde], cibles[garde], scores[garde]
+
+
+def construire_corpus(pages_data, urls, poids=None):
+    """Retourne (corpus, urls_valides) : textes pondérés non vides et leurs URLs.
+    Avec poids (pondération par champs), chaque document est le tuple de
+    construire_champs au lieu du texte répété.
+    """
+    corpus = []
+    urls_valides = []
+    for url in urls:
+        data = pages_data.get(url, {})
+        if poids:
+            document = construire_champs(data)
+            valide = any(champ.strip() for champ in document)
+        else:
+            document = construire_texte_pondere(data)
+            valide = document.strip()
+        if valide:
+            corpus.append(document)
+            urls_valides.append(url)
+
+    if len(corpus) < 2:
+        print("Erreur : moins de 2 pages avec du contenu. Impossible de calculer la similarite.")
+        sys.exit(1)
+    return corpus, urls_valides
+
+
+def creer_vectorizer():
+    """TfidfVectorizer utilisé pour toutes les analyses."""
+    return TfidfVectorizer(
+        max_features=10000,
+        ngram_range=(1, 2),
+        sublinear_tf=True,
+        strip_accents="unicode",
+        stop_words=list(FRENCH_STOP_WORDS),
+        min_df=1,
+        max_df=0.95,
+    )
+
+
+TRANCHE_DOCUMENTS_CHAMPS = 2000  # documents combinés à la fois par VectoriseurChamps
+TRANCHE_COEFFICIENTS = 1 << 20  # coefficients indexés à la fois (index convertis en intp)
+
+
+class VectoriseurChamps:
+    """TF-IDF pondéré par champ, sans dupliquer les textes.
+    Chaque champ (title, h1, meta, body) est tokenisé une seule fois ; le tf
+    sous-linéaire (1 + log) est pris par champ, puis les champs sont sommés
+    avec leurs poids. Un poids agit donc linéairement sur le vecteur, alors
+    que la répétition d'un champ n'ajoute que log(répétitions) après sublinear_tf.
+    Les champs sont ajoutés à la somme un à un, par tranches de documents :
+    aucune matrice de comptes par champ n'est gardée pour tout le corpus.
+    IDF lissé et max_df comme creer_vectorizer. max_features garde les termes
+    de plus forte somme des tf pondérés, alors que TfidfVectorizer classe sur
+    les occurrences brutes du texte répété : au-delà de max_features termes,
+    le vocabulaire retenu peut différer.
+    Les documents sont des tuples de construire_champs ; l'interface utilisée
+    ailleurs (transform, vocabulary_, build_analyzer...) est celle de TfidfVectorizer.
+    """
+
+    def __init__(self, poids, max_features=10000, max_df=0.95):
+        self.poids = dict(poids)
+        self.max_features = max_features
+        self.max_df = max_df
+        self.compteur = CountVectorizer(
+            ngram_range=(1, 2),
+            strip_accents="unicode",
+            stop_words=list(FRENCH_STOP_WORDS),
+        )
+        self.stats = {}
+
+    def build_analyzer(self):
+        analyseur = self.compteur.build_analyzer()
+        return lambda champs: [terme for texte in champs for terme in analyseur(texte)]
+
+    def get_feature_names_out(self):
+        return self.feature_names_
+
+    def _compter(self, textes, vocabulaire, ajuster):
+        """Occurrences des termes de chaque texte (une ligne par texte).
+        Avec ajuster, les termes inconnus sont ajoutés à vocabulaire ; sinon ignorés.
+        """
+        analyseur = self.compteur.build_analyzer()
+        indices, valeurs, indptr = array("i"), array("i"), array("q", [0])
+        for texte in textes:
+            occurrences = {}
+            for terme in analyseur(texte):
+                colonne = vocabulaire.get(terme)
+                if colonne is None:
+                    if not ajuster:
+                        continue
+                    colonne = vocabulaire[terme] = len(vocabulaire)
+                occurrences[colonne] = occurrences.get(colonne, 0) + 1
+            indices.extend(occurrences)
+            valeurs.extend(occurrences.values())
+            indptr.append(len(indices))
+        comptes = sparse.csr_matrix(
+            (np.frombuffer(valeurs, dtype=np.intc).astype(np.float64), np.frombuffer(indices, dtype=np.intc),
+             np.frombuffer(indptr, dtype=np.int64)),
+            shape=(len(textes), len(vocabulaire)),
+        )
+        comptes.sort_indices()
+        return comptes
+
+    def _combiner(self, documents, vocabulaire, ajuster=False):
+        """Somme pondérée des tf sous-linéaires des champs, par tranches de documents.
+        Dans une tranche, chaque champ est compté puis ajouté à la somme avant le
+        suivant : seules les lignes de la tranche existent à côté du résultat.
+        """
+        donnees, indices, indptr = array("d"), array("i"), array("q", [0])
+        stats = dict.fromkeys(("ngrammes", "ngrammes_repetition", "caracteres", "caracteres_repetition"), 0)
+        for debut in range(0, len(documents), TRANCHE_DOCUMENTS_CHAMPS):
+            tranche = documents[debut:debut + TRANCHE_DOCUMENTS_CHAMPS]
+            x = sparse.csr_matrix((len(tranche), 0))
+            for f, champ in enumerate(CHAMPS_TEXTE):
+                comptes = self._compter([champs[f] for champs in tranche], vocabulaire, ajuster)
+                ngrammes = int(comptes.data.sum())
+                caracteres = sum(len(champs[f]) for champs in tranche)
+                stats["ngrammes"] += ngrammes
+                stats["ngrammes_repetition"] += ngrammes * POIDS_CHAMPS[champ]
+                stats["caracteres"] += caracteres
+                stats["caracteres_repetition"] += caracteres * POIDS_CHAMPS[champ]
+                np.log(comptes.data, out=comptes.data)
+                comptes.data += 1
+                comptes.data *= float(self.poids[champ])
+                x.resize(comptes.shape)
+                x = x + comptes
+            x.eliminate_zeros()
+            donnees.frombytes(x.data.tobytes())
+            indices.frombytes(x.indices.astype(np.intc).tobytes())
+            indptr.frombytes((x.indptr[1:] + indptr[-1]).astype(np.int64).tobytes())
+        if ajuster:
+            # Volume évité par rapport à la répétition des champs.
+            self.stats = stats
+        return sparse.csr_matrix(
+            (np.frombuffer(donnees), np.frombuffer(indices, dtype=np.intc), np.frombuffer(indptr, dtype=np.int64)),
+            shape=(len(documents), len(vocabulaire)),
+        )
+
+    def _ponderer(self, x):
+        for debut in range(0, x.nnz, TRANCHE_COEFFICIENTS):
+            tranche = slice(debut, debut + TRANCHE_COEFFICIENTS)
+            x.data[tranche] *= self.idf_.take(x.indices[tranche])
+        return normalize(x, copy=False)
+
+    def fit_transform(self, documents):
+        n = len(documents)
+        vocabulaire = {}
+        x = self._combiner(documents, vocabulaire, ajuster=True)
+        if not vocabulaire:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+        # Termes dans l'ordre alphabétique, comme CountVectorizer : ordre[i] est
+        # la colonne de x du i-ème terme.
+        termes = np.fromiter(vocabulaire, dtype=object, count=len(vocabulaire))
+        del vocabulaire
+        ordre = np.argsort(termes, kind="stable")
+        df = np.zeros(x.shape[1], dtype=np.int64)
+        for debut in range(0, x.nnz, TRANCHE_COEFFICIENTS):
+            df += np.bincount(x.indices[debut:debut + TRANCHE_COEFFICIENTS], minlength=x.shape[1])
+        df = df[ordre]
+
+        # Filtrage du vocabulaire (max_df, max_features) comme TfidfVectorizer.
+        garde = df <= self.max_df * n
+        if self.max_features is not None and garde.sum() > self.max_features:
+            poids_termes = np.asarray(x.sum(axis=0)).ravel()[ordre]
+            candidats = np.flatnonzero(garde)
+            meilleurs = candidats[np.argsort(-poids_termes[candidats], kind="stable")[:self.max_features]]
+            garde = np.zeros_like(garde)
+            garde[meilleurs] = True
+        colonnes = np.flatnonzero(garde)
+        self.feature_names_ = termes[ordre[colonnes]]
+        self.vocabulary_ = {terme: i for i, terme in enumerate(self.feature_names_)}
+        self.idf_ = np.log((1 + n) / (1 + df[colonnes])) + 1
+
+        # Colonnes écartées annulées puis retirées, sans copie de la matrice.
+        nouvelle = np.full(x.shape[1], -1, dtype=x.indices.dtype)
+        nouvelle[ordre[colonnes]] = np.arange(len(colonnes), dtype=nouvelle.dtype)
+        for debut in range(0, x.nnz, TRANCHE_COEFFICIENTS):
+            tranche = slice(debut, debut + TRANCHE_COEFFICIENTS)
+            x.indices[tranche] = nouvelle.take(x.indices[tranche])
+        x.data[x.indices < 0] = 0
+        x.eliminate_zeros()
+        x = sparse.csr_matrix((x.data, x.indices, x.indptr), shape=(n, len(colonnes)), copy=False)
+        x.has_sorted_indices = False
+        x.sort_indices()
+        return self._ponderer(x)
+
+    def transform(self, documents):
+        return self._ponderer(self._combiner(documents, self.vocabulary_))
+
+
+class NomsTermesHaches:
+    """Noms des colonnes d'un VectoriseurFlux, retrouvés à la demande.
+    Le hachage n'a pas de vocabulaire : pour nommer une colonne, les textes
+    sont ré-analysés un à un jusqu'à rencontrer un terme qui y tombe.
+    Seuls quelques indices sont demandés (libellés de clusters).
+    """
+
+    def __init__(self, vectoriseur, textes):
+        self.vectoriseur = vectoriseur
+        self._textes = iter(textes)
+        self._connus = {}
+
+    def __getitem__(self, indice):
+        analyseur = self.vectoriseur.build_analyzer()
+        while indice not in self._connus:
+            texte = next(self._textes, None)
+            if texte is None:
+                return f"#{indice}"
+            for terme in analyseur(texte):
+                self._connus.setdefault(self.vectoriseur.indice_terme(terme), terme)
+        return self._connus[indice]
+
+
+class VectoriseurFlux:
+    """Vectorisation TF-IDF en flux, sans corpus en mémoire.
+    Les pages sont hachées (HashingVectorizer, sans état) dès leur arrivée,
+    par lots de taille_lot ; les fréquences documentaires sont cumulées en
+    ligne et les lignes brutes (tf sous-linéaire) ajoutées à des fichiers
+    sur disque. finaliser() applique l'IDF, normalise et renvoie une matrice
+    CSR projetée depuis le disque (np.memmap).
+    """
+
+    TRANCHE = 1 << 22
+
+    def __init__(self, n_bits=18, dossier=None, taille_lot=256, max_df=0.95):
+        self.n_features = 2 ** n_bits
+        self.max_df = max_df
+        self.taille_lot = taille_lot
+        self.hasher = HashingVectorizer(
+            n_features=self.n_features,
+            ngram_range=(1, 2),
+            strip_accents="unicode",
+            stop_words=list(FRENCH_STOP_WORDS),
+            alternate_sign=False,
+            norm=None,
+        )
+        self._temporaire = None
+        if dossier is None:
+            self._temporaire = tempfile.TemporaryDirectory(prefix="maillage_flux_")
+            dossier = self._temporaire.name
+        os.makedirs(dossier, exist_ok=True)
+        self.dossier = dossier
+        self._f_indices = open(os.path.join(dossier, "indices.brut"), "wb")
+        self._f_donnees = open(os.path.join(dossier, "donnees.brut"), "wb")
+        self.df = np.zeros(self.n_features, dtype=np.int64)
+        self.urls = []
+        self.longueurs = []
+        self._vues = set()
+        self._lot = []
+        self.textes = ()
+
+    def __contains__(self, url):
+        return url in self._vues
+
+    def build_analyzer(self):
+        return self.hasher.build_analyzer()
+
+    def indice_terme(self, terme):
+        """Colonne d'un terme, comme FeatureHasher (murmurhash3 signé, valeur absolue)."""
+        return abs(murmurhash3_32(terme, seed=0)) % self.n_features
+
+    def get_feature_names_out(self):
+        return NomsTermesHaches(self, self.textes)
+
+    def ajouter(self, url, texte):
+        """Ajoute une page ; ignorée si son texte pondéré est vide ou déjà vue."""
+        if url in self._vues or not texte.strip():
+            return
+        self._vues.add(url)
+        self._lot.append((url, texte))
+        if len(self._lot) >= self.taille_lot:
+            self._vider()
+
+    def _vider(self):
+        if not self._lot:
+            return
+        urls, textes = zip(*self._lot)
+        self._lot = []
+        x = self.hasher.transform(textes).tocsr()
+        x.sum_duplicates()
+        np.log(x.data, out=x.data)
+        x.data += 1
+        self.df += np.bincount(x.indices, minlength=self.n_features)
+        x.indices.astype(np.int32).tofile(self._f_indices)
+        x.data.astype(np.float64).tofile(self._f_donnees)
+        self.longueurs.extend(np.diff(x.indptr).tolist())
+        self.urls.extend(urls)
+
+    def _memmap(self, nom, dtype, mode, taille):
+        chemin = os.path.join(self.dossier, nom)
+        if taille == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(chemin, dtype=dtype, mode=mode, shape=(taille,))
+
+    def finaliser(self, urls_ordre):
+        """Applique l'IDF et la norme L2, puis range les lignes dans l'ordre de urls_ordre.
+        Retourne (urls_valides, tfidf_matrix).
+        """
+        self._vider()
+        self._f_indices.close()
+        self._f_donnees.close()
+
+        n = len(self.urls)
+        longueurs = np.asarray(self.longueurs, dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(longueurs)])
+        nnz = int(indptr[-1])
+        indices = self._memmap("indices.brut", np.int32, "r", nnz)
+        donnees = self._memmap("donnees.brut", np.float64, "r+", nnz)
+
+        position = {u: i for i, u in enumerate(self.urls)}
+        ordre = np.asarray([position[u] for u in urls_ordre if u in position], dtype=np.int64)
+        urls_valides = [self.urls[i] for i in ordre]
+
+        # IDF lissé comme TfidfVectorizer, sur les seules pages analysées (les
+        # pages hachées puis écartées, ex. membres de quasi-doublons, ne
+        # comptent pas) ; les termes au-delà de max_df sont annulés.
+        df = self.df
+        if len(ordre) < n:
+            retenues = np.zeros(n, dtype=bool)
+            retenues[ordre] = True
+            df = np.zeros(self.n_features, dtype=np.int64)
+            for debut in range(0, nnz, self.TRANCHE):
+                fin = min(debut + self.TRANCHE, nnz)
+                lignes = np.searchsorted(indptr, np.arange(debut, fin), side="right") - 1
+                df += np.bincount(indices[debut:fin][retenues[lignes]], minlength=self.n_features)
+        n_docs = len(ordre)
+        idf = np.log((1 + n_docs) / (1 + df)) + 1
+        idf[df > self.max_df * n_docs] = 0
+        normes = np.zeros(n)
+        for debut in range(0, nnz, self.TRANCHE):
+            fin = min(debut + self.TRANCHE, nnz)
+            tranche = donnees[debut:fin]
+            tranche *= idf[indices[debut:fin]]
+            lignes = np.searchsorted(indptr, np.arange(debut, fin), side="right") - 1
+            normes += np.bincount(lignes, weights=tranche ** 2, minlength=n)
+        normes = np.sqrt(normes)
+        normes[normes == 0] = 1
+
+        longueurs_finales = longueurs[ordre]
+        indptr_final = np.concatenate([[0], np.cumsum(longueurs_finales)])
+        idx_dtype = np.int32 if nnz < 2 ** 31 else np.int64
+        indices_final = self._memmap("indices.csr", idx_dtype, "w+", nnz)
+        donnees_final = self._memmap("donnees.csr", np.float64, "w+", nnz)
+
+        # Copie par paquets de lignes, dans l'ordre cible.
+        pas = max(1, self.TRANCHE // max(1, int(longueurs.mean()) if n else 1))
+        for debut in range(0, len(ordre), pas):
+            lot = ordre[debut:debut + pas]
+            tailles = longueurs[lot]
+            total = int(tailles.sum())
+            if total == 0:
+                continue
+            decalages = np.cumsum(tailles) - tailles
+            source = np.repeat(indptr[lot] - decalages, tailles) + np.arange(total)
+            a, b = indptr_final[debut], indptr_final[debut] + total
+            indices_final[a:b] = indices[source]
+            donnees_final[a:b] = donnees[source] / np.repeat(normes[lot], tailles)
+
+        tfidf_matrix = sparse.csr_matrix(
+            (donnees_final, indices_final, indptr_final.astype(idx_dtype)),
+            shape=(len(urls_valides), self.n_features),
+        )
+        return urls_valides, tfidf_matrix
+
+
+def rechercher_voisins(
+    tfidf_matrix, top_k, seuil, taille_bloc=1024, memoire_max_mo=512, ann=None
+):
+    """Top-k voisins de chaque page : recherche exacte par blocs, ou approchée avec un IndexANN."""
+    if ann is not None:
+        print(f"Calcul approche des {top_k} plus proches voisins (index IVF)...")
+        return ann.voisins(tfidf_matrix, top_k, seuil, taille_bloc, memoire_max_mo)
+    bloc = taille_bloc_similarite(tfidf_matrix.shape[0], taille_bloc, memoire_max_mo)
+    print(f"Calcul des {top_k} plus proches voisins (blocs de {bloc} pages)...")
+    return calculer_voisins_topk(tfidf_matrix, top_k, seuil, taille_bloc, memoire_max_mo)
+
+
+def calculer_similarite_flux(
+    flux, pages_data, urls, top_k, seuil, taille_bloc=1024, memoire_max_mo=512, ann=None
+):
+    """Variante de calculer_similarite pour des pages déjà passées dans un VectoriseurFlux."""
+    for url in urls:
+        if url not in flux:
+            flux.ajouter(url, construire_texte_pondere(pages_data.get(url, {})))
+    urls_valides, tfidf_matrix = flux.finaliser(urls)
+    if len(urls_valides) < 2:
+        print("Erreur : moins de 2 pages avec du contenu. Impossible de calculer la similarite.")
+        sys.exit(1)
+    flux.textes = (construire_texte_pondere(pages_data[u]) for u in urls_valides)
+    print(
+        f"\nTF-IDF en flux sur {len(urls_valides)} pages "
+        f"({flux.n_features} colonnes hachees, {tfidf_matrix.nnz} valeurs sur disque)..."
+    )
+
+    voisins = rechercher_voisins(tfidf_matrix, top_k, seuil, taille_bloc, memoire_max_mo, ann)
+    return voisins, urls_valides, flux, tfidf_matrix
+
+
+def calculer_similarite(
+    pages_data, urls, top_k, seuil, taille_bloc=1024, memoire_max_mo=512, poids=None, ann=None
+):
+    """Calcule la matrice TF-IDF puis les top-k voisins cosinus de chaque page.
+    poids : {champ: poids} pour la pondération par champs (VectoriseurChamps) ;
+    None garde le texte répété de construire_texte_pondere.
+    ann : IndexANN pour une recherche approchée des voisins (None = exacte).
+    """
+    urls_valides, vectorizer, tfidf_matrix = vectoriser_corpus(pages_data, urls, poids)
+    voisins = rechercher_voisins(tfidf_matrix, top_k, seuil, taille_bloc, memoire_max_mo, ann)
+    return voisins, urls_valides, vectorizer, tfidf_matrix
+
+
+def _calculer_similarite_capturee(*arguments):
+    """calculer_similarite dans un processus du pool de calcul : retourne
+    (résultat, sortie console, code de sys.exit ou None)."""
+    sortie = io.StringIO()
+    with redirect_stdout(sortie):
+        try:
+            return calculer_similarite(*arguments), sortie.getvalue(), None
+        except SystemExit as e:
+            return None, sortie.getvalue(), e.code
+
+
+def calculer_similarite_pool(pool, pages_data, urls, *options):
+    """calculer_similarite exécutée dans un ProcessPoolExecutor partagé (mode batch).
+    Seuls les champs texte des pages sont envoyés au processus ; sa sortie
+    console est réécrite ici, dans le journal du site.
+    """
+    textes = {u: {c: pages_data[u].get(c, "") for c in CHAMPS_TEXTE} for u in urls if u in pages_data}
+    resultat, sortie, code = pool.submit(_calculer_similarite_capturee, textes, urls, *options).result()
+    print(sortie, end="")
+    if resultat is None:
+        sys.exit(code)
+    return resultat
+
+
+def vectoriser_corpus(pages_data, urls, poids=None):
+    """Ajuste le vectorizer sur les pages ; retourne (urls_valides, vectorizer, tfidf_matrix)."""
+    corpus, urls_valides = construire_corpus(pages_data, urls, poids)
+
+    print(f"\nCalcul TF-IDF sur {len(corpus)} pages...")
+
+    debut = time.perf_counter()
+    vectorizer = VectoriseurChamps(poids) if poids else creer_vectorizer()
+    tfidf_matrix = vectorizer.fit_transform(corpus)
+    if poids:
+        stats = vectorizer.stats
+        print(
+            f"  Ponderation par champs en {time.perf_counter() - debut:.1f}s : "
+            f"{stats['ngrammes']} n-grammes analyses au lieu de {stats['ngrammes_repetition']} par repetition "
+            f"(-{1 - stats['ngrammes'] / max(stats['ngrammes_repetition'], 1):.0%}), "
+            f"{stats['caracteres'] / 1e6:.1f} Mo de texte au lieu de {stats['caracteres_repetition'] / 1e6:.1f} Mo."
+        )
+    return urls_valides, vectorizer, tfidf_matrix
+
+
+# ─── Clustering ──────────────────────────────────────────────────────────────
+
+MOTEURS_CLUSTERING = ("kmeans", "minibatch", "svd")
+
+
+def libelles_centroides_creux(tfidf_matrix, labels, n_clusters, feature_names, n_termes=5):
+    """Libellés de clusters à partir des centroïdes creux (somme des vecteurs membres).
+    Le produit indicatrice x TF-IDF reste creux : aucun centroïde dense k x F.
+    """
+    n_pages = tfidf_matrix.shape[0]
+    indicatrice = sparse.csr_matrix(
+        (np.ones(n_pages), (labels, np.arange(n_pages))), shape=(n_clusters, n_pages)
+    )
+    centroides = (indicatrice @ tfidf_matrix).tocsr()
+    cluster_labels = {}
+    for i in range(n_clusters):
+        debut, fin = centroides.indptr[i], centroides.indptr[i + 1]
+        poids = centroides.data[debut:fin]
+        top_indices = centroides.indices[debut:fin][np.argsort(-poids, kind="stable")[:n_termes]]
+        cluster_labels[i] = " / ".join(feature_names[idx] for idx in top_indices)
+    return cluster_labels
+
+
+def clustering_pages(
+    tfidf_matrix, urls_valides, vectorizer, n_clusters=None,
+    moteur="kmeans", taille_batch=1024, n_init=10, svd_composantes=100,
+    echantillon_qualite=0
+):
+    """Clustering des pages avec labels auto.
+    moteur : "kmeans" (KMeans complet sur la matrice TF-IDF), "minibatch"
+    (MiniBatchKMeans par lots de taille_batch) ou "svd" (KMeans sur une
+    projection TruncatedSVD normalisée de svd_composantes dimensions).
+    n_init : nombre de redémarrages. La durée et l'inertie sont affichées ;
+    avec echantillon_qualite > 0, la silhouette cosinus sur un échantillon de
+    ce nombre de pages aussi (coût quadratique en la taille de l'échantillon).
+    Retourne (page_clusters, cluster_labels, modele) ; modele = (svd, kmeans)
+    permet d'affecter de nouvelles pages (voir predire_clusters).
+    """
+    n_pages = len(urls_valides)
+    if n_clusters is None:
+        n_clusters = max(2, int(math.sqrt(n_pages / 2)))
+    n_clusters = min(n_clusters, n_pages)
+
+    print(f"Clustering en {n_clusters} clusters (moteur {moteur})...")
+    debut = time.perf_counter()
+
+    feature_names = vectorizer.get_feature_names_out()
+    svd = None
+    if moteur == "kmeans":
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=n_init)
+        labels = kmeans.fit_predict(tfidf_matrix)
+
+        cluster_labels = {}
+        for i in range(n_clusters):
+            center = kmeans.cluster_centers_[i]
+            top_indices = center.argsort()[-5:][::-1]
+            top_terms = [feature_names[idx] for idx in top_indices]
+            cluster_labels[i] = " / ".join(top_terms)
+    else:
+        donnees = tfidf_matrix
+        if moteur == "svd" and tfidf_matrix.shape[1] <= 2:
+            # TruncatedSVD exige moins de composantes que de colonnes : sans
+            # projection possible, KMeans directement sur la matrice TF-IDF.
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=n_init)
+        elif moteur == "svd":
+            n_comp = max(1, min(svd_composantes, tfidf_matrix.shape[1] - 1, n_pages - 1))
+            svd = TruncatedSVD(n_components=n_comp, random_state=42)
+            donnees = normalize(svd.fit_transform(tfidf_matrix))
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=n_init)
+        else:
+            kmeans = MiniBatchKMeans(
+                n_clusters=n_clusters, random_state=42, n_init=n_init,
+                batch_size=taille_batch,
+            )
+        labels = kmeans.fit_predict(donnees)
+        cluster_labels = libelles_centroides_creux(tfidf_matrix, labels, n_clusters, feature_names)
+
+    duree = time.perf_counter() - debut
+    silhouette = None
+    if echantillon_qualite > 0 and len(set(labels)) > 1:
+        try:
+            silhouette = silhouette_score(
+                tfidf_matrix, labels, metric="cosine",
+                sample_size=min(echantillon_qualite, n_pages), random_state=42,
+            )
+        except ValueError:
+            pass
+    espace = " (espace SVD)" if svd is not None else ""
+    qualite = ""
+    if echantillon_qualite > 0:
+        qualite = f", silhouette {silhouette:.3f} (echantillon)" if silhouette is not None else ", silhouette n/a"
+    print(f"  Clustering en {duree:.1f}s, inertie {kmeans.inertia_:.2f}{espace}{qualite}")
+
+    page_clusters = {}
+    for url, label in zip(urls_valides, labels):
+        page_clusters[url] = cluster_labels[label]
+
+    return page_clusters, cluster_labels, (svd, kmeans)
+
+
+def predire_clusters(modele, tfidf_matrix):
+    """Affecte des pages (vecteurs TF-IDF) aux clusters d'un modèle déjà entraîné."""
+    svd, kmeans = modele
+    donnees = normalize(svd.transform(tfidf_matrix)) if svd is not None else tfidf_matrix
+    return kmeans.predict(donnees)
+
+
+# ─── État d'analyse / mode incrémental ───────────────────────────────────────
+
+VERSION_ETAT = 2
+
+# Fichiers de données d'un état, nommés par génération (voir fichier_generation) ;
+# etat.json, remplacé en dernier, désigne la génération courante.
+FICHIERS_ETAT = ("vectorizer.pkl", "clustering.pkl", "tfidf.npz", "voisins.npz")
+# Idem pour l'index de service ; service.json, remplacé en dernier, nomme sa génération.
+FICHIERS_SERVICE = ("service_liens.npy",)
+
+
+def empreinte_texte(texte):
+    """Empreinte courte du texte pondéré d'une page, pour détecter les modifications.
+    Accepte aussi le tuple de champs de la pondération par champs.
+    """
+    if not isinstance(texte, str):
+        texte = "\x1f".join(texte)
+    return hashlib.blake2b(texte.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def taux_hors_vocabulaire(vectorizer, textes, echantillon=500):
+    """Part des termes (unigrammes et bigrammes) absents du vocabulaire du vectorizer."""
+    if not textes:
+        return 0.0
+    pas = max(1, len(textes) // echantillon)
+    analyseur = vectorizer.build_analyzer()
+    vocabulaire = vectorizer.vocabulary_
+    total = absents = 0
+    for texte in textes[::pas]:
+        termes = analyseur(texte)
+        total += len(termes)
+        absents += sum(1 for t in termes if t not in vocabulaire)
+    return absents / total if total else 0.0
+
+
+def fichier_generation(dossier, nom, generation):
+    """Chemin d'un fichier de données d'une génération : tfidf.npz -> tfidf-<generation>.npz."""
+    base, extension = os.path.splitext(nom)
+    return os.path.join(dossier, f"{base}-{generation}{extension}")
+
+
+def purger_generations(dossier, noms, generation):
+    """Supprime les fichiers `noms` des autres générations (et de l'ancien format sans génération).
+    Un lecteur encore sur une génération supprimée échoue à l'ouverture, sans mélange.
+    """
+    gardes = {os.path.basename(fichier_generation(dossier, nom, generation)) for nom in noms}
+    prefixes = [(nom, os.path.splitext(nom)) for nom in noms]
+    for fichier in os.listdir(dossier):
+        if fichier in gardes:
+            continue
+        if any(fichier == nom or (fichier.startswith(base + "-") and fichier.endswith(ext)) for nom, (base, ext) in prefixes):
+            try:
+                os.remove(os.path.join(dossier, fichier))
+            except OSError:
+                pass
+
+
+def sauvegarder_etat(
+    dossier, urls_valides, corpus, vectorizer, tfidf_matrix, voisins,
+    top_k, seuil, page_clusters, cluster_labels, modele_clusters, oov_reference=None
+):
+    """Écrit l'état d'analyse (vectorizer, vecteurs, voisins, clusters) dans un dossier.
+    Les fichiers de données portent un identifiant de génération neuf ; le
+    remplacement atomique d'etat.json, qui nomme cette génération, bascule
+    tout l'état d'un coup. Un arrêt en cours d'écriture laisse l'ancien état
+    intact, et un lecteur qui suit etat.json ne mélange jamais deux
+    générations. Les générations précédentes sont ensuite supprimées.
+    Retourne l'identifiant de génération.
+    """
+    os.makedirs(dossier, exist_ok=True)
+    generation = f"{time.time_ns():x}"
+    if oov_reference is None:
+        oov_reference = taux_hors_vocabulaire(vectorizer, corpus)
+    meta = {
+        "version": VERSION_ETAT,
+        "urls": list(urls_valides),
+        "empreintes": [empreinte_texte(t) for t in corpus],
+        "top_k": int(top_k),
+        "seuil": float(seuil),
+        "oov_reference": oov_reference,
+        "poids": getattr(vectorizer, "poids", None),
+        "page_clusters": page_clusters,
+        "cluster_labels": {str(k): v for k, v in cluster_labels.items()},
+        "date": time.time(),
+        "generation": generation,
+    }
+    fichiers = {
+        "vectorizer.pkl": lambda f: pickle.dump(vectorizer, f),
+        "clustering.pkl": lambda f: pickle.dump(modele_clusters, f),
+        "tfidf.npz": lambda f: sparse.save_npz(f, tfidf_matrix.tocsr()),
+        "voisins.npz": lambda f: sparse.save_npz(f, voisins.tocsr()),
+    }
+    for nom, ecrire in fichiers.items():
+        with open(fichier_generation(dossier, nom, generation), "wb") as f:
+            ecrire(f)
+    temporaire = os.path.join(dossier, "etat.json.tmp")
+    with open(temporaire, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(temporaire, os.path.join(dossier, "etat.json"))
+    purger_generations(dossier, FICHIERS_ETAT, generation)
+    print(f"Etat d'analyse sauvegarde dans {dossier}/")
+    return generation
+
+
+def sauvegarder_index_service(dossier, generation, urls, pages_data, liens_existants, n_mots_cles=20):
+    """Complète l'état avec ce dont le mode serveur a besoin sans recrawl :
+    title, H1 et mots-clés de chaque page de l'état, et liens existants entre
+    ces pages (codes source << 32 | cible dans la numérotation de l'état).
+    L'index porte la génération de l'état : le serveur refuse un couple
+    désynchronisé.
+    """
+    liens = liens_existants.codes_entre(urls)
+    pages = []
+    for url in urls:
+        data = pages_data.get(url, {})
+        mots_cles = extraire_mots_cles_page(data, n_mots_cles)
+        pages.append([data.get("title", "") or "", data.get("h1", "") or "", sorted(mots_cles)])
+    service = {"generation": generation, "pages": pages}
+    with open(fichier_generation(dossier, "service_liens.npy", generation), "wb") as f:
+        np.save(f, liens)
+    temporaire = os.path.join(dossier, "service.json.tmp")
+    with open(temporaire, "w", encoding="utf-8") as f:
+        json.dump(service, f, ensure_ascii=False)
+    os.replace(temporaire, os.path.join(dossier, "service.json"))
+    purger_generations(dossier, FICHIERS_SERVICE, generation)
+    print(f"Index de service : {len(urls)} pages, {len(liens)} liens existants.")
+
+
+def charger_etat(dossier):
+    """Charge un état d'analyse ; retourne None s'il est absent ou illisible."""
+    try:
+        with open(os.path.join(dossier, "etat.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION_ETAT:
+            return None
+        generation = meta["generation"]
+        with open(fichier_generation(dossier, "vectorizer.pkl", generation), "rb") as f:
+            meta["vectorizer"] = pickle.load(f)
+        with open(fichier_generation(dossier, "clustering.pkl", generation), "rb") as f:
+            meta["modele_clusters"] = pickle.load(f)
+        meta["tfidf"] = sparse.load_npz(fichier_generation(dossier, "tfidf.npz", generation)).tocsr()
+        meta["voisins"] = sparse.load_npz(fichier_generation(dossier, "voisins.npz", generation)).tocsr()
+        meta["cluster_labels"] = {int(k): v for k, v in meta["cluster_labels"].items()}
+        n = len(meta["urls"])
+        if meta["tfidf"].shape[0] != n or meta["voisins"].shape != (n, n) or len(meta["empreintes"]) != n:
+            raise ValueError(f"matrices de la generation {generation} incoherentes avec ses {n} URLs")
+        return meta
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+        print(f"Attention : etat d'analyse illisible ({e}).")
+        return None
+
+
+def analyser_incremental(
+    etat, pages_data, urls, top_k, seuil, taille_bloc=1024, memoire_max_mo=512, seuil_derive=0.05,
+    poids=None
+):
+    """Met à jour l'analyse précédente en ne recalculant que les pages modifiées.
+    Le vocabulaire et l'IDF de l'état sont conservés : seules les pages
+    nouvelles ou modifiées sont vectorisées. Les voisins sont recalculés pour
+    ces pages et pour celles dont la liste contenait une page modifiée ou
+    supprimée ; les autres listes sont seulement fusionnées avec les scores
+    des pages modifiées. Les pages modifiées sont affectées aux clusters existants.
+    Retourne None si un recalcul complet est nécessaire (paramètres
+    incompatibles ou dérive du vocabulaire > seuil_derive), sinon
+    (voisins, urls_valides, vectorizer, tfidf_matrix, page_clusters,
+    cluster_labels, modele_clusters, corpus).
+    """
+    if etat["top_k"] < top_k:
+        print(f"Incremental : {top_k} voisins demandes (max de --max-reco et --top-paires) "
+              f"mais {etat['top_k']} dans l'etat, recalcul complet.")
+        return None
+    if etat["seuil"] > seuil:
+        print(f"Incremental : --seuil {seuil} inferieur au seuil de l'etat ({etat['seuil']}), recalcul complet.")
+        return None
+    if etat.get("poids") != poids:
+        print("Incremental : ponderation differente de celle de l'etat, recalcul complet.")
+        return None
+
+    corpus, urls_valides = construire_corpus(pages_data, urls, poids)
+    empreintes = [empreinte_texte(t) for t in corpus]
+    anciens = {u: i for i, u in enumerate(etat["urls"])}
+    anciennes_empreintes = etat["empreintes"]
+
+    inchangees, anciens_idx, modifiees = [], [], []
+    for i, (url, emp) in enumerate(zip(urls_valides, empreintes)):
+        j = anciens.get(url)
+        if j is not None and anciennes_empreintes[j] == emp:
+            inchangees.append(i)
+            anciens_idx.append(j)
+        else:
+            modifiees.append(i)
+    courantes = set(urls_valides)
+    supprimees = sum(1 for u in etat["urls"] if u not in courantes)
+    print(
+        f"\nIncremental : {len(inchangees)} pages inchangees, {len(modifiees)} nouvelles ou modifiees, "
+        f"{supprimees} supprimees."
+    )
+
+    vectorizer = etat["vectorizer"]
+    if modifiees:
+        derive = taux_hors_vocabulaire(vectorizer, [corpus[i] for i in modifiees]) - etat["oov_reference"]
+        if derive > seuil_derive:
+            print(f"Incremental : derive du vocabulaire {derive:.1%} > {seuil_derive:.1%}, recalcul complet.")
+            return None
+        print(f"Incremental : derive du vocabulaire {max(derive, 0):.1%}.")
+
+    # Matrice TF-IDF : lignes reprises de l'état pour les pages inchangées.
+    n = len(urls_valides)
+    inchangees = np.asarray(inchangees, dtype=np.int64)
+    anciens_idx = np.asarray(anciens_idx, dtype=np.int64)
+    modifiees = np.asarray(modifiees, dtype=np.int64)
+    blocs = [etat["tfidf"][anciens_idx]]
+    if len(modifiees):
+        blocs.append(vectorizer.transform([corpus[i] for i in modifiees]))
+    position = np.empty(n, dtype=np.int64)
+    position[inchangees] = np.arange(len(inchangees))
+    position[modifiees] = len(inchangees) + np.arange(len(modifiees))
+    tfidf_matrix = sparse.vstack(blocs).tocsr()[position]
+
+    # Voisins : reprise des anciennes listes, renumérotées.
+    k = etat["top_k"]
+    seuil_etat = etat["seuil"]
+    bloc = taille_bloc_similarite(n, taille_bloc, memoire_max_mo)
+    nouvel_idx = np.full(len(etat["urls"]), -1, dtype=np.int64)
+    nouvel_idx[anciens_idx] = inchangees
+    ancien = etat["voisins"].tocoo()
+    lignes, colonnes = nouvel_idx[ancien.row], nouvel_idx[ancien.col]
+    touchees = np.unique(lignes[(lignes >= 0) & (colonnes < 0)])
+    a_recalculer = np.union1d(modifiees, touchees)
+    garde = (lignes >= 0) & (colonnes >= 0) & ~np.isin(lignes, a_recalculer)
+    lignes, colonnes, scores = lignes[garde], colonnes[garde], ancien.data[garde]
+
+    # Score minimal pour entrer dans une liste conservée (k-ième score ou seuil).
+    minimum = np.full(n, np.inf)
+    np.minimum.at(minimum, lignes, scores)
+    kieme = np.where(np.bincount(lignes, minlength=n) >= k, minimum, seuil_etat)
+    kieme[a_recalculer] = np.inf
+
+    candidats = [(lignes, colonnes, scores)]
+    candidats.append(voisins_lignes(tfidf_matrix, np.setdiff1d(touchees, modifiees), k, seuil_etat, bloc))
+    for debut in range(0, len(modifiees), bloc):
+        lot = modifiees[debut:debut + bloc]
+        sim = similarite_bloc(tfidf_matrix, lot)
+        # Un seul bloc sert aux deux sens : liste complète des pages modifiées,
+        # et entrée éventuelle de chaque page modifiée dans les listes conservées.
+        candidats.append(selectionner_topk(sim, lot, k, seuil_etat))
+        l_mod, cibles = np.nonzero(sim >= kieme[None, :])
+        candidats.append((cibles, lot[l_mod], sim[l_mod, cibles]))
+        del sim
+    voisins = assembler_voisins(
+        *(np.concatenate(c) for c in zip(*candidats)), n, k
+    )
+    print(f"Incremental : {len(a_recalculer)} listes de voisins recalculees, {n - len(a_recalculer)} fusionnees.")
+
+    # Clusters : les pages modifiées sont affectées au centroïde le plus proche.
+    cluster_labels = etat["cluster_labels"]
+    modele_clusters = etat["modele_clusters"]
+    anciens_clusters = etat["page_clusters"]
+    page_clusters = {urls_valides[i]: anciens_clusters[urls_valides[i]] for i in inchangees}
+    if len(modifiees):
+        for i, label in zip(modifiees, predire_clusters(modele_clusters, tfidf_matrix[modifiees])):
+            page_clusters[urls_valides[i]] = cluster_labels[int(label)]
+    page_clusters = {u: page_clusters[u] for u in urls_valides}
+
+    return (
+        voisins, urls_valides, vectorizer, tfidf_matrix,
+        page_clusters, cluster_labels, modele_clusters, corpus,
+    )
+
+
+# ─── Quasi-doublons ──────────────────────────────────────────────────────────
+
+SENTINELLE_MINHASH = 2 ** 63 - 1  # np.iinfo(np.int64).max
+TRANCHE_PAIRES_MINHASH = 65536  # paires candidates vérifiées à la fois (~130 Mo à 128 cases)
+LARGEUR_SEAU_MINHASH = 32  # voisines de seau LSH comparées à chaque page, par bande
+
+
+def signatures_minhash(textes, n_cases=128):
+    """Signatures MinHash à une permutation des shingles (3 mots) de chaque texte.
+    Chaque shingle est haché une fois ; son hachage choisit une case parmi
+    n_cases et la case garde le plus petit reste. Une case vide vaut
+    SENTINELLE_MINHASH. Coût O(nombre de shingles), indépendant de n_cases.
+    """
+    hasher = HashingVectorizer(
+        ngram_range=(3, 3), n_features=2 ** 30, norm=None, alternate_sign=False,
+        strip_accents="unicode",
+    )
+    shingles = hasher.transform(textes).tocsr()
+    lignes = np.repeat(np.arange(shingles.shape[0]), np.diff(shingles.indptr))
+    signatures = np.full((shingles.shape[0], n_cases), SENTINELLE_MINHASH, dtype=np.int64)
+    indices = shingles.indices.astype(np.int64)
+    np.minimum.at(signatures, (lignes, indices % n_cases), indices // n_cases)
+    return signatures
+
+
+def similarite_minhash(signatures, a, b):
+    """Jaccard estimé entre les paires (a[i], b[i]) : cases égales parmi les cases non vides."""
+    sa, sb = signatures[a], signatures[b]
+    vides = (sa == SENTINELLE_MINHASH) & (sb == SENTINELLE_MINHASH)
+    egales = ((sa == sb) & ~vides).sum(axis=1)
+    pleines = (~vides).sum(axis=1)
+    return np.where(pleines > 0, egales / np.maximum(pleines, 1), 0.0)
+
+
+def parametres_bandes(n_cases, seuil):
+    """Lignes par bande du LSH : la plus grande dont le seuil (1/b)^(1/r) reste
+    sous seuil - 0.1, pour que les vrais doublons soient presque tous candidats
+    (les faux positifs sont écartés par la vérification).
+    """
+    lignes = 1
+    for r in range(1, n_cases + 1):
+        if n_cases % r == 0 and (r / n_cases) ** (1 / r) <= seuil - 0.1:
+            lignes = r
+    return lignes
+
+
+def regrouper_quasi_doublons(pages_data, urls, seuil=0.9, n_cases=128):
+    """Regroupe les pages au texte quasi identique (facettes, pagination, tris...).
+    Signatures MinHash, LSH par bandes (paires de chaque seau, voir
+    LARGEUR_SEAU_MINHASH ; bandes vides ignorées), vérification du Jaccard
+    estimé >= seuil puis composantes connexes. Le représentant d'un groupe est
+    l'URL la plus courte (à égalité, la première de urls).
+    Retourne (representants, groupes) : representants dans l'ordre de urls,
+    groupes = {representant: [membres]} pour les groupes d'au moins 2 pages.
+    """
+    n = len(urls)
+    if n < 2:
+        return list(urls), {}
+    textes = [" ".join(construire_champs(pages_data.get(u, {}))) for u in urls]
+    signatures = signatures_minhash(textes, n_cases)
+    avec_shingles = (signatures != SENTINELLE_MINHASH).any(axis=1)
+
+    # Les pages aux signatures identiques (Jaccard estimé 1) sont reliées à la
+    # première d'entre elles ; le LSH ne porte que sur les signatures distinctes.
+    lignes = np.flatnonzero(avec_shingles)
+    distinctes, premieres, inverse = np.unique(
+        signatures[lignes], axis=0, return_index=True, return_inverse=True
+    )
+    inverse = inverse.ravel()
+    reps = lignes[premieres]
+    aretes_a, aretes_b = [reps[inverse]], [lignes]
+
+    m = len(distinctes)
+    r = parametres_bandes(n_cases, seuil)
+    rng = np.random.default_rng(42)
+    codes = []
+    for debut in range(0, n_cases, r):
+        bande = distinctes[:, debut:debut + r]
+        multiplicateurs = rng.integers(1, 2 ** 62, size=r, dtype=np.int64) | 1
+        with np.errstate(over="ignore"):
+            cles = (bande * multiplicateurs).sum(axis=1)
+        # Une bande entièrement vide ne dit rien du texte : ces pages (courtes)
+        # formeraient un seau commun sans rapport avec leur contenu.
+        candidates = np.flatnonzero((bande != SENTINELLE_MINHASH).any(axis=1))
+        # Ordre aléatoire (reproductible) dans chaque seau : d'une bande à
+        # l'autre, une page n'est pas comparée aux mêmes voisines.
+        ordre = candidates[np.lexsort((rng.permutation(len(candidates)), cles[candidates]))]
+        cles_triees = cles[ordre]
+        # Paires d'un même seau : chaque position est associée aux positions
+        # suivantes de son seau, au plus LARGEUR_SEAU_MINHASH (toutes les paires
+        # tant que le seau ne dépasse pas cette largeur + 1).
+        debut_seau = np.concatenate([[True], cles_triees[1:] != cles_triees[:-1]]) if len(ordre) else np.empty(0, bool)
+        fins = np.append(np.flatnonzero(debut_seau)[1:], len(ordre))[np.cumsum(debut_seau) - 1]
+        positions = np.arange(len(ordre))
+        nombres = np.minimum(fins - positions - 1, LARGEUR_SEAU_MINHASH)
+        decalages = np.arange(nombres.sum()) - np.repeat(np.cumsum(nombres) - nombres, nombres)
+        a = np.repeat(ordre, nombres)
+        b = ordre[np.repeat(positions + 1, nombres) + decalages]
+        codes.append(np.minimum(a, b) * m + np.maximum(a, b))
+    codes = np.unique(np.concatenate(codes))
+    for debut in range(0, len(codes), TRANCHE_PAIRES_MINHASH):
+        tranche = codes[debut:debut + TRANCHE_PAIRES_MINHASH]
+        a, b = tranche // m, tranche % m
+        garde = similarite_minhash(distinctes, a, b) >= seuil
+        aretes_a.append(reps[a[garde]])
+        aretes_b.append(reps[b[garde]])
+    a, b = np.concatenate(aretes_a), np.concatenate(aretes_b)
+    graphe = sparse.csr_matrix((np.ones(len(a)), (a, b)), shape=(n, n))
+    _, etiquettes = connected_components(graphe, directed=False)
+
+    longueurs = np.fromiter((len(u) for u in urls), dtype=np.int64, count=n)
+    ordre = np.lexsort((np.arange(n), longueurs, etiquettes))
+    premiers = np.concatenate([[True], etiquettes[ordre][1:] != etiquettes[ordre][:-1]])
+    representant = np.empty(n, dtype=np.int64)
+    representant[ordre] = ordre[np.flatnonzero(premiers)[np.cumsum(premiers) - 1]]
+
+    groupes = defaultdict(list)
+    for i in np.flatnonzero(representant != np.arange(n)):
+        groupes[urls[representant[i]]].append(urls[i])
+    representants = [u for i, u in enumerate(urls) if representant[i] == i]
+    return representants, dict(groupes)
+
+
+def representants_doublons(urls_valides, groupes):
+    """Membres des groupes de quasi-doublons, dans l'ordre où ils sont ajoutés
+    après urls_valides, et indice (dans urls_valides) du représentant de chacun.
+    """
+    position = {u: i for i, u in enumerate(urls_valides)}
+    membres, lignes_rep = [], []
+    for rep, liste in groupes.items():
+        if rep in position:
+            membres.extend(liste)
+            lignes_rep.extend([position[rep]] * len(liste))
+    return membres, np.asarray(lignes_rep, dtype=np.int64)
+
+
+def etendre_aux_doublons(voisins, urls_valides, groupes, page_clusters):
+    """Reporte l'analyse des représentants sur les membres de leur groupe.
+    Chaque membre reçoit la ligne de voisins (et le cluster) de son représentant ;
+    les membres sont ajoutés après urls_valides, dont les indices ne changent pas.
+    Retourne (voisins, urls, page_clusters) étendus ; voisins=None (préparation
+    des shards) n'étend que les URLs et les clusters.
+    """
+    membres, lignes_rep = representants_doublons(urls_valides, groupes)
+    n = len(urls_valides) + len(membres)
+    etendus = None
+    if voisins is not None:
+        copies = voisins.tocsr()[lignes_rep]
+        etendus = sparse.vstack([voisins.tocsr(), copies]).tocsr()
+        etendus = sparse.csr_matrix((etendus.data, etendus.indices, etendus.indptr), shape=(n, n))
+    page_clusters = dict(page_clusters)
+    for membre, i in zip(membres, lignes_rep):
+        page_clusters[membre] = page_clusters.get(urls_valides[i], "")
+    return etendus, list(urls_valides) + membres, page_clusters
+
+
+# ─── Détection liens existants ───────────────────────────────────────────────
+
+class GrapheLiens:
+    """Liens internes existants sous forme d'arêtes entières.
+    Chaque URL normalisée est internée une fois en identifiant ; une arête
+    est le code int64 (source << 32) | cible, gardé trié et unique pour des
+    tests d'appartenance vectorisés (np.searchsorted).
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.urls = []
+        self._codes = np.empty(0, dtype=np.int64)
+        self._en_attente = []
+
+    def interner(self, urls):
+        """Retourne les identifiants (int64) des URLs, en créant les manquants."""
+        ids = []
+        for url in urls:
+            i = self.ids.get(url)
+            if i is None:
+                i = self.ids[url] = len(self.urls)
+                self.urls.append(url)
+            ids.append(i)
+        return np.asarray(ids, dtype=np.int64)
+
+    def identifiants(self, urls):
+        """Identifiants des URLs, -1 pour une URL inconnue du graphe."""
+        return np.asarray([self.ids.get(u, -1) for u in urls], dtype=np.int64)
+
+    def ajouter(self, sources, cibles):
+        """Ajoute des arêtes à partir de tableaux d'identifiants."""
+        sources = np.asarray(sources, dtype=np.int64)
+        cibles = np.asarray(cibles, dtype=np.int64)
+        self._en_attente.append((sources << 32) | cibles)
+        if sum(len(c) for c in self._en_attente) > 5_000_000:
+            self._compacter()
+
+    def _compacter(self):
+        if self._en_attente:
+            self._codes = np.unique(np.concatenate([self._codes, *self._en_attente]))
+            self._en_attente = []
+
+    @property
+    def codes(self):
+        self._compacter()
+        return self._codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def contient(self, sources, cibles):
+        """Teste l'existence de chaque arête (sources[k], cibles[k]) ; -1 = jamais."""
+        sources = np.asarray(sources, dtype=np.int64)
+        cibles = np.asarray(cibles, dtype=np.int64)
+        codes = self.codes
+        requetes = (sources << 32) | cibles
+        pos = np.minimum(np.searchsorted(codes, requetes), max(len(codes) - 1, 0))
+        trouve = codes[pos] == requetes if len(codes) else np.zeros(len(requetes), dtype=bool)
+        return trouve & (sources >= 0) & (cibles >= 0)
+
+    def recoit_liens(self, urls):
+        """Pour chaque URL, indique si elle est la cible d'au moins un lien."""
+        cibles = np.unique(self.codes & 0xFFFFFFFF)
+        return np.isin(self.identifiants(urls), cibles)
+
+    def codes_entre(self, urls):
+        """Codes des liens dont la source et la cible sont dans urls, renumérotés
+        par position dans urls (voir depuis_codes). Triés.
+        """
+        ids = self.identifiants(urls)
+        connues = ids >= 0
+        position = np.full(len(self.urls), -1, dtype=np.int64)
+        position[ids[connues]] = np.nonzero(connues)[0]
+        codes = self.codes
+        sources, cibles = position[codes >> 32], position[codes & 0xFFFFFFFF]
+        garde = (sources >= 0) & (cibles >= 0)
+        return np.sort((sources[garde] << 32) | cibles[garde])
+
+    @classmethod
+    def depuis_codes(cls, urls, codes):
+        """Graphe dont les URLs ont pour identifiants leur position dans urls."""
+        graphe = cls()
+        graphe.interner(urls)
+        graphe.ajouter(codes >> 32, codes & 0xFFFFFFFF)
+        return graphe
+
+
+def detecter_liens_existants(pages_data, inlinks_externe=None):
+    """Détecte les liens internes existants depuis les données scrapées et/ou inlinks.
+    Retourne un GrapheLiens (celui des inlinks, complété, s'il est fourni).
+    """
+    graphe = inlinks_externe if inlinks_externe is not None else GrapheLiens()
+    for url, data in pages_data.items():
+        liens = data.get("liens_internes", set())
+        if not liens:
+            continue
+        source = graphe.interner([normaliser_url(url)])
+        cibles = graphe.interner(normaliser_url(lien) for lien in liens)
+        graphe.ajouter(np.repeat(source, len(cibles)), cibles)
+    return graphe
+
+
+# ─── Pages orphelines ────────────────────────────────────────────────────────
+
+def detecter_pages_orphelines(urls, liens_existants):
+    """Détecte les pages qui ne reçoivent aucun lien interne."""
+    recoit = liens_existants.recoit_liens(urls)
+    return [u for u, ok in zip(urls, recoit) if not ok]
+
+
+# ─── Mots-clés communs ──────────────────────────────────────────────────────
+
+MOT_CLE_RE = re.compile(r"\b[a-zA-ZàâäéèêëïîôùûüÿçæœÀÂÄÉÈÊËÏÎÔÙÛÜŸÇÆŒ]{3,}\b")
+
+
+def extraire_mots_cles_page(page_data, n=20):
+    """Extrait les N mots-clés les plus importants d'une page.
+    Chaque champ est tokenisé une seule fois et ses occurrences comptées avec
+    le poids de construire_texte_pondere (title x3, h1 x2, meta x2, body x1).
+    """
+    compteur = Counter()
+    for champ, poids in POIDS_CHAMPS.items():
+        texte = page_data.get(champ, "") or ""
+        for mot in MOT_CLE_RE.findall(texte.lower()):
+            if mot not in FRENCH_STOP_WORDS:
+                compteur[mot] += poids
+    return frozenset(mot for mot, _ in compteur.most_common(n))
+
+
+def indexer_mots_cles(pages_data, urls, n=20):
+    """Calcule une seule fois les N mots-clés de chaque page : {url: frozenset}."""
+    return {url: extraire_mots_cles_page(pages_data.get(url, {}), n) for url in urls}
+
+
+def mots_cles_communs(pages_data, url1, url2, n=5, mots_cles=None):
+    """Trouve les mots-clés communs entre deux pages.
+    Si mots_cles (voir indexer_mots_cles) est fourni, les pages n'y sont pas re-tokenisées.
+    """
+    if mots_cles is not None and url1 in mots_cles and url2 in mots_cles:
+        kw1, kw2 = mots_cles[url1], mots_cles[url2]
+    else:
+        kw1 = extraire_mots_cles_page(pages_data.get(url1, {}))
+        kw2 = extraire_mots_cles_page(pages_data.get(url2, {}))
+    communs = kw1 & kw2
+    return sorted(communs)[:n]
+
+
+# ─── Suggestion d'ancre ─────────────────────────────────────────────────────
+
+def suggerer_ancre(pages_data, url_source, url_cible, communs=None):
+    """Suggère un texte d'ancre : H1 cible > titre cible > mots-clés communs.
+    communs : mots-clés communs déjà calculés pour la paire (évite un recalcul).
+    """
+    data_cible = pages_data.get(url_cible, {})
+    h1 = data_cible.get("h1", "")
+    title = data_cible.get("title", "")
+    if h1 and len(h1) < 100:
+        return h1
+    if title and len(title) < 100:
+        return title
+    if communs is None:
+        communs = mots_cles_communs(pages_data, url_source, url_cible, n=3)
+    if communs:
+        return ", ".join(communs[:3])
+    return ""
+
+
+# ─── Génération des recommandations ─────────────────────────────────────────
+
+def iterer_recommandations(
+    voisins, urls_valides, pages_data, page_clusters,
+    liens_existants, max_reco, seuil, taille_lot=2000, mots_cles=None
+):
+    """Produit les recommandations par lots de taille_lot pages sources, au fil de
+    leur génération (page source croissante, puis score décroissant), sans
+    jamais les tenir toutes en mémoire. Les mots-clés d'une page ne sont
+    calculés qu'une fois, au premier lot qui la concerne.
+    mots_cles : index {url: frozenset} déjà calculé (voir indexer_mots_cles),
+    complété au besoin.
+    """
+    sources, cibles, scores = selectionner_recommandations(voisins, max_reco)
+    ids = liens_existants.identifiants(urls_valides)
+    mots_cles = {} if mots_cles is None else mots_cles
+    bornes = np.searchsorted(sources, np.arange(0, len(urls_valides) + taille_lot, taille_lot))
+    for debut, fin in zip(bornes[:-1], bornes[1:]):
+        if debut == fin:
+            continue
+        lot_sources, lot_cibles, lot_scores = sources[debut:fin], cibles[debut:fin], scores[debut:fin]
+        existants = liens_existants.contient(ids[lot_sources], ids[lot_cibles])
+        concernees = np.unique(np.concatenate([lot_sources, lot_cibles]))
+        mots_cles.update(indexer_mots_cles(
+            pages_data, [urls_valides[i] for i in concernees if urls_valides[i] not in mots_cles]
+        ))
+
+        lot = []
+        for i, j, score, lien_existe in zip(lot_sources, lot_cibles, lot_scores, existants):
+            url_source = urls_valides[i]
+            url_cible = urls_valides[j]
+            communs = mots_cles_communs(pages_data, url_source, url_cible, mots_cles=mots_cles)
+            ancre = suggerer_ancre(pages_data, url_source, url_cible, communs)
+            cluster_source = page_clusters.get(url_source, "")
+            cluster_cible = page_clusters.get(url_cible, "")
+
+            lot.append({
+                "Page Source": url_source,
+                "Page Cible": url_cible,
+                "Score Similarite": round(float(score), 4),
+                "Ancre Suggeree": ancre,
+                "Mots-cles Communs": ", ".join(communs),
+                "Lien Existant": "oui" if lien_existe else "non",
+                "Cluster Source": cluster_source,
+                "Cluster Cible": cluster_cible,
+            })
+        yield lot
+
+
+def generer_recommandations(
+    voisins, urls_valides, pages_data, page_clusters,
+    liens_existants, max_reco, seuil
+):
+    """Génère les recommandations de maillage interne à partir des top-k voisins.
+    Version en mémoire (liste triée par score) ; voir iterer_recommandations
+    et ExportRecommandations pour l'export en flux.
+    """
+    print(f"\nGeneration des recommandations (max {max_reco} par page, seuil {seuil})...")
+    recommandations = []
+    for lot in iterer_recommandations(
+        voisins, urls_valides, pages_data, page_clusters, liens_existants, max_reco, seuil
+    ):
+        recommandations.extend(lot)
+    recommandations.sort(key=lambda x: x["Score Similarite"], reverse=True)
+    return recommandations
+
+
+# ─── Export CSV ──────────────────────────────────────────────────────────────
+
+COLONNES_RECOMMANDATIONS = [
+    "Page Source", "Page Cible", "Score Similarite", "Ancre Suggeree",
+    "Mots-cles Communs", "Lien Existant", "Cluster Source", "Cluster Cible",
+]
+COLONNES_DICTIONNAIRE = ["Page Source", "Page Cible", "Lien Existant", "Cluster Source", "Cluster Cible"]
+
+
+class ExportRecommandations:
+    """Écriture en flux des recommandations, lot par lot.
+    Le format suit l'extension : .parquet (pyarrow, colonnes URL et cluster
+    encodées en dictionnaire, compression zstd), .gz (CSV gzip) ou CSV.
+    Avec tri_score, l'ordre est celui du tri stable par score décroissant de
+    generer_recommandations, obtenu par tri externe : les lignes sont triées
+    par paquets de taille_run dans des fichiers temporaires, fusionnés par
+    heapq.merge à la fermeture. Sans tri_score, les lignes sont écrites dans
+    l'ordre de génération (page source), sans fichier temporaire.
+    """
+
+    def __init__(self, chemin, tri_score=True, taille_run=200000, taille_ecriture=10000):
+        self.chemin = chemin
+        self.tri_score = tri_score
+        self.taille_run = taille_run
+        self.taille_ecriture = taille_ecriture
+        self.total = 0
+        self.nouvelles = 0
+        self._tampon = []
+        self._runs = []
+        self._temporaire = None
+        self._parquet = None
+        nom = chemin.lower()
+        self.format = "parquet" if nom.endswith(".parquet") else "csv.gz" if nom.endswith(".gz") else "csv"
+        if self.format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                print("Erreur : l'export Parquet necessite pyarrow (pip install pyarrow).")
+                sys.exit(1)
+            self._pa, self._pq = pyarrow, pyarrow.parquet
+        elif self.format == "csv.gz":
+            self._fichier = gzip.open(chemin, "wt", newline="", encoding="utf-8-sig")
+        else:
+            self._fichier = open(chemin, "w", newline="", encoding="utf-8-sig")
+        if self.format != "parquet":
+            self._csv = csv.writer(self._fichier, lineterminator=os.linesep)
+            self._csv.writerow(COLONNES_RECOMMANDATIONS)
+
+    def ajouter(self, lot):
+        self.total += len(lot)
+        self.nouvelles += sum(1 for r in lot if r["Lien Existant"] == "non")
+        if not self.tri_score:
+            self._ecrire(lot)
+            return
+        # (clé de tri, rang de génération) : la fusion reproduit un tri stable.
+        for rang, r in enumerate(lot, self.total - len(lot)):
+            self._tampon.append((-r["Score Similarite"], rang, r))
+        if len(self._tampon) >= self.taille_run:
+            self._vider_run()
+
+    def _vider_run(self):
+        """Trie le tampon et l'écrit dans un fichier temporaire (un "run")."""
+        if self._temporaire is None:
+            self._temporaire = tempfile.TemporaryDirectory(prefix="maillage_export_")
+        self._tampon.sort(key=lambda e: e[:2])
+        chemin = os.path.join(self._temporaire.name, f"run_{len(self._runs)}.csv")
+        with open(chemin, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for cle, rang, r in self._tampon:
+                writer.writerow([repr(cle), rang, *(r[c] for c in COLONNES_RECOMMANDATIONS)])
+        self._runs.append(chemin)
+        self._tampon = []
+
+    @staticmethod
+    def _lire_run(chemin):
+        with open(chemin, newline="", encoding="utf-8") as f:
+            for ligne in csv.reader(f):
+                r = dict(zip(COLONNES_RECOMMANDATIONS, ligne[2:]))
+                r["Score Similarite"] = float(r["Score Similarite"])
+                yield float(ligne[0]), int(ligne[1]), r
+
+    def _ecrire(self, lignes):
+        if self.format != "parquet":
+            self._csv.writerows([r[c] for c in COLONNES_RECOMMANDATIONS] for r in lignes)
+            return
+        pa = self._pa
+        colonnes = {c: [r[c] for r in lignes] for c in COLONNES_RECOMMANDATIONS}
+        table = pa.table({
+            c: pa.array(v, type=pa.float64() if c == "Score Similarite" else pa.string())
+            for c, v in colonnes.items()
+        })
+        if self._parquet is None:
+            self._parquet = self._pq.ParquetWriter(
+                self.chemin, table.schema, use_dictionary=COLONNES_DICTIONNAIRE, compression="zstd"
+            )
+        self._parquet.write_table(table)
+
+    def fermer(self):
+        """Termine l'écriture (fusion des runs si besoin) ; retourne (total, nouvelles)."""
+        if self.tri_score:
+            if self._runs:
+                if self._tampon:
+                    self._vider_run()
+                flux = heapq.merge(*(self._lire_run(c) for c in self._runs), key=lambda e: e[:2])
+            else:
+                self._tampon.sort(key=lambda e: e[:2])
+                flux = iter(self._tampon)
+            paquet = []
+            for _, _, r in flux:
+                paquet.append(r)
+                if len(paquet) >= self.taille_ecriture:
+                    self._ecrire(paquet)
+                    paquet = []
+            if paquet:
+                self._ecrire(paquet)
+            self._tampon = []
+        if self.format == "parquet":
+            if self._parquet is None:
+                self._ecrire([])
+            self._parquet.close()
+        else:
+            self._fichier.close()
+        if self._temporaire is not None:
+            self._temporaire.cleanup()
+        libelle = "Parquet" if self.format == "parquet" else "CSV"
+        print(f"\n{libelle} exporte : {self.chemin} ({self.total} recommandations)")
+        return self.total, self.nouvelles
+
+
+def exporter_csv(recommandations, output_path):
+    """Exporte une liste de recommandations (déjà triée) ; retourne (total, nouvelles)."""
+    export = ExportRecommandations(output_path, tri_score=False)
+    export.ajouter(recommandations)
+    return export.fermer()
+
+
+# ─── Résumé console ─────────────────────────────────────────────────────────
+
+def top_paires(voisins, n):
+    """Extrait les n paires (i < j) les plus similaires depuis les top-k voisins.
+    Exact tant que k >= n : une paire du top n global figure forcément dans le
+    top-k de sa première page. Retourne (i, j, scores) triés par score
+    décroissant puis (i, j).
+    """
+    coo = voisins.tocoo()
+    if coo.nnz == 0 or n <= 0:
+        vide = np.empty(0, dtype=np.int64)
+        return vide, vide, np.empty(0)
+    a = np.minimum(coo.row, coo.col).astype(np.int64)
+    b = np.maximum(coo.row, coo.col).astype(np.int64)
+    codes = a * voisins.shape[0] + b
+    # À paire égale, garder le score calculé depuis la ligne i (i < j).
+    ordre = np.lexsort((coo.row != a, codes))
+    codes, uniques = np.unique(codes[ordre], return_index=True)
+    ordre = ordre[uniques]
+    a, b, scores = a[ordre], b[ordre], coo.data[ordre]
+    if len(scores) > n:
+        part = np.argpartition(-scores, n - 1)[:n]
+        kieme = scores[part].min()
+        garde = scores >= kieme
+        a, b, scores = a[garde], b[garde], scores[garde]
+    ordre = np.lexsort((b, a, -scores))[:n]
+    return a[ordre], b[ordre], scores[ordre]
+
+
+def afficher_resume(
+    urls_valides, total_reco, nouvelles, page_clusters, cluster_labels,
+    pages_orphelines, liens_existants, voisins, n_paires=5
+):
+    """Affiche un résumé des résultats dans la console.
+    total_reco, nouvelles : nombre de recommandations et de liens absents.
+    """
+    pct_nouvelles = (nouvelles / total_reco * 100) if total_reco > 0 else 0
+
+    print("\n" + "=" * 60)
+    print("RESUME DES RESULTATS")
+    print("=" * 60)
+    print(f"  Pages analysees       : {len(urls_valides)}")
+    print(f"  Recommandations       : {total_reco}")
+    print(f"  Nouvelles opportunites: {nouvelles} ({pct_nouvelles:.1f}%)")
+    print(f"  Liens existants       : {total_reco - nouvelles}")
+    print(f"  Clusters thematiques  : {len(cluster_labels)}")
+    print(f"  Pages orphelines      : {len(pages_orphelines)}")
+
+    if pages_orphelines:
+        print("\n  Pages orphelines :")
+        for p in pages_orphelines[:10]:
+            print(f"    - {p}")
+        if len(pages_orphelines) > 10:
+            print(f"    ... et {len(pages_orphelines) - 10} autres")
+
+    print(f"\n  Clusters :")
+    effectifs = Counter(page_clusters.values())
+    for cid, label in sorted(cluster_labels.items()):
+        count = effectifs[label]
+        print(f"    [{cid}] {label} ({count} pages)")
+
+    print(f"\n  Top {n_paires} paires les plus similaires :")
+    for i, j, score in zip(*top_paires(voisins, n_paires)):
+        u1, u2 = urls_valides[i], urls_valides[j]
+        print(f"    {score:.4f}  {u1}")
+        print(f"             {u2}")
+
+    print("=" * 60)
+
+
+# ─── Calcul réparti (shards) ─────────────────────────────────────────────────
+
+VERSION_SHARDS = 1
+
+
+def lire_shard(valeur):
+    """Valeur de --shard : "preparer", "fusionner" ou "I/N" (1 <= I <= N) -> (I, N)."""
+    if valeur in ("preparer", "fusionner"):
+        return valeur
+    try:
+        indice, total = (int(x) for x in valeur.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"attendu preparer, fusionner ou I/N, pas {valeur!r}")
+    if not 1 <= indice <= total:
+        raise argparse.ArgumentTypeError(f"shard {valeur} hors limites (1 <= I <= N)")
+    return indice, total
+
+
+def bornes_shard(n, indice, total):
+    """Tranche [debut, fin) des pages sources du shard indice/total."""
+    return n * (indice - 1) // total, n * indice // total
+
+
+def preparer_shards(
+    dossier, urls_analyse, urls_valides, groupes, tfidf_matrix, pages_data,
+    page_clusters, cluster_labels, liens_existants, pages_orphelines,
+    top_k, max_reco, seuil, n_paires
+):
+    """Écrit dans le dossier partagé tout ce qu'un shard doit lire : matrice
+    TF-IDF ajustée, URLs (analysées puis membres des groupes de quasi-doublons
+    avec l'indice de leur représentant), title/H1/mots-clés des pages,
+    clusters, liens existants entre pages et paramètres de l'analyse.
+    preparation.json est écrit en dernier : sa date identifie la préparation.
+    """
+    os.makedirs(dossier, exist_ok=True)
+    _, representants = representants_doublons(urls_analyse, groupes)
+    mots_cles = indexer_mots_cles(pages_data, urls_valides)
+    meta = {
+        "version": VERSION_SHARDS,
+        "date": time.time(),
+        "urls": list(urls_valides),
+        "n_analysees": len(urls_analyse),
+        "representants": representants.tolist(),
+        "top_k": int(top_k),
+        "max_reco": int(max_reco),
+        "seuil": float(seuil),
+        "n_paires": int(n_paires),
+        "pages": [
+            [pages_data.get(u, {}).get("title", ""), pages_data.get(u, {}).get("h1", ""), sorted(mots_cles[u])]
+            for u in urls_valides
+        ],
+        "page_clusters": [page_clusters.get(u, "") for u in urls_valides],
+        "cluster_labels": {str(k): v for k, v in cluster_labels.items()},
+        "pages_orphelines": list(pages_orphelines),
+    }
+    fichiers = {
+        "tfidf.npz": lambda f: sparse.save_npz(f, tfidf_matrix.tocsr()),
+        "liens.npy": lambda f: np.save(f, liens_existants.codes_entre(urls_valides)),
+        "preparation.json": lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")),
+    }
+    for nom, ecrire in fichiers.items():
+        temporaire = os.path.join(dossier, nom + ".tmp")
+        with open(temporaire, "wb") as f:
+            ecrire(f)
+        os.replace(temporaire, os.path.join(dossier, nom))
+    print(f"\nShards prepares dans {dossier}/ : {len(urls_valides)} pages sources.")
+    print(f"  Lancer --shard I/N --shard-dossier {dossier} pour I = 1..N, puis --shard fusionner.")
+
+
+def charger_preparation(dossier):
+    """Lit preparation.json ; quitte avec une erreur si le dossier n'est pas préparé."""
+    try:
+        with open(os.path.join(dossier, "preparation.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Erreur : dossier de shards non prepare ({e}). Lancer d'abord --shard preparer.")
+        sys.exit(1)
+    if meta.get("version") != VERSION_SHARDS:
+        print("Erreur : preparation des shards d'une autre version, relancer --shard preparer.")
+        sys.exit(1)
+    return meta
+
+
+def executer_shard(dossier, indice, total, taille_bloc=1024, memoire_max_mo=512, metriques=None):
+    """Calcule les voisins et les recommandations des pages sources du shard
+    indice/total, dans l'ordre de génération de iterer_recommandations.
+    Écrit shard_I_N.csv (recommandations), shard_I_N.npz (voisins des pages
+    analysées de la tranche, pour le résumé) puis shard_I_N.json, qui marque
+    le shard comme terminé. Les membres d'un groupe de quasi-doublons
+    reprennent la ligne de leur représentant, calculée par ce shard.
+    """
+    metriques = metriques or Metriques()
+    meta = charger_preparation(dossier)
+    urls = meta["urls"]
+    n, n_total = meta["n_analysees"], len(urls)
+    debut, fin = bornes_shard(n_total, indice, total)
+    prefixe = os.path.join(dossier, f"shard_{indice:04d}_{total:04d}")
+    print(f"Shard {indice}/{total} : pages sources {debut} a {fin - 1} sur {n_total}.")
+
+    with metriques.etape("similarite") as etape:
+        tfidf_matrix = sparse.load_npz(os.path.join(dossier, "tfidf.npz")).tocsr()
+        representants = np.concatenate([np.arange(n), np.asarray(meta["representants"], dtype=np.int64)])
+        k = max(0, min(meta["top_k"], n - 1))
+        a_calculer = np.unique(representants[debut:fin]) if k > 0 else np.empty(0, dtype=np.int64)
+        bloc = taille_bloc_similarite(n, taille_bloc, memoire_max_mo)
+        lignes, colonnes, scores = voisins_lignes(tfidf_matrix, a_calculer, k, meta["seuil"], bloc)
+        partiel = sparse.csr_matrix((scores, (lignes, colonnes)), shape=(n, n))
+        # Lignes de la tranche (représentant de chaque source) dans une matrice pleine taille.
+        tranche = partiel[representants[debut:fin]]
+        indptr = np.concatenate([
+            np.zeros(debut, dtype=tranche.indptr.dtype), tranche.indptr,
+            np.full(n_total - fin, tranche.nnz, dtype=tranche.indptr.dtype),
+        ])
+        voisins = sparse.csr_matrix((tranche.data, tranche.indices, indptr), shape=(n_total, n_total))
+        etape["elements"] = len(a_calculer)
+
+    with metriques.etape("recommandations") as etape:
+        pages = {u: {"title": t, "h1": h} for u, (t, h, _) in zip(urls, meta["pages"])}
+        mots_cles = {u: frozenset(m) for u, (_, _, m) in zip(urls, meta["pages"])}
+        page_clusters = dict(zip(urls, meta["page_clusters"]))
+        liens = GrapheLiens.depuis_codes(urls, np.load(os.path.join(dossier, "liens.npy")))
+        export = ExportRecommandations(prefixe + ".csv", tri_score=False)
+        for lot in iterer_recommandations(
+            voisins, urls, pages, page_clusters, liens, meta["max_reco"], meta["seuil"], mots_cles=mots_cles
+        ):
+            export.ajouter(lot)
+        total_reco, nouvelles = export.fermer()
+        etape["elements"] = total_reco
+
+    propres = (lignes >= debut) & (lignes < min(fin, n))
+    with open(prefixe + ".npz", "wb") as f:
+        np.savez(f, lignes=lignes[propres], colonnes=colonnes[propres], scores=scores[propres])
+    marqueur = {
+        "date_preparation": meta["date"], "indice": indice, "total": total,
+        "recommandations": total_reco, "nouvelles": nouvelles,
+    }
+    with open(prefixe + ".json", "w", encoding="utf-8") as f:
+        json.dump(marqueur, f)
+    print(f"Shard {indice}/{total} termine : {total_reco} recommandations.")
+
+
+def fusionner_shards(dossier, chemin_sortie, tri_score=True, metriques=None, taille_lot=10000):
+    """Assemble les shards terminés d'une même préparation en un seul export,
+    identique à celui d'une exécution en un seul processus : les CSV des
+    shards, lus dans l'ordre des tranches, suivent l'ordre de génération
+    global et passent par le même tri externe. Affiche ensuite le résumé.
+    """
+    metriques = metriques or Metriques()
+    meta = charger_preparation(dossier)
+    marqueurs = {}
+    for nom in sorted(os.listdir(dossier)):
+        if nom.startswith("shard_") and nom.endswith(".json"):
+            with open(os.path.join(dossier, nom), "r", encoding="utf-8") as f:
+                marqueur = json.load(f)
+            if marqueur["date_preparation"] == meta["date"]:
+                marqueurs.setdefault(marqueur["total"], {})[marqueur["indice"]] = marqueur
+    complets = [t for t, shards in marqueurs.items() if len(shards) == t]
+    if len(complets) != 1:
+        attendus = ", ".join(
+            f"{t} shards : manquent {sorted(set(range(1, t + 1)) - set(shards))}"
+            for t, shards in sorted(marqueurs.items())
+        )
+        print(f"Erreur : aucun decoupage complet a fusionner ({attendus or 'aucun shard termine'}).")
+        sys.exit(1)
+    total = complets[0]
+    urls = meta["urls"]
+    n = meta["n_analysees"]
+
+    with metriques.etape("fusion") as etape:
+        print(f"Fusion de {total} shards ({len(urls)} pages sources)...")
+        export = ExportRecommandations(chemin_sortie, tri_score)
+        blocs = []
+        for indice in range(1, total + 1):
+            prefixe = os.path.join(dossier, f"shard_{indice:04d}_{total:04d}")
+            with open(prefixe + ".csv", newline="", encoding="utf-8-sig") as f:
+                lecteur = csv.reader(f)
+                next(lecteur)
+                lot = []
+                for ligne in lecteur:
+                    r = dict(zip(COLONNES_RECOMMANDATIONS, ligne))
+                    r["Score Similarite"] = float(r["Score Similarite"])
+                    lot.append(r)
+                    if len(lot) >= taille_lot:
+                        export.ajouter(lot)
+                        lot = []
+                if lot:
+                    export.ajouter(lot)
+            with np.load(prefixe + ".npz") as npz:
+                blocs.append((npz["lignes"], npz["colonnes"], npz["scores"]))
+        total_reco, nouvelles = export.fermer()
+        etape["elements"] = total_reco
+
+    lignes, colonnes, scores = (np.concatenate(c) for c in zip(*blocs))
+    voisins = sparse.csr_matrix((scores, (lignes, colonnes)), shape=(n, n))
+    with metriques.etape("resume"):
+        afficher_resume(
+            urls, total_reco, nouvelles, dict(zip(urls, meta["page_clusters"])),
+            {int(k): v for k, v in meta["cluster_labels"].items()},
+            meta["pages_orphelines"], None, voisins, meta["n_paires"]
+        )
+
+
+# ─── Mode serveur ────────────────────────────────────────────────────────────
+
+class IndexService:
+    """Index en mémoire du mode serveur, chargé une fois depuis un dossier d'état
+    complété par sauvegarder_index_service. L'index de service doit porter la
+    génération de l'état et couvrir exactement ses URLs (ValueError sinon).
+    Une URL de l'état est servie depuis ses voisins précalculés. Un texte brut
+    passe par le seul transform du vectorizer ajusté puis par un produit creux
+    avec la matrice TF-IDF, stockée par colonnes pour ne lire que les termes
+    présents dans la requête.
+    """
+
+    def __init__(self, dossier):
+        etat = charger_etat(dossier)
+        if etat is None:
+            raise ValueError(f"etat d'analyse absent ou illisible dans {dossier}")
+        with open(os.path.join(dossier, "service.json"), "r", encoding="utf-8") as f:
+            service = json.load(f)
+        generation = etat["generation"]
+        if service.get("generation") != generation:
+            raise ValueError("index de service et etat d'analyse desynchronises")
+        liens = np.load(fichier_generation(dossier, "service_liens.npy", generation))
+        n = len(etat["urls"])
+        if len(service["pages"]) != n:
+            raise ValueError(f"index de service de {len(service['pages'])} pages pour un etat de {n} URLs")
+        if len(liens) and max(int(liens.max() >> 32), int((liens & 0xFFFFFFFF).max())) >= n:
+            raise ValueError(f"liens de l'index de service hors des {n} URLs de l'etat")
+
+        self.date = etat["date"]
+        self.urls = etat["urls"]
+        self.position = {url: i for i, url in enumerate(self.urls)}
+        self.vectorizer = etat["vectorizer"]
+        self.poids = etat.get("poids")
+        self.seuil = etat["seuil"]
+        self.voisins = etat["voisins"]
+        self.colonnes = etat["tfidf"].tocsc()
+        self.page_clusters = etat["page_clusters"]
+        self.cluster_labels = etat["cluster_labels"]
+        self.modele_clusters = etat["modele_clusters"]
+        self.pages = {url: {"title": t, "h1": h} for url, (t, h, _) in zip(self.urls, service["pages"])}
+        self.mots_cles = {url: frozenset(m) for url, (_, _, m) in zip(self.urls, service["pages"])}
+        self.liens = GrapheLiens.depuis_codes(self.urls, liens)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def pour_url(self, url, k):
+        """Recommandations d'une page de l'état ; None si l'URL est inconnue."""
+        if url not in self.position:
+            url = normaliser_url(url)
+        i = self.position.get(url)
+        if i is None:
+            return None
+        ligne = self.voisins[i]
+        ordre = np.lexsort((ligne.indices, -ligne.data))[:k]
+        return {
+            "source": url,
+            "cluster": self.page_clusters.get(url, ""),
+            "recommandations": self._recommandations(
+                url, i, self.mots_cles[url], ligne.indices[ordre], ligne.data[ordre]
+            ),
+        }
+
+    def pour_texte(self, page, k, seuil=None):
+        """Recommandations pour un texte brut (brouillon) : page est un dict aux
+        champs title, h1, meta_description, body_text (et url, facultative,
+        exclue des cibles si elle fait partie de l'état).
+        """
+        seuil = self.seuil if seuil is None else max(seuil, self.seuil)
+        document = construire_champs(page) if self.poids else construire_texte_pondere(page)
+        requete = self.vectorizer.transform([document]).tocsr()
+        scores = np.asarray(self.colonnes[:, requete.indices] @ requete.data).ravel()
+        source = page.get("url") or ""
+        i = self.position.get(normaliser_url(source), -1) if source else -1
+        if i >= 0:
+            scores[i] = 0.0
+        candidats = np.nonzero(scores >= seuil)[0]
+        if len(candidats) > k:
+            candidats = candidats[np.argpartition(-scores[candidats], k - 1)[:k]]
+        candidats = candidats[np.lexsort((candidats, -scores[candidats]))]
+        cluster = ""
+        if requete.nnz and self.modele_clusters is not None:
+            cluster = self.cluster_labels.get(int(predire_clusters(self.modele_clusters, requete)[0]), "")
+        return {
+            "source": source,
+            "cluster": cluster,
+            "recommandations": self._recommandations(
+                source, i, extraire_mots_cles_page(page), candidats, scores[candidats]
+            ),
+        }
+
+    def _recommandations(self, source, i_source, mots_source, cibles, scores):
+        existants = self.liens.contient(np.full(len(cibles), i_source), cibles)
+        resultats = []
+        for j, score, lien_existe in zip(cibles, scores, existants):
+            cible = self.urls[j]
+            communs = sorted(mots_source & self.mots_cles[cible])[:5]
+            resultats.append({
+                "cible": cible,
+                "score": round(float(score), 4),
+                "ancre": suggerer_ancre(self.pages, source, cible, communs),
+                "mots_cles_communs": communs,
+                "lien_existant": bool(lien_existe),
+                "cluster": self.page_clusters.get(cible, ""),
+            })
+        return resultats
+
+
+def signature_index(dossier):
+    """Dates de modification des fichiers qui changent à chaque reconstruction de l'index."""
+    signature = []
+    for nom in ("etat.json", "service.json"):
+        try:
+            signature.append(os.stat(os.path.join(dossier, nom)).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def servir(dossier, hote="127.0.0.1", port=8000, intervalle=2.0, k_defaut=10):
+    """Sert l'index d'un dossier d'état en HTTP/JSON jusqu'à Ctrl-C.
+      GET  /recommandations?url=...&k=10[&seuil=0.2]
+      GET  /recommandations?texte=...&title=...&h1=...&k=10
+      POST /recommandations  {"url", "texte", "title", "h1", "meta_description", "k", "seuil"}
+      GET  /sante
+    Le dossier est surveillé toutes les `intervalle` secondes : un index
+    reconstruit (nouvelle exécution avec --etat) est chargé en arrière-plan
+    puis substitué à l'ancien sans interrompre le service. Un index
+    incomplet ou désynchronisé est ignoré jusqu'à la vérification suivante.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class GestionnaireService(BaseHTTPRequestHandler):
+        """Routes JSON du mode serveur."""
+
+        def log_message(self, format, *args):
+            pass
+
+        def repondre(self, code, donnees):
+            corps = json.dumps(donnees, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corps)))
+            self.end_headers()
+            self.wfile.write(corps)
+
+        def do_GET(self):
+            adresse = urlparse(self.path)
+            parametres = {cle: valeurs[0] for cle, valeurs in parse_qs(adresse.query).items()}
+            if adresse.path == "/sante":
+                index = self.server.index
+                self.repondre(200, {"pages": len(index), "date_etat": index.date, "rechargements": self.server.rechargements})
+            elif adresse.path == "/recommandations":
+                self.recommander(parametres)
+            else:
+                self.repondre(404, {"erreur": f"route inconnue : {adresse.path}"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/recommandations":
+                self.repondre(404, {"erreur": f"route inconnue : {self.path}"})
+                return
+            try:
+                longueur = int(self.headers.get("Content-Length", 0))
+                parametres = json.loads(self.rfile.read(longueur) or b"{}")
+            except ValueError as e:
+                self.repondre(400, {"erreur": f"JSON invalide : {e}"})
+                return
+            if not isinstance(parametres, dict):
+                self.repondre(400, {"erreur": "objet JSON attendu"})
+                return
+            self.recommander(parametres)
+
+        def recommander(self, parametres):
+            debut = time.perf_counter()
+            # Une requête garde l'index lu à son arrivée, même si un rechargement le remplace.
+            index = self.server.index
+            try:
+                k = int(parametres.get("k", self.server.k_defaut))
+                seuil = float(parametres["seuil"]) if parametres.get("seuil") is not None else None
+            except (TypeError, ValueError):
+                self.repondre(400, {"erreur": "k et seuil doivent etre numeriques"})
+                return
+            if k < 1:
+                self.repondre(400, {"erreur": "k doit etre >= 1"})
+                return
+            texte = parametres.get("texte", parametres.get("body_text"))
+            if texte is not None or any(parametres.get(c) for c in ("title", "h1", "meta_description")):
+                page = {champ: str(parametres.get(champ) or "") for champ in ("url", "title", "h1", "meta_description")}
+                page["body_text"] = str(texte or "")
+                resultat = index.pour_texte(page, k, seuil)
+            elif parametres.get("url"):
+                resultat = index.pour_url(str(parametres["url"]), k)
+                if resultat is None:
+                    self.repondre(404, {"erreur": f"URL absente de l'index : {parametres['url']}"})
+                    return
+                if seuil is not None:
+                    resultat["recommandations"] = [r for r in resultat["recommandations"] if r["score"] >= seuil]
+            else:
+                self.repondre(400, {"erreur": "parametre url ou texte requis"})
+                return
+            resultat["duree_ms"] = round((time.perf_counter() - debut) * 1000, 3)
+            self.repondre(200, resultat)
+
+    # Port réservé avant le chargement de l'index : un port occupé est signalé sans attendre.
+    try:
+        serveur = ThreadingHTTPServer((hote, port), GestionnaireService)
+    except OSError as e:
+        print(f"Erreur : impossible d'ecouter sur {hote}:{port} ({e}).")
+        sys.exit(1)
+    signature = signature_index(dossier)
+    try:
+        index = IndexService(dossier)
+    except (OSError, ValueError, KeyError) as e:
+        serveur.server_close()
+        print(f"Erreur : index de service inutilisable ({e}). Construire l'etat avec --etat {dossier}.")
+        sys.exit(1)
+    serveur.daemon_threads = True
+    serveur.index = index
+    serveur.k_defaut = k_defaut
+    serveur.rechargements = 0
+    arret = threading.Event()
+
+    def surveiller():
+        nonlocal signature
+        while not arret.wait(intervalle):
+            nouvelle = signature_index(dossier)
+            if nouvelle == signature:
+                continue
+            try:
+                debut = time.perf_counter()
+                serveur.index = IndexService(dossier)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Attention : rechargement differe ({e}).")
+                continue
+            signature = nouvelle
+            serveur.rechargements += 1
+            print(f"Index recharge : {len(serveur.index)} pages ({time.perf_counter() - debut:.1f}s).")
+
+    threading.Thread(target=surveiller, daemon=True).start()
+    print(f"Index charge : {len(index)} pages. Service sur http://{hote}:{serveur.server_address[1]}/ (Ctrl-C pour arreter)")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        arret.set()
+        serveur.server_close()
+
+
+# ─── Mode batch ──────────────────────────────────────────────────────────────
+
+# Chemins propres à un site : la commande --batch ne les transmet pas aux lignes du manifeste.
+OPTIONS_PAR_SITE = (
+    "input", "output", "inlinks", "etat", "cache", "checkpoint", "metrics_out", "profiler", "flux_dossier",
+)
+
+
+class SortieParThread:
+    """sys.stdout aiguillé par thread : chaque site d'un batch écrit dans son journal."""
+
+    def __init__(self, defaut):
+        self.defaut = defaut
+        self._local = threading.local()
+
+    def rediriger(self, fichier):
+        """Envoie les print() du thread courant vers fichier (None : sortie par défaut)."""
+        self._local.fichier = fichier
+
+    def _cible(self):
+        return getattr(self._local, "fichier", None) or self.defaut
+
+    def write(self, texte):
+        return self._cible().write(texte)
+
+    def flush(self):
+        self._cible().flush()
+
+    def __getattr__(self, nom):
+        return getattr(self.defaut, nom)
+
+
+class RessourcesBatch:
+    """Pools partagés par les sites d'un batch : threads de téléchargement
+    (sessions HTTP gardées d'un site à l'autre) et processus de calcul
+    (extraction HTML, TF-IDF et voisins) qui n'importent sklearn qu'une fois.
+    arret, posé à l'interruption du batch, est vérifié par chaque site entre
+    ses étapes et pendant son crawl.
+    """
+
+    def __init__(self, connexions, processus):
+        self.processus = processus
+        self.arret = threading.Event()
+        self.telechargement = ThreadPoolExecutor(max_workers=connexions, thread_name_prefix="telechargement")
+        # spawn : un fork depuis un processus multi-thread peut hériter de verrous pris.
+        self.calcul = ProcessPoolExecutor(max_workers=processus, mp_context=multiprocessing.get_context("spawn"))
+
+    def verifier_arret(self):
+        """Termine le site courant (SystemExit 130) si le batch est interrompu."""
+        if self.arret.is_set():
+            print("Interrompu : batch arrete.")
+            sys.exit(130)
+
+    def fermer(self):
+        self.telechargement.shutdown(cancel_futures=True)
+        self.calcul.shutdown(cancel_futures=True)
+
+
+def lire_manifeste(chemin, parser, args):
+    """Lit un manifeste de batch : une ligne par site, avec les options de ce
+    site en syntaxe shell (au moins -i et -o) ; lignes vides et # ignorées.
+    Les options de la commande (args) servent de valeurs par défaut, sauf
+    OPTIONS_PAR_SITE. Retourne [(numéro de ligne, arguments du site)].
+    """
+    base = vars(args).copy()
+    base.update({dest: parser.get_default(dest) for dest in OPTIONS_PAR_SITE}, batch=None)
+    sites = []
+    sorties = {}
+    with open(chemin, encoding="utf-8") as f:
+        for numero, ligne in enumerate(f, 1):
+            jetons = shlex.split(ligne, comments=True)
+            if not jetons:
+                continue
+            try:
+                site = parser.parse_args(jetons, argparse.Namespace(**base))
+            except SystemExit:
+                print(f"Erreur : {chemin}, ligne {numero} : options invalides.")
+                raise
+            erreur = valider_arguments(site)
+            if site.batch or site.serveur or site.shard or site.comparer_extracteurs:
+                erreur = "--batch, --serveur, --shard et --comparer-extracteurs sont interdits dans un manifeste"
+            elif site.profiler and args.batch_sites > 1:
+                # cProfile n'admet qu'un profileur actif par processus (Python >= 3.12).
+                erreur = "--profiler necessite --batch-sites 1 (un seul profileur actif a la fois)"
+            sortie = os.path.abspath(site.output)
+            if not erreur and sortie in sorties:
+                erreur = f"sortie {site.output} deja utilisee ligne {sorties[sortie]}"
+            if erreur:
+                parser.error(f"{chemin}, ligne {numero} : {erreur}")
+            sorties[sortie] = numero
+            sites.append((numero, site))
+    return sites
+
+
+def executer_site(args, ressources, sortie, origine):
+    """Analyse un site du batch, sa sortie console dans <sortie>.log.
+    Retourne ses mesures : statut, début et durée (secondes depuis origine),
+    nombre d'URLs et étapes de Metriques.
+    """
+    mesures = {"input": args.input, "output": args.output, "journal": args.output + ".log"}
+    debut = time.perf_counter()
+    metriques = Metriques(args.profiler)
+    try:
+        with open(mesures["journal"], "w", encoding="utf-8", buffering=1) as journal:
+            sortie.rediriger(journal)
+            try:
+                analyser_site(args, metriques, ressources)
+                mesures["statut"] = "ok"
+            except SystemExit as e:
+                mesures["statut"] = f"erreur (code {e.code})"
+            except Exception as e:
+                traceback.print_exc(file=journal)
+                mesures["statut"] = f"erreur : {e}"
+            finally:
+                sortie.rediriger(None)
+    except OSError as e:
+        mesures["statut"] = f"erreur : {e}"
+    chargement = next((e for e in metriques.etapes if e["etape"] == "chargement"), {})
+    mesures.update(
+        debut_s=debut - origine,
+        duree_s=time.perf_counter() - debut,
+        urls=chargement.get("elements"),
+        etapes=metriques.etapes,
+    )
+    return mesures
+
+
+def exporter_rapport_batch(chemin, sites, duree):
+    """Écrit les mesures par site en JSON, ou en CSV long (site, etape, mesure, valeur)."""
+    if not chemin.lower().endswith(".csv"):
+        with open(chemin, "w", encoding="utf-8") as f:
+            json.dump({"duree_totale_s": duree, "sites": sites}, f, ensure_ascii=False, indent=2)
+        return
+    with open(chemin, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["site", "etape", "mesure", "valeur"])
+        writer.writerow(["", "", "duree_totale_s", duree])
+        for site in sites:
+            for mesure in ("statut", "output", "debut_s", "duree_s", "urls"):
+                writer.writerow([site["input"], "", mesure, site[mesure]])
+            for infos in site["etapes"]:
+                for mesure, valeur in infos.items():
+                    if mesure != "etape":
+                        writer.writerow([site["input"], infos["etape"], mesure, valeur])
+
+
+def executer_batch(parser, args):
+    """Analyse les sites du manifeste args.batch dans un seul processus.
+    args.batch_sites sites tournent en même temps sur des pools partagés
+    (RessourcesBatch), les plus gros fichiers d'entrée en premier pour que
+    les petits sites remplissent la fin du batch. Retourne le nombre de
+    sites en échec. CPU et RSS des étapes sont ceux du processus entier.
+    """
+    donnees = [d for d in OPTIONS_PAR_SITE if d != "metrics_out" and getattr(args, d) != parser.get_default(d)]
+    if donnees:
+        options = ", ".join("--" + d.replace("_", "-") for d in donnees)
+        parser.error(f"--batch : {options} propre(s) a chaque site, a donner dans le manifeste")
+    if not os.path.exists(args.batch):
+        print(f"Erreur : fichier introuvable : {args.batch}")
+        sys.exit(1)
+    sites = lire_manifeste(args.batch, parser, args)
+    if not sites:
+        print(f"Erreur : aucun site dans {args.batch}.")
+        sys.exit(1)
+
+    def taille(site):
+        try:
+            return os.path.getsize(site[1].input)
+        except OSError:
+            return 0
+
+    processus = args.batch_processus or os.cpu_count() or 1
+    print(
+        f"Batch de {len(sites)} sites : {args.batch_sites} en parallele, "
+        f"{args.batch_connexions} telechargements simultanes, {processus} processus de calcul."
+    )
+    ressources = RessourcesBatch(args.batch_connexions, processus)
+    sortie = SortieParThread(sys.stdout)
+    sys.stdout = sortie
+    debut = time.perf_counter()
+    resultats = {}
+    pool_sites = ThreadPoolExecutor(max_workers=args.batch_sites, thread_name_prefix="site")
+    try:
+        futures = {
+            pool_sites.submit(executer_site, site, ressources, sortie, debut): numero
+            for numero, site in sorted(sites, key=taille, reverse=True)
+        }
+        for termine, future in enumerate(as_completed(futures), 1):
+            mesures = resultats[futures[future]] = future.result()
+            print(
+                f"  [{termine}/{len(sites)}] {mesures['input']} : {mesures['statut']}, "
+                f"{mesures['duree_s']:.1f}s ({time.perf_counter() - debut:.0f}s)"
+            )
+    except KeyboardInterrupt:
+        # Les threads des sites ne reçoivent pas le signal : ils voient
+        # l'arrêt, ferment checkpoint et cache, puis sortent.
+        ressources.arret.set()
+        sortie.defaut.write(
+            "\nInterrompu : arret des sites en cours (checkpoints et cache enregistres), "
+            "Ctrl-C a nouveau pour quitter sans attendre...\n"
+        )
+        sortie.defaut.flush()
+        try:
+            pool_sites.shutdown(cancel_futures=True)
+            ressources.fermer()
+        except KeyboardInterrupt:
+            os._exit(130)
+        sys.exit(130)
+    finally:
+        sys.stdout = sortie.defaut
+    pool_sites.shutdown()
+    ressources.fermer()
+    duree = time.perf_counter() - debut
+
+    sites = [resultats[numero] for numero, _ in sites]
+    echecs = sum(1 for s in sites if s["statut"] != "ok")
+    print(f"\n{'=' * 60}")
+    print("  RESUME DU BATCH")
+    print(f"{'=' * 60}")
+    print(
+        f"  {len(sites)} sites en {duree:.1f}s ({sum(s['duree_s'] for s in sites):.1f}s cumules), "
+        f"{echecs} en echec."
+    )
+    for s in sites:
+        etapes = ", ".join(f"{e['etape']} {e['duree_s']:.1f}s" for e in s["etapes"])
+        urls = f", {s['urls']} URLs" if s["urls"] is not None else ""
+        print(f"  {s['input']} -> {s['output']} : {s['statut']}{urls}, {s['duree_s']:.1f}s" + (f" ({etapes})" if etapes else ""))
+    if echecs:
+        print("  Journaux des sites en echec : " + ", ".join(s["journal"] for s in sites if s["statut"] != "ok"))
+    if args.metrics_out:
+        exporter_rapport_batch(args.metrics_out, sites, duree)
+        print(f"\nMetriques du batch ecrites dans {args.metrics_out}")
+    return echecs
 
 
 # ─── Main ────────────────────────────────────────────────────────────────────
 
-def main():
+def creer_parser():
     parser = argparse.ArgumentParser(
         description="Outil de recommandations de maillage interne SEO",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -554,114 +3724,399 @@ Exemples :
   python maillage_interne.py -i crawl.csv -o resultats.csv
   python maillage_interne.py -i urls.txt --max-reco 10 --seuil 0.15
   python maillage_interne.py -i crawl.csv --no-scrape --inlinks inlinks.csv
+  python maillage_interne.py --serveur --etat etat/ --port 8000
+  python maillage_interne.py -i crawl.csv --shard preparer --shard-dossier partage/
+  python maillage_interne.py --shard 3/16 --shard-dossier partage/
+  python maillage_interne.py --shard fusionner --shard-dossier partage/ -o resultats.csv
+  python maillage_interne.py --batch sites.txt --batch-sites 8 --delai 1 -q
         """,
     )
-    parser.add_argument("-i", "--input", required=True, help="Fichier d'entree (CSV Screaming Frog ou liste d'URLs)")
-    parser.add_argument("-o", "--output", default="recommandations_maillage.csv", help="Fichier CSV de sortie (defaut: recommandations_maillage.csv)")
+    parser.add_argument("-i", "--input", help="Fichier d'entree (CSV Screaming Frog ou liste d'URLs)")
+    parser.add_argument("-o", "--output", default="recommandations_maillage.csv", help="Fichier de sortie : CSV, CSV compresse (.gz) ou Parquet (.parquet, necessite pyarrow) (defaut: recommandations_maillage.csv)")
+    parser.add_argument("--tri-sortie", choices=("score", "source"), default="score", help="Ordre des lignes exportees : score (decroissant, tri externe) ou source (ordre de generation, sans tri) (defaut: score)")
     parser.add_argument("--max-reco", type=int, default=5, help="Nombre max de recommandations par page (defaut: 5)")
     parser.add_argument("--seuil", type=float, default=0.1, help="Seuil minimum de similarite (defaut: 0.1)")
     parser.add_argument("--clusters", type=int, default=None, help="Nombre de clusters (defaut: auto)")
+    parser.add_argument("--clustering", choices=MOTEURS_CLUSTERING, default="kmeans", help="Moteur de clustering : kmeans (complet), minibatch (MiniBatchKMeans) ou svd (KMeans sur projection TruncatedSVD) (defaut: kmeans)")
+    parser.add_argument("--clustering-batch", type=int, default=1024, help="Taille des lots pour --clustering minibatch (defaut: 1024)")
+    parser.add_argument("--clustering-init", type=int, default=10, help="Nombre de redemarrages du clustering (defaut: 10)")
+    parser.add_argument("--svd-composantes", type=int, default=100, help="Nombre de dimensions de la projection pour --clustering svd (defaut: 100)")
+    parser.add_argument("--silhouette", type=int, default=0, metavar="PAGES", help="Mesure la silhouette cosinus des clusters sur un echantillon de PAGES pages, cout quadratique (defaut: 0, pas de mesure)")
+    parser.add_argument("--etat", default=None, metavar="DOSSIER", help="Dossier ou sauvegarder l'etat d'analyse (vocabulaire, vecteurs, voisins, clusters)")
+    parser.add_argument("--incremental", action="store_true", help="Ne recalcule que les pages nouvelles ou modifiees depuis l'etat --etat")
+    parser.add_argument("--seuil-derive", type=float, default=0.05, help="Hausse maximale du taux de termes hors vocabulaire avant un recalcul complet en mode --incremental (defaut: 0.05)")
     parser.add_argument("--user-agent", default="MaillageInterne/1.0 (SEO Tool)", help="User-Agent pour le scraping")
     parser.add_argument("--timeout", type=int, default=10, help="Timeout des requetes en secondes (defaut: 10)")
-    parser.add_argument("--delai", type=float, default=0.5, help="Delai entre requetes en secondes (defaut: 0.5)")
+    parser.add_argument("--delai", type=float, default=0.5, help="Delai entre deux requetes vers un meme hote en secondes (defaut: 0.5)")
     parser.add_argument("--no-scrape", action="store_true", help="Ne pas scraper, utiliser les donnees du CSV Screaming Frog")
     parser.add_argument("--inlinks", default=None, help="Fichier 'All Inlinks' de Screaming Frog pour detecter les liens existants")
-    parser.add_argument("--concurrent", type=int, default=5, help="Nombre de threads pour le scraping (defaut: 5)")
+    parser.add_argument("--concurrent", type=int, default=5, help="Nombre maximal de requetes simultanees pour le scraping (defaut: 5)")
+    parser.add_argument("--extracteurs", type=int, default=0, help="Nombre de processus d'extraction HTML (defaut: 0, extraction dans les threads de telechargement)")
+    parser.add_argument("--extracteur", choices=sorted(EXTRACTEURS), default="bs4", help="Moteur d'extraction HTML : bs4 (reference) ou lxml (un seul parcours, plus rapide) (defaut: bs4)")
+    parser.add_argument("--taille-max-page", type=float, default=0, help="Taille maximale telechargee par page en Mo (defaut: 0, illimitee)")
+    parser.add_argument("--comparer-extracteurs", default=None, metavar="DOSSIER", help="Compare les sorties des extracteurs bs4 et lxml sur un dossier de fichiers HTML, puis quitte")
+    parser.add_argument("--cache", default=None, help="Fichier SQLite de cache du crawl (reutilise entre les executions)")
+    parser.add_argument("--cache-ttl", type=float, default=0, help="Duree en secondes pendant laquelle une page en cache est reutilisee sans requete (defaut: 0, toujours revalider)")
+    parser.add_argument("--cache-age-max", type=float, default=None, help="Supprime du cache les pages non revalidees depuis ce nombre de jours")
+    parser.add_argument("--cache-seul", action="store_true", help="N'utiliser que le cache, sans aucune requete reseau (necessite --cache)")
+    parser.add_argument("--metrics-out", default=None, metavar="FICHIER", help="Ecrit les metriques par etape (duree, CPU, memoire, volumes) et les latences par hote en JSON, ou en CSV si le fichier finit par .csv")
+    parser.add_argument("--profiler", default=None, metavar="DOSSIER", help="Profile chaque etape avec cProfile et ecrit un fichier .prof par etape dans ce dossier (en --batch, seulement avec --batch-sites 1)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Progression du scraping resumee (une ligne tous les 5%%) au lieu d'une ligne par page")
+    parser.add_argument("--adaptatif", action="store_true", help="Regule concurrence et delai par hote (AIMD) : hausse tant que latence et erreurs restent saines, division par deux sur 429/503/timeout, respect de Retry-After. --concurrent devient le maximum et --delai le plancher")
+    parser.add_argument("--checkpoint", default=None, metavar="FICHIER", help="Journal JSONL des pages extraites, ecrit au fil du crawl pour pouvoir le reprendre")
+    parser.add_argument("--resume", action="store_true", help="Reprend le crawl en sautant les pages deja presentes dans --checkpoint")
+    parser.add_argument("--tentatives", type=int, default=1, help="Nombre maximal d'essais par URL en cas d'erreur passagere (connexion, timeout, 429, 5xx) (defaut: 1)")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Attente de base en secondes avant une nouvelle tentative, doublee a chaque essai (defaut: 2)")
+    parser.add_argument("--top-paires", type=int, default=5, help="Nombre de paires les plus similaires affichees dans le resume (defaut: 5)")
+    parser.add_argument("--taille-bloc", type=int, default=1024, help="Nombre de pages par bloc pour le calcul de similarite (defaut: 1024)")
+    parser.add_argument("--memoire-max", type=int, default=512, help="Budget memoire en Mo pour un bloc de similarite (defaut: 512)")
+    parser.add_argument("--doublons", action="store_true", help="Regroupe les pages quasi identiques (facettes, pagination) et n'analyse qu'un representant par groupe")
+    parser.add_argument("--seuil-doublons", type=float, default=0.9, help="Similarite de Jaccard estimee (MinHash) a partir de laquelle deux pages sont des quasi-doublons (defaut: 0.9)")
+    parser.add_argument("--voisins", choices=("exact", "ann"), default="exact", help="Recherche des voisins : exact (par blocs, quadratique) ou ann (index IVF sur projection SVD, pour les gros sites) (defaut: exact)")
+    parser.add_argument("--ann-composantes", type=int, default=128, help="Dimensions de la projection SVD de l'index ANN (defaut: 128)")
+    parser.add_argument("--ann-listes", type=int, default=None, help="Nombre de cellules de l'index ANN (defaut: 2 x racine du nombre de pages)")
+    parser.add_argument("--ann-nprobe", type=int, default=10, help="Cellules explorees par page : compromis rappel / vitesse (defaut: 10)")
+    parser.add_argument("--ann-rappel", type=int, default=200, help="Pages echantillonnees pour mesurer le rappel contre la recherche exacte, 0 pour desactiver (defaut: 200)")
+    parser.add_argument("--vectorisation", choices=("tfidf", "hachage"), default="tfidf", help="tfidf (vocabulaire en memoire) ou hachage (TF-IDF en flux pendant le crawl, matrice sur disque) (defaut: tfidf)")
+    parser.add_argument("--ponderation", choices=("repetition", "champs"), default="repetition", help="Ponderation des champs : repetition (title x3, h1 x2, meta x2 dans un seul texte) ou champs (chaque champ vectorise une fois puis pondere) (defaut: repetition)")
+    parser.add_argument("--poids-title", type=float, default=3, help="Poids du title avec --ponderation champs (defaut: 3)")
+    parser.add_argument("--poids-h1", type=float, default=2, help="Poids du H1 avec --ponderation champs (defaut: 2)")
+    parser.add_argument("--poids-meta", type=float, default=2, help="Poids de la meta description avec --ponderation champs (defaut: 2)")
+    parser.add_argument("--poids-body", type=float, default=1, help="Poids du contenu avec --ponderation champs (defaut: 1)")
+    parser.add_argument("--hachage-bits", type=int, default=18, help="Nombre de colonnes (2^n) pour --vectorisation hachage (defaut: 18)")
+    parser.add_argument("--shard", type=lire_shard, default=None, metavar="preparer|I/N|fusionner", help="Calcul reparti : preparer (TF-IDF, clusters et liens dans --shard-dossier), I/N (voisins et recommandations de la I-eme tranche de pages sources sur N), fusionner (export et resume finaux, identiques a une execution unique)")
+    parser.add_argument("--shard-dossier", default=None, metavar="DOSSIER", help="Dossier partage entre la preparation, les shards et la fusion")
+    parser.add_argument("--batch", default=None, metavar="MANIFESTE", help="Analyse plusieurs sites dans un seul processus : une ligne d'options par site (au moins -i et -o), les autres options de la commande servant de valeurs par defaut. Journal de chaque site dans <sortie>.log, durees par site dans --metrics-out")
+    parser.add_argument("--batch-sites", type=int, default=4, help="Sites analyses en meme temps en mode --batch, les plus gros en premier (defaut: 4)")
+    parser.add_argument("--batch-connexions", type=int, default=32, help="Telechargements simultanes, tous sites confondus, en mode --batch (defaut: 32)")
+    parser.add_argument("--batch-processus", type=int, default=None, help="Processus de calcul partages (extraction HTML, TF-IDF et voisins) en mode --batch (defaut: nombre de coeurs)")
+    parser.add_argument("--serveur", action="store_true", help="Mode serveur : sert l'index de --etat en HTTP/JSON (recommandations par URL ou texte brut), recharge a chaud quand l'etat est reconstruit")
+    parser.add_argument("--hote", default="127.0.0.1", help="Adresse d'ecoute du mode serveur (defaut: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port du mode serveur (defaut: 8000)")
+    parser.add_argument("--flux-dossier", default=None, metavar="DOSSIER", help="Dossier des fichiers de la matrice en flux (defaut: dossier temporaire)")
+
+    return parser
+
+
+def valider_arguments(args):
+    """Incompatibilités entre options d'une analyse de site ; retourne le message d'erreur ou None."""
+    if args.shard == "preparer" and (args.vectorisation == "hachage" or args.voisins == "ann" or args.etat):
+        return "--shard preparer est incompatible avec --vectorisation hachage, --voisins ann et --etat"
+    if not args.input:
+        return "l'argument -i/--input est requis"
+    if args.incremental and not args.etat:
+        return "--incremental necessite --etat"
+    if args.cache_seul and not args.cache:
+        return "--cache-seul necessite --cache"
+    if args.resume and not args.checkpoint:
+        return "--resume necessite --checkpoint"
+    if args.vectorisation == "hachage" and args.etat:
+        return "--vectorisation hachage est incompatible avec --etat"
+    if args.vectorisation == "hachage" and args.ponderation == "champs":
+        return "--vectorisation hachage est incompatible avec --ponderation champs"
+    if args.ponderation == "champs":
+        poids = (args.poids_title, args.poids_h1, args.poids_meta, args.poids_body)
+        if min(poids) < 0:
+            return "--poids-title, --poids-h1, --poids-meta et --poids-body doivent etre positifs ou nuls"
+        if not any(poids):
+            return "--ponderation champs necessite au moins un poids non nul"
+    return None
 
-    args = parser.parse_args()
+
+def analyser_site(args, metriques, ressources=None):
+    """Pipeline complet d'un site (chargement, scraping, analyse, export) selon args.
+    ressources : RessourcesBatch dont les pools remplacent ceux du site (mode batch).
+    Une erreur bloquante affiche un message et lève SystemExit.
+    """
+    ann = None
+    if args.voisins == "ann":
+        ann = IndexANN(args.ann_composantes, args.ann_listes, args.ann_nprobe, args.ann_rappel)
+
+    poids = None
+    if args.ponderation == "champs":
+        poids = {
+            "title": args.poids_title,
+            "h1": args.poids_h1,
+            "meta_description": args.poids_meta,
+            "body_text": args.poids_body,
+        }
 
     if not os.path.exists(args.input):
         print(f"Erreur : fichier introuvable : {args.input}")
         sys.exit(1)
 
     # ─── 1. Parsing de l'input ───────────────────────────────────────────
-    print(f"Chargement de {args.input}...")
-    format_type, enc, sep = detecter_format_input(args.input)
+    with metriques.etape("chargement") as etape:
+        print(f"Chargement de {args.input}...")
+        format_type, enc, sep = detecter_format_input(args.input)
 
-    sf_data = {}
-    if format_type == "screaming_frog":
-        print("Format detecte : export Screaming Frog")
-        urls, sf_data = charger_urls_screaming_frog(args.input, enc, sep)
-    else:
-        print("Format detecte : liste d'URLs")
-        urls, sf_data = charger_urls_liste(args.input, enc)
+        sf_data = None
+        if format_type == "screaming_frog":
+            print("Format detecte : export Screaming Frog")
+            urls, sf_data = charger_urls_screaming_frog(args.input, enc, sep)
+        else:
+            print("Format detecte : liste d'URLs")
+            urls, sf_data = charger_urls_liste(args.input, enc)
 
-    if not urls:
-        print("Erreur : aucune URL trouvee dans le fichier.")
-        sys.exit(1)
+        if not urls:
+            print("Erreur : aucune URL trouvee dans le fichier.")
+            sys.exit(1)
+
+        urls = list(dict.fromkeys(urls))
+        print(f"{len(urls)} URLs uniques chargees.")
+        etape["elements"] = len(urls)
 
-    urls = list(dict.fromkeys(urls))
-    print(f"{len(urls)} URLs uniques chargees.")
+    if ressources:
+        ressources.verifier_arret()
 
     # ─── 2. Scraping ou utilisation des données SF ───────────────────────
     pages_data = {}
-    if args.no_scrape:
-        if format_type != "screaming_frog":
-            print("Erreur : --no-scrape necessite un export Screaming Frog en entree.")
-            sys.exit(1)
-        print("Mode --no-scrape : utilisation des donnees Screaming Frog.")
-        for url in urls:
-            data = sf_data.get(url, {})
-            pages_data[url] = {
-                "url": url,
-                "title": data.get("title", ""),
-                "h1": data.get("h1", ""),
-                "meta_description": data.get("meta_description", ""),
-                "body_text": "",
-                "liens_internes": set(),
-                "erreur": None,
-            }
-    else:
-        pages_data = scraper_pages(
-            urls, args.user_agent, args.timeout, args.delai, args.concurrent
-        )
+    flux = None
+    if args.vectorisation == "hachage":
+        flux = VectoriseurFlux(args.hachage_bits, args.flux_dossier)
+    with metriques.etape("scraping") as etape:
+        if args.no_scrape:
+            if format_type != "screaming_frog":
+                print("Erreur : --no-scrape necessite un export Screaming Frog en entree.")
+                sys.exit(1)
+            print("Mode --no-scrape : utilisation des donnees Screaming Frog.")
+            if sf_data is None:
+                sf_data = pd.DataFrame(columns=list(CHAMPS_SF), dtype=str)
+            champs = sf_data.reindex(urls, fill_value="")
+            for url, title, h1, meta in zip(urls, champs["title"], champs["h1"], champs["meta_description"]):
+                pages_data[url] = {
+                    "url": url,
+                    "title": title,
+                    "h1": h1,
+                    "meta_description": meta,
+                    "body_text": "",
+                    "liens_internes": set(),
+                    "erreur": None,
+                }
+        else:
+            if args.checkpoint and not args.resume and os.path.exists(args.checkpoint) and os.path.getsize(args.checkpoint):
+                print(f"Erreur : le checkpoint {args.checkpoint} existe deja ; --resume pour le reprendre, ou supprimez-le.")
+                sys.exit(1)
+            cache = CacheCrawl(args.cache) if args.cache else None
+            journal = JournalCrawl(args.checkpoint, args.resume) if args.checkpoint else None
+            if cache and args.cache_age_max is not None:
+                purgees = cache.purger(args.cache_age_max * 86400)
+                print(f"Cache : {purgees} pages expirees supprimees.")
+            options = OptionsCrawl(
+                cache, args.cache_ttl, args.cache_seul, journal, args.tentatives, args.backoff, args.adaptatif,
+                ressources.telechargement if ressources else None,
+                ressources.calcul if ressources else None,
+                ressources.arret if ressources else None,
+            )
+            try:
+                pages_data = scraper_pages(
+                    urls, args.user_agent, args.timeout, args.delai, args.concurrent,
+                    ressources.processus if ressources else args.extracteurs,
+                    args.extracteur, int(args.taille_max_page * 1024 * 1024),
+                    (lambda url, page: flux.ajouter(url, construire_texte_pondere(page))) if flux else None,
+                    metriques, args.quiet, options,
+                )
+            except KeyboardInterrupt:
+                sys.exit(130)
+            finally:
+                if cache:
+                    cache.fermer()
+                if journal:
+                    journal.fermer()
+        etape["elements"] = len(pages_data)
+        etape["erreurs"] = sum(1 for d in pages_data.values() if d.get("erreur"))
 
     pages_valides = {u: d for u, d in pages_data.items() if not d.get("erreur")}
     if not pages_valides:
         print("Erreur : aucune page n'a pu etre analysee.")
         sys.exit(1)
 
+    if ressources:
+        ressources.verifier_arret()
+
     # ─── 3. TF-IDF + Similarité cosinus ─────────────────────────────────
     urls_pour_analyse = [u for u in urls if u in pages_valides]
-    sim_matrix, urls_valides, vectorizer, tfidf_matrix = calculer_similarite(
-        pages_valides, urls_pour_analyse
-    )
+    groupes = {}
+    if args.doublons:
+        with metriques.etape("doublons") as etape:
+            urls_pour_analyse, groupes = regrouper_quasi_doublons(
+                pages_valides, urls_pour_analyse, args.seuil_doublons
+            )
+            regroupees = sum(len(membres) for membres in groupes.values())
+            print(
+                f"\nQuasi-doublons : {regroupees + len(groupes)} pages en {len(groupes)} groupes, "
+                f"{len(urls_pour_analyse)} pages analysees au lieu de {len(urls_pour_analyse) + regroupees}."
+            )
+            etape["elements"] = len(urls_pour_analyse) + regroupees
+    top_k = max(args.max_reco, args.top_paires)
+    with metriques.etape("similarite") as etape:
+        resultat_incremental = None
+        if args.incremental:
+            etat = charger_etat(args.etat)
+            if etat is None:
+                print("\nIncremental : aucun etat exploitable, recalcul complet.")
+            else:
+                resultat_incremental = analyser_incremental(
+                    etat, pages_valides, urls_pour_analyse, top_k, args.seuil,
+                    args.taille_bloc, args.memoire_max, args.seuil_derive, poids
+                )
+
+        if args.shard == "preparer":
+            urls_valides, vectorizer, tfidf_matrix = vectoriser_corpus(pages_valides, urls_pour_analyse, poids)
+            voisins = None
+        elif flux:
+            voisins, urls_valides, vectorizer, tfidf_matrix = calculer_similarite_flux(
+                flux, pages_valides, urls_pour_analyse, top_k, args.seuil,
+                args.taille_bloc, args.memoire_max, ann
+            )
+        elif resultat_incremental:
+            (voisins, urls_valides, vectorizer, tfidf_matrix, page_clusters,
+             cluster_labels, modele_clusters, corpus) = resultat_incremental
+            k_etat, seuil_etat, oov_reference = etat["top_k"], etat["seuil"], etat["oov_reference"]
+        elif ressources:
+            voisins, urls_valides, vectorizer, tfidf_matrix = calculer_similarite_pool(
+                ressources.calcul, pages_valides, urls_pour_analyse, top_k, args.seuil,
+                args.taille_bloc, args.memoire_max, poids, ann
+            )
+        else:
+            voisins, urls_valides, vectorizer, tfidf_matrix = calculer_similarite(
+                pages_valides, urls_pour_analyse, top_k, args.seuil,
+                args.taille_bloc, args.memoire_max, poids, ann
+            )
+        etape["elements"] = len(urls_valides)
+
+    if ressources:
+        ressources.verifier_arret()
 
     # ─── 4. Clustering ──────────────────────────────────────────────────
-    page_clusters, cluster_labels = clustering_pages(
-        tfidf_matrix, urls_valides, vectorizer, args.clusters
-    )
+    if not resultat_incremental:
+        with metriques.etape("clustering") as etape:
+            page_clusters, cluster_labels, modele_clusters = clustering_pages(
+                tfidf_matrix, urls_valides, vectorizer, args.clusters,
+                args.clustering, args.clustering_batch, args.clustering_init, args.svd_composantes,
+                args.silhouette
+            )
+            etape["elements"] = len(urls_valides)
+        corpus = None
+        k_etat, seuil_etat, oov_reference = top_k, args.seuil, None
+
+    if args.etat:
+        with metriques.etape("etat"):
+            if corpus is None:
+                corpus, _ = construire_corpus(pages_valides, urls_valides, poids)
+            generation_etat = sauvegarder_etat(
+                args.etat, urls_valides, corpus, vectorizer, tfidf_matrix, voisins,
+                k_etat, seuil_etat, page_clusters, cluster_labels, modele_clusters, oov_reference
+            )
+    corpus = None
+    if seuil_etat < args.seuil:
+        voisins = filtrer_voisins(voisins, args.seuil)
+
+    # Les membres des groupes de quasi-doublons reprennent l'analyse de leur représentant.
+    voisins_analyse, urls_analyse = voisins, urls_valides
+    if groupes:
+        voisins, urls_valides, page_clusters = etendre_aux_doublons(
+            voisins, urls_valides, groupes, page_clusters
+        )
 
     # ─── 5. Détection des liens existants ────────────────────────────────
-    inlinks_externe = None
-    if args.inlinks:
-        if not os.path.exists(args.inlinks):
-            print(f"Attention : fichier inlinks introuvable : {args.inlinks}")
-        else:
-            print(f"Chargement des inlinks depuis {args.inlinks}...")
-            inlinks_externe = charger_inlinks(args.inlinks)
-            print(f"  {len(inlinks_externe)} liens internes charges.")
+    with metriques.etape("liens") as etape:
+        inlinks_externe = None
+        if args.inlinks:
+            if not os.path.exists(args.inlinks):
+                print(f"Attention : fichier inlinks introuvable : {args.inlinks}")
+            else:
+                print(f"Chargement des inlinks depuis {args.inlinks}...")
+                inlinks_externe = charger_inlinks(args.inlinks)
+                print(f"  {len(inlinks_externe)} liens internes charges.")
 
-    liens_existants = detecter_liens_existants(pages_data, inlinks_externe)
-    print(f"Liens internes existants detectes : {len(liens_existants)}")
+        liens_existants = detecter_liens_existants(pages_data, inlinks_externe)
+        print(f"Liens internes existants detectes : {len(liens_existants)}")
+        etape["elements"] = len(liens_existants)
+
+    if args.etat:
+        with metriques.etape("index_service"):
+            sauvegarder_index_service(args.etat, generation_etat, urls_analyse, pages_data, liens_existants)
 
     # ─── 6. Pages orphelines ────────────────────────────────────────────
-    pages_orphelines = detecter_pages_orphelines(urls_valides, liens_existants)
+    with metriques.etape("orphelines") as etape:
+        pages_orphelines = detecter_pages_orphelines(urls_valides, liens_existants)
+        etape["elements"] = len(pages_orphelines)
 
-    # ─── 7. Recommandations ─────────────────────────────────────────────
-    recommandations = generer_recommandations(
-        sim_matrix, urls_valides, pages_data, page_clusters,
-        liens_existants, args.max_reco, args.seuil
-    )
+    if args.shard == "preparer":
+        with metriques.etape("preparation_shards"):
+            preparer_shards(
+                args.shard_dossier, urls_analyse, urls_valides, groupes, tfidf_matrix, pages_data,
+                page_clusters, cluster_labels, liens_existants, pages_orphelines,
+                top_k, args.max_reco, args.seuil, args.top_paires
+            )
+        metriques.publier(args.metrics_out)
+        return
 
-    # ─── 8. Export CSV ──────────────────────────────────────────────────
-    exporter_csv(recommandations, args.output)
+    if ressources:
+        ressources.verifier_arret()
+
+    # ─── 7-8. Recommandations et export, en flux ────────────────────────
+    with metriques.etape("recommandations") as etape:
+        print(f"\nGeneration des recommandations (max {args.max_reco} par page, seuil {args.seuil})...")
+        export = ExportRecommandations(args.output, args.tri_sortie == "score")
+        for lot in iterer_recommandations(
+            voisins, urls_valides, pages_data, page_clusters,
+            liens_existants, args.max_reco, args.seuil
+        ):
+            export.ajouter(lot)
+        etape["elements"] = export.total
+
+    # Fusion des paquets triés et fin d'écriture du fichier.
+    with metriques.etape("export") as etape:
+        total_reco, nouvelles = export.fermer()
+        etape["elements"] = total_reco
 
     # ─── 9. Résumé console ──────────────────────────────────────────────
-    afficher_resume(
-        urls_valides, recommandations, page_clusters, cluster_labels,
-        pages_orphelines, liens_existants, sim_matrix
-    )
+    with metriques.etape("resume"):
+        afficher_resume(
+            urls_valides, total_reco, nouvelles, page_clusters, cluster_labels,
+            pages_orphelines, liens_existants, voisins_analyse, args.top_paires
+        )
+
+    metriques.publier(args.metrics_out)
+
+
+def main():
+    parser = creer_parser()
+    args = parser.parse_args()
+
+    if args.comparer_extracteurs:
+        differences = comparer_extracteurs(args.comparer_extracteurs, "https://example.com/")
+        sys.exit(1 if differences else 0)
+
+    if args.batch:
+        if args.serveur or args.shard:
+            parser.error("--batch est incompatible avec --serveur et --shard")
+        sys.exit(1 if executer_batch(parser, args) else 0)
+
+    if args.shard and not args.shard_dossier:
+        parser.error("--shard necessite --shard-dossier")
+
+    if isinstance(args.shard, tuple) or args.shard == "fusionner":
+        metriques = Metriques(args.profiler)
+        if args.shard == "fusionner":
+            fusionner_shards(args.shard_dossier, args.output, args.tri_sortie == "score", metriques)
+        else:
+            executer_shard(args.shard_dossier, *args.shard, args.taille_bloc, args.memoire_max, metriques)
+        metriques.publier(args.metrics_out)
+        return
+
+    if args.serveur:
+        if not args.etat:
+            parser.error("--serveur necessite --etat")
+        servir(args.etat, args.hote, args.port, k_defaut=args.max_reco)
+        return
+
+    erreur = valider_arguments(args)
+    if erreur:
+        parser.error(erreur)
+    analyser_site(args, Metriques(args.profiler))
 
 
 if __name__ == "__main__":